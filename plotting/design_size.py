@@ -0,0 +1,133 @@
+import argparse
+import math
+import os
+from pathlib import Path
+
+import matplotlib
+from matplotlib import pyplot as plt
+import numpy as np
+
+import plot
+from plot import IMAGES_DIR, show_or_close
+from results_db import import_legacy_results, query_results
+from design_metrics import DESIGN_METRICS
+from scaling import SHORT_NAMES, fit_scaling_model
+
+DESIGN_SIZE_DIR = IMAGES_DIR / 'design_size'
+
+# Solver cost regressed against the design metrics: result column, name and unit
+COST_COLUMNS = [
+    ('execution_time', 'time', 's'),
+    ('cpu_time', 'CPU time', 's'),
+]
+
+def load_design_size_points(command, tag=None, interfaces=None):
+    """Successful runs of a command that recorded their design metrics, of every interface and SA_SIZE"""
+    return [result for result in query_results(command=command, tag=tag, success=True)
+            if (interfaces is None or result['interface'] in interfaces) and any(result[metric] is not None for metric in DESIGN_METRICS)]
+
+def fit_metric(runs, metric, column):
+    """Power law cost = a * metric^b over the runs that recorded both, or None with too few distinct values"""
+    measured = [(run[metric], run[column]) for run in runs if run[metric] and run[column]]
+    return fit_scaling_model([value for value, _ in measured], [cost for _, cost in measured], 'power_law')
+
+def fit_all_metrics(runs, column):
+    """
+    Least-squares fit of log cost against the logs of every metric at once, which tells the structures that drive
+    the cost apart from the ones that merely grow along with them. Returns ({metric: standardized coefficient}, R²),
+    or None when there are not more runs than metrics. A standardized coefficient is the change of log cost, in
+    standard deviations, for a one standard deviation change of the log metric with the others held fixed.
+    """
+    metrics = [metric for metric in DESIGN_METRICS if all(run[metric] for run in runs) and len({run[metric] for run in runs}) > 1]
+    runs = [run for run in runs if run[column]]
+    if not metrics or len(runs) <= len(metrics) + 1:
+        return None
+
+    x = np.log(np.array([[run[metric] for metric in metrics] for run in runs], dtype=float))
+    log_y = np.log(np.array([run[column] for run in runs], dtype=float))
+    x_centered = x - x.mean(axis=0)
+    y_centered = log_y - log_y.mean()
+
+    coefficients, _, _, _ = np.linalg.lstsq(x_centered, y_centered, rcond=None)
+    residuals = y_centered - x_centered @ coefficients
+    total = float(np.sum(y_centered ** 2))
+    r_squared = 1 - float(np.sum(residuals ** 2)) / total if total > 0 else 1.0
+    scale = math.sqrt(total / len(runs)) if total > 0 else 1.0
+    return {metric: float(coefficient * x_centered[:, i].std() / scale) for i, (metric, coefficient) in enumerate(zip(metrics, coefficients))}, r_squared
+
+def plot_design_size(command, runs, column, name, unit, fits, output_path: Path = None):
+    """Log-log scatter of the cost of every run against every metric that could be fitted, coloured by interface"""
+    metrics = [metric for metric in DESIGN_METRICS if fits.get(metric) is not None]
+    if not metrics:
+        return
+    columns = min(3, len(metrics))
+    rows = math.ceil(len(metrics) / columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(5 * columns, 4 * rows), squeeze=False)
+    fig.suptitle(f'{name.capitalize()} against design size ({command.upper()})')
+
+    interfaces = sorted({run['interface'] for run in runs})
+    for ax, metric in zip(axes.flat, metrics):
+        ax.set_xlabel(metric.replace('_', ' '))
+        ax.set_ylabel(f'{name.capitalize()} ({unit})')
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+        ax.grid(True, which='both', alpha=0.3)
+        for interface in interfaces:
+            points = [(run[metric], run[column]) for run in runs if run['interface'] == interface and run[metric] and run[column]]
+            ax.scatter([value for value, _ in points], [cost for _, cost in points], label=SHORT_NAMES.get(interface, interface), zorder=3)
+
+        fit = fits[metric]
+        values = np.geomspace(min(run[metric] for run in runs if run[metric]), max(run[metric] for run in runs if run[metric]), 100)
+        ax.plot(values, fit.predict(values)[0], color='black', linestyle='--', label=f'{name} ∝ x^{fit.b:.2f} (R²={fit.r_squared:.3f})')
+        ax.legend(fontsize=8)
+
+    for ax in axes.flat[len(metrics):]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    if output_path is not None:
+        fig.savefig(output_path, bbox_inches='tight')
+    show_or_close(fig)
+
+def print_design_size(command, name, runs, fits, combined_fit):
+    print(f'{command} {name} ({len(runs)} runs):')
+    for metric, fit in sorted(fits.items(), key=lambda item: -item[1].r_squared if item[1] is not None else 1):
+        if fit is None:
+            print(f'  {metric:<18} not enough runs with distinct values to fit')
+        else:
+            print(f'  {metric:<18} {name} ∝ {metric}^{fit.b:.2f}  R²={fit.r_squared:.4f}  ({fit.points} runs)')
+    if combined_fit is not None:
+        coefficients, r_squared = combined_fit
+        print(f'  all metrics at once: R²={r_squared:.4f}, standardized coefficients '
+              + ', '.join(f'{metric}={coefficient:+.2f}' for metric, coefficient in sorted(coefficients.items(), key=lambda item: -abs(item[1]))))
+
+def main():
+    parser = argparse.ArgumentParser(description='Regress the solver time of every run against the size of its design (cells, flip-flop bits, multipliers, anyconst bits and model sizes) to find the structures that dominate the cost.')
+    parser.add_argument('--interface', '-i', type=str, nargs='+', help='Interfaces to include (all by default)')
+    parser.add_argument('--command', '-c', type=str, nargs='+', choices=['bmc', 'prove', 'live'], default=['bmc', 'prove'], help='Commands to analyze')
+    parser.add_argument('--tag', '-t', type=str, help='Only use the runs of this tag (all tags by default)')
+    parser.add_argument('--no-plots', action='store_true', help='Only print the fits, without rendering the plots into plotting/img/design_size')
+    parser.add_argument('--show', action='store_true', help='Show the plots on screen instead of rendering headless')
+    args = parser.parse_args()
+
+    plot.SHOW_FIGURES = args.show
+    if not args.show:
+        matplotlib.use('Agg')
+
+    import_legacy_results()
+    os.makedirs(DESIGN_SIZE_DIR, exist_ok=True)
+
+    for command in args.command:
+        runs = load_design_size_points(command, args.tag, args.interface)
+        if not runs:
+            print(f'{command}: no runs with design metrics')
+            continue
+        for column, name, unit in COST_COLUMNS:
+            fits = {metric: fit_metric(runs, metric, column) for metric in DESIGN_METRICS}
+            print_design_size(command, name, runs, fits, fit_all_metrics(runs, column))
+            if not args.no_plots:
+                output_path = DESIGN_SIZE_DIR / (f'{command}_{column}_tag_{args.tag}.pdf' if args.tag else f'{command}_{column}.pdf')
+                plot_design_size(command, runs, column, name, unit, fits, output_path)
+
+if __name__ == '__main__':
+    main()
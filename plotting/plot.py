@@ -1,15 +1,30 @@
+import matplotlib
 from matplotlib import pyplot as plt
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
 import pprint
-import csv
+import sys
 import re
 
 RESULTS_DIR = Path(__file__).parent.parent / 'systolic_array' / 'FV' / 'benchmark_output'
+sys.path.insert(0, str(RESULTS_DIR.parent))
+
+from results_db import import_legacy_results, query_results
+from design_metrics import DESIGN_METRICS
 IMAGES_DIR = Path(__file__).parent / 'img'
 
-# Set global font sizes
-plt.rcParams.update({
+# Content hash of every figure when it was last rendered (see compute_figure_hash)
+FIGURE_HASHES_FILE = IMAGES_DIR / '.figure_hashes.json'
+
+# Global font sizes
+PLOT_STYLE = {
     'font.size': 16,
     'axes.titlesize': 18,
     'axes.labelsize': 17,
@@ -17,10 +32,20 @@ plt.rcParams.update({
     'ytick.labelsize': 14,
     'legend.fontsize': 15,
     'figure.titlesize': 16
-})
+}
+plt.rcParams.update(PLOT_STYLE)
 
 DOUBLE_PLOT_FIG_SIZE = (8, 4.5)
 
+# Figures are only shown on screen with --show. Otherwise they are rendered headless and closed once saved.
+SHOW_FIGURES = False
+
+def show_or_close(fig):
+    if SHOW_FIGURES:
+        plt.show()
+    else:
+        plt.close(fig)
+
 @dataclass
 class Config:
     full_config_name: str
@@ -34,16 +59,18 @@ class BenchResults:
     memory_megabytes: float
     mode: str                  # in ['bmc', 'prove', 'live']
     success: bool
+    cpu_time_seconds: float = None  # user + system time of the process tree, None for runs that did not record it
+    design_metrics: dict = None     # design size of the run, from DESIGN_METRICS (values are None when not recorded)
 
 def parse_result_line(line, cfg_name):
     # Regular expression to match the line format
-    pattern = r'(SUCCESS|ERROR): (\w+) (gen_' + cfg_name + r'_driver_sa_size_(\d+)_prove_depth_(\d+)_bmc_depth_(\d+)_tag_default)(?:\s+in\s+([\d.]+)\s+seconds\s+using\s+([\d.]+)\s+MB)?(?:\s+\((.*?)\))?'
+    pattern = r'(SUCCESS|ERROR): (\w+) (gen_' + cfg_name + r'_driver_sa_size_(\d+)_prove_depth_(\d+)_bmc_depth_(\d+)_tag_(\w+))(?:\s+in\s+([\d.]+)\s+seconds\s+using\s+([\d.]+)\s+MB)?(?:\s+\((.*?)\))?'
 
     match = re.match(pattern, line)
     if not match:
         return None
 
-    status, mode, full_name, sa_size, prove_depth, bmc_depth, time, memory, error = match.groups()
+    status, mode, full_name, sa_size, prove_depth, bmc_depth, tag, time, memory, error = match.groups()
 
     # For error cases, set time and memory to -1
     time = float(time) if time else -1
@@ -53,7 +80,7 @@ def parse_result_line(line, cfg_name):
         cfg_name,  # config name
         int(sa_size),  # sa_size
         mode,  # mode (bmc/prove/live)
-        "default",  # tag
+        tag,  # tag
         time,  # time in seconds
         memory,  # memory in MB
         1 if status == "SUCCESS" else 0,  # success flag
@@ -78,46 +105,30 @@ def convert_manual_results_txt_to_csv(results_file_path, cfg: Config):
 
     print(f'Written results to {csv_output_file}')
 
-def load_results(config: Config) -> [BenchResults]:
+def load_results(config: Config, tag: str = None) -> [BenchResults]:
     results = []
-    csv_path = RESULTS_DIR / f'all_run_benchmarks_{config.full_config_name}.csv'
-
-    with open(csv_path, 'r') as f:
-        for row in csv.reader(f):
-            # CSV structure:
-            # [0]: config_name
-            # [1]: sa_size
-            # [2]: bmc/prove/live
-            # [3]: tag: default
-            # [4]: time_seconds
-            # [5]: memory_megabytes
-            # [6]: success
-            # [7]: log_path
-            assert config.full_config_name == row[0]
-
-            sa_size = int(row[1])
-            time_seconds = float(row[4])
-            memory_megabytes = float(row[5])
-            mode = row[2]
-            assert mode in ['bmc', 'live', 'prove']
-            assert int(row[6]) in [0, 1]
-            success = bool(int(row[6]))
-
-            result = BenchResults(
-                config=config,
-                sa_size=sa_size,
-                time_seconds=time_seconds,
-                memory_megabytes=memory_megabytes,
-                mode=mode,
-                success=success
-            )
-            results.append(result)
+
+    # Without a tag, the runs of every tag are plotted together. Sweep points with other driver parameters (e.g.
+    #   INPUT_SIZE or WEIGHT_ACTIVATION_SIZE) are a different configuration, so only the default ones are plotted.
+    for row in query_results(interface=config.full_config_name, tag=tag, parameters={}):
+        # Failed runs copied from results.txt have no time or memory
+        result = BenchResults(
+            config=config,
+            sa_size=row['SA_SIZE'],
+            time_seconds=row['execution_time'] if row['execution_time'] is not None else -1,
+            memory_megabytes=row['memory'] if row['memory'] is not None else -1,
+            mode=row['command'],
+            success=bool(row['success']),
+            cpu_time_seconds=row['cpu_time'],
+            design_metrics={metric: row[metric] for metric in DESIGN_METRICS}
+        )
+        results.append(result)
     return results
 
 
 def plot_performance_metrics(results: [BenchResults], mode: str = None, output_path: Path = None):
     """
-    Plot memory (in GB) and CPU consumption (in minutes) for given benchmark results.
+    Plot memory (in GB) and wall time (in minutes) for given benchmark results.
     Only shows successful results for the specified mode.
 
     Args:
@@ -149,11 +160,11 @@ def plot_performance_metrics(results: [BenchResults], mode: str = None, output_p
     # Create figure and primary y-axis
     fig, ax1 = plt.subplots(figsize=(5, 4))
 
-    # Plot CPU time on primary y-axis
+    # Plot wall time on primary y-axis
     color1 = '#1f77b4'  # Blue
     ax1.set_xlabel('Systolic Array Size')
-    ax1.set_ylabel('CPU Time (minutes)', color=color1)
-    line1 = ax1.plot(sa_sizes, times, color=color1, marker='o', label='CPU Time')
+    ax1.set_ylabel('Wall Time (minutes)', color=color1)
+    line1 = ax1.plot(sa_sizes, times, color=color1, marker='o', label='Wall Time')
     ax1.tick_params(axis='y', labelcolor=color1)
 
     # Create secondary y-axis and plot memory
@@ -182,13 +193,13 @@ def plot_performance_metrics(results: [BenchResults], mode: str = None, output_p
         print(f"Plot saved to {output_path}")
 
     # Show plot
-    plt.show()
+    show_or_close(fig)
 
 
 def plot_bmc_prove_mode_comparison(results: [BenchResults], output_path: Path = None):
     """
     Creates a side-by-side comparison of BMC vs prove performance metrics.
-    Shows both memory usage and CPU time for successful results only.
+    Shows both memory usage and wall time for successful results only.
     Uses different colors to distinguish BMC and prove modes.
 
     Args:
@@ -212,10 +223,10 @@ def plot_bmc_prove_mode_comparison(results: [BenchResults], output_path: Path =
     bmc_color = '#1f77b4'    # Blue
     prove_color = '#ff7f0e'  # Orange
 
-    # --- CPU Time Comparison (Left Plot) ---
-    ax1.set_title('CPU Time')
+    # --- Wall Time Comparison (Left Plot) ---
+    ax1.set_title('Wall Time')
     ax1.set_xlabel('Systolic Array Size')
-    ax1.set_ylabel('CPU Time (minutes)')
+    ax1.set_ylabel('Wall Time (minutes)')
 
     # Plot BMC and prove times with different colors
     bmc_sizes = [r.sa_size for r in bmc_results]
@@ -260,12 +271,12 @@ def plot_bmc_prove_mode_comparison(results: [BenchResults], output_path: Path =
         plt.savefig(output_path, bbox_inches='tight')
         print(f"Plot saved to {output_path}")
 
-    plt.show()
+    show_or_close(fig)
 
 def print_benchmark_summary(config: Config, results: [BenchResults]):
     """
     Prints a compact summary of benchmark results for each mode.
-    Only shows successful runs with time in minutes and memory in GB.
+    Only shows successful runs with wall and CPU time in minutes and memory in GB.
     """
     # Print banner
     print()
@@ -287,20 +298,21 @@ def print_benchmark_summary(config: Config, results: [BenchResults]):
         mode_results.sort(key=lambda x: x.sa_size)
 
         print(f"{mode.upper()} MODE:")
-        print(f"{'SA Size':>8} | {'Time (min)':>10} | {'Memory (GB)':>10}")
-        print("-" * 35)
+        print(f"{'SA Size':>8} | {'Time (min)':>10} | {'CPU (min)':>10} | {'Memory (GB)':>10}")
+        print("-" * 48)
 
         for result in mode_results:
             time_min = result.time_seconds / 60.0
+            cpu_min = f'{result.cpu_time_seconds / 60.0:.2f}' if result.cpu_time_seconds is not None else '-'
             mem_gb = result.memory_megabytes / 1024.0
-            print(f"{result.sa_size:>8} | {time_min:>10.2f} | {mem_gb:>10.2f}")
+            print(f"{result.sa_size:>8} | {time_min:>10.2f} | {cpu_min:>10} | {mem_gb:>10.2f}")
         print()
 
 
 def plot_config_comparison(config1_results: [BenchResults], config2_results: [BenchResults], mode='prove',
                            output_path: Path = None):
     """
-    Creates side-by-side comparison plots of CPU time and memory usage between two configurations.
+    Creates side-by-side comparison plots of wall time and memory usage between two configurations.
     Only shows successful results for the specified mode (defaults to 'prove').
 
     Args:
@@ -326,10 +338,10 @@ def plot_config_comparison(config1_results: [BenchResults], config2_results: [Be
     config1_color = '#1f77b4'  # Blue
     config2_color = '#ff7f0e'  # Orange
 
-    # --- CPU Time Comparison (Left Plot) ---
-    ax1.set_title('CPU Time Comparison', pad=10)
+    # --- Wall Time Comparison (Left Plot) ---
+    ax1.set_title('Wall Time Comparison', pad=10)
     ax1.set_xlabel('Systolic Array Size')
-    ax1.set_ylabel('CPU Time (minutes)')
+    ax1.set_ylabel('Wall Time (minutes)')
 
     # Plot config2 time
     sizes2 = [r.sa_size for r in results2]
@@ -376,13 +388,13 @@ def plot_config_comparison(config1_results: [BenchResults], config2_results: [Be
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         print(f"Plot saved to {output_path}")
 
-    plt.show()
+    show_or_close(fig)
 
 
 def plot_multi_config_comparison(configs_results: [[BenchResults]], baseline_results: [BenchResults],
                                  mode='prove', title_label = 'Multi-Configuration', output_path: Path = None, legend_label_size=None):
     """
-    Creates side-by-side comparison plots of CPU time and memory usage between multiple configurations
+    Creates side-by-side comparison plots of wall time and memory usage between multiple configurations
     and a baseline. Only shows successful results for the specified mode.
 
     Args:
@@ -415,10 +427,10 @@ def plot_multi_config_comparison(configs_results: [[BenchResults]], baseline_res
     config_colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
     baseline_color = '#7f7f7f'  # Gray for baseline
 
-    # --- CPU Time Comparison (Left Plot) ---
-    ax1.set_title('CPU Time Comparison', pad=10)
+    # --- Wall Time Comparison (Left Plot) ---
+    ax1.set_title('Wall Time Comparison', pad=10)
     ax1.set_xlabel('Systolic Array Size')
-    ax1.set_ylabel('CPU Time (minutes)')
+    ax1.set_ylabel('Wall Time (minutes)')
 
     # Plot baseline time
     baseline_sizes = [r.sa_size for r in baseline]
@@ -476,18 +488,13 @@ def plot_multi_config_comparison(configs_results: [[BenchResults]], baseline_res
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         print(f"Plot saved to {output_path}")
 
-    plt.show()
-
-# Example usage:
-# config1_results = load_results(CONFIG_NAMES[0])
-# config2_results = load_results(CONFIG_NAMES[1])
-# plot_config_comparison(config1_results, config2_results, mode='prove')
+    show_or_close(fig)
 
 # Convert the results.txt file to a CSV
 # convert_manual_results_txt_to_csv(RESULTS_DIR.parent / 'results.txt', 'FV_GEMM_Fixed_Weights_Each_Cycle')
 
 INTERFACE_CONFIGS = [
-    Config('FV_GEMM_Fixed_Weights_Each_Cycle', 'Interface 1'),
+    Config('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'Interface 1'),
     Config('FV_GEMM_Fixed_Weights_driver', 'Interface 2'),
     Config('FV_GEMM_driver', 'Interface 3')
 ]
@@ -500,43 +507,139 @@ VERIF_CONFIGS = [
     Config('FV_GEMM_FWEC_driver_verif2', 'Assertions 1+2'),
 ]
 
-#########################################
-# PLOT BMC VS PROOF FOR INTERFACE 1
-#########################################
-
-interface1_cfg = INTERFACE_CONFIGS[0]
-interface1_res = load_results(interface1_cfg)
-
-print_benchmark_summary(interface1_cfg, interface1_res)
-plot_bmc_prove_mode_comparison(interface1_res, output_path= IMAGES_DIR / 'interface1_prove_vs_bmc.pdf')
-
-#########################################
-# PLOT COMPARISON OF OTHER INTERFACES
-#########################################
+@dataclass
+class FigureSpec:
+    file_name: str                  # in IMAGES_DIR
+    plot_function: Callable
+    inputs: list                    # Config (its results) or list of Config (a list of their results) per argument
+    arguments: dict = field(default_factory=dict)
 
-other_interfaces_res = []
+    def get_configs(self):
+        return [config for item in self.inputs for config in (item if isinstance(item, list) else [item])]
 
-for i, cfg in enumerate(INTERFACE_CONFIGS[1:]):
-    res = load_results(cfg)
-    print_benchmark_summary(cfg, res)
-    plot_config_comparison(res, interface1_res, mode='bmc', output_path= IMAGES_DIR / f'interface{2+i}_bmc_vs_baseline.pdf')
-    other_interfaces_res.append(res)
+def get_figure_file_name(config: Config):
+    short_name = config.short_name.lower().replace(' ', '_').replace('+', 'plus')
+    return f'{short_name}.pdf'
 
-plot_multi_config_comparison(other_interfaces_res, interface1_res, mode='bmc', title_label='Interface', output_path=IMAGES_DIR / 'interface_comparison.pdf', legend_label_size=14)
+def get_figure_specs() -> [FigureSpec]:
+    baseline = INTERFACE_CONFIGS[0]
 
-#########################################
-# PLOT ADDITIONAL ASSERTIONS COMPARISON
-#########################################
+    # BMC vs proof for interface 1
+    specs = [FigureSpec('interface1_prove_vs_bmc.pdf', plot_bmc_prove_mode_comparison, [baseline])]
 
-interface1_cfg = INTERFACE_CONFIGS[0]
-interface1_res = load_results(interface1_cfg)
+    # Comparison of the other interfaces
+    for i, cfg in enumerate(INTERFACE_CONFIGS[1:]):
+        specs.append(FigureSpec(f'interface{2+i}_bmc_vs_baseline.pdf', plot_config_comparison, [cfg, baseline], {'mode': 'bmc'}))
+    specs.append(FigureSpec('interface_comparison.pdf', plot_multi_config_comparison, [INTERFACE_CONFIGS[1:], baseline],
+                            {'mode': 'bmc', 'title_label': 'Interface', 'legend_label_size': 14}))
 
-comparison_res = []
+    # Additional assertions comparison
+    for cfg in VERIF_CONFIGS:
+        specs.append(FigureSpec(get_figure_file_name(cfg), plot_config_comparison, [cfg, baseline], {'mode': 'prove'}))
+    specs.append(FigureSpec('assertion_comparison.pdf', plot_multi_config_comparison, [VERIF_CONFIGS, baseline],
+                            {'mode': 'prove', 'title_label': 'Assertion', 'legend_label_size': 13}))
 
-for cfg in VERIF_CONFIGS:
-    res = load_results(cfg)
-    plot_config_comparison(res, interface1_res, mode='prove', output_path=IMAGES_DIR / f'{cfg.short_name.lower().replace(' ', '_').replace('+', 'plus')}.pdf')
-    print_benchmark_summary(cfg, res)
-    comparison_res.append(res)
+    return specs
 
-plot_multi_config_comparison(comparison_res, interface1_res, mode='prove', title_label='Assertion', output_path=IMAGES_DIR / 'assertion_comparison.pdf', legend_label_size=13)
\ No newline at end of file
+def compute_figure_hash(spec: FigureSpec, results_by_config) -> str:
+    """
+    Hash everything a figure depends on: the results it plots, the source of this script (its plotting function and
+    the helpers and style it shares with the other figures), its arguments and the global style. A figure whose hash
+    did not change since it was rendered is not rendered again.
+    """
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    # Plotting functions defined in another module also depend on that module
+    source_file = Path(inspect.getsourcefile(spec.plot_function)).resolve()
+    if source_file != Path(__file__).resolve():
+        digest.update(source_file.read_bytes())
+    digest.update(json.dumps({
+        'arguments': spec.arguments,
+        'style': PLOT_STYLE,
+        'double_plot_fig_size': DOUBLE_PLOT_FIG_SIZE,
+        'matplotlib': matplotlib.__version__,
+    }, sort_keys=True).encode())
+    for config in spec.get_configs():
+        results = sorted((asdict(r) for r in results_by_config[config.full_config_name]), key=lambda r: json.dumps(r, sort_keys=True))
+        digest.update(json.dumps(results, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def load_figure_hashes():
+    if not FIGURE_HASHES_FILE.exists():
+        return {}
+    with open(FIGURE_HASHES_FILE, 'r') as f:
+        return json.load(f)
+
+def store_figure_hashes(figure_hashes):
+    tmp_file = FIGURE_HASHES_FILE.with_name(f'{FIGURE_HASHES_FILE.name}.{os.getpid()}.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(figure_hashes, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, FIGURE_HASHES_FILE)
+
+def render_figure(spec: FigureSpec, inputs):
+    """Render one figure from its inputs (already resolved to results). Runs in a worker process in batch mode."""
+    spec.plot_function(*inputs, output_path=IMAGES_DIR / spec.file_name, **spec.arguments)
+    return spec.file_name
+
+def main():
+    global SHOW_FIGURES
+
+    parser = argparse.ArgumentParser(description='Render the benchmark figures into plotting/img, only re-rendering the ones whose results or plotting code changed.')
+    parser.add_argument('figures', nargs='*', help='File names of the figures to render (all by default)')
+    parser.add_argument('--jobs', '-j', type=int, default=0, help='Number of figures rendered in parallel (0 uses all available cores)')
+    parser.add_argument('--force', action='store_true', help='Render every figure, even if it is up to date')
+    parser.add_argument('--show', action='store_true', help='Show every rendered figure on screen, one after another, instead of rendering headless')
+    parser.add_argument('--tag', '-t', type=str, help='Only plot the runs of this tag (all tags by default)')
+    parser.add_argument('--summary', action='store_true', help='Print a summary of the results of every configuration')
+    args = parser.parse_args()
+
+    SHOW_FIGURES = args.show
+    if not SHOW_FIGURES:
+        # Render without a display (e.g. on build servers)
+        matplotlib.use('Agg')
+
+    # Make sure the results of the all_run_benchmarks CSV files and results.txt are in the results database
+    import_legacy_results()
+
+    specs = get_figure_specs()
+    if args.figures:
+        unknown_figures = set(args.figures) - {spec.file_name for spec in specs}
+        if unknown_figures:
+            parser.error(f'unknown figures: {", ".join(sorted(unknown_figures))}')
+        specs = [spec for spec in specs if spec.file_name in args.figures]
+
+    # Every configuration is loaded once, however many figures use it
+    configs = {config.full_config_name: config for spec in specs for config in spec.get_configs()}
+    results_by_config = {name: load_results(config, args.tag) for name, config in configs.items()}
+
+    if args.summary:
+        for name, config in configs.items():
+            print_benchmark_summary(config, results_by_config[name])
+
+    figure_hashes = load_figure_hashes()
+    stale_specs = []
+    for spec in specs:
+        figure_hash = compute_figure_hash(spec, results_by_config)
+        if args.force or figure_hashes.get(spec.file_name) != figure_hash or not (IMAGES_DIR / spec.file_name).exists():
+            stale_specs.append((spec, figure_hash))
+    print(f'Rendering {len(stale_specs)} of {len(specs)} figures ({len(specs) - len(stale_specs)} up to date)')
+
+    def resolve_inputs(spec):
+        return [[results_by_config[c.full_config_name] for c in item] if isinstance(item, list) else results_by_config[item.full_config_name] for item in spec.inputs]
+
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    arguments = [(spec, resolve_inputs(spec)) for spec, _ in stale_specs]
+    if SHOW_FIGURES:
+        rendered = [render_figure(*argument) for argument in arguments]
+    else:
+        jobs = args.jobs if args.jobs > 0 else len(os.sched_getaffinity(0))
+        with multiprocessing.Pool(max(min(jobs, len(arguments)), 1)) as pool:
+            rendered = pool.starmap(render_figure, arguments)
+
+    # Figures without enough data are not saved, and are tried again next time
+    for spec, figure_hash in stale_specs:
+        if spec.file_name in rendered and (IMAGES_DIR / spec.file_name).exists():
+            figure_hashes[spec.file_name] = figure_hash
+    store_figure_hashes(figure_hashes)
+
+if __name__ == '__main__':
+    main()
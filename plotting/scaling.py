@@ -0,0 +1,250 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import matplotlib
+from matplotlib import pyplot as plt
+import numpy as np
+
+import plot
+from plot import IMAGES_DIR, DOUBLE_PLOT_FIG_SIZE, INTERFACE_CONFIGS, VERIF_CONFIGS, show_or_close
+from results_db import import_legacy_results, query_results
+from run_benchmarks import MAXIMUM_MEMORY_LIMIT_MEGABYTES, MAXIMUM_TIME_LIMIT_SECONDS
+
+SCALING_DIR = IMAGES_DIR / 'scaling'
+
+# Fits of every (interface, command), with a hash of the points and of this script they were computed from
+SCALING_CACHE_FILE = SCALING_DIR / '.scaling_cache.json'
+
+# Metrics fitted against SA_SIZE: result column, name, unit and budget argument
+SCALING_METRICS = [
+    ('execution_time', 'time', 's', 'time_budget'),
+    ('memory', 'memory', 'MB', 'memory_budget'),
+]
+
+# Both models are straight lines once y is taken in log space: log y = log a + b * x', with x' = log SA_SIZE for a
+#   power law y = a * SA_SIZE^b and x' = SA_SIZE for an exponential y = a * e^(b * SA_SIZE)
+SCALING_MODELS = {
+    'power_law': np.log,
+    'exponential': lambda sizes: np.asarray(sizes, dtype=float),
+}
+
+# Two-sided 95% quantiles of the Student t distribution by degrees of freedom; the normal quantile is used beyond 30
+T_QUANTILES_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+                  2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+# Largest SA_SIZE a fit is extrapolated to when looking for the largest size within a budget
+MAXIMUM_EXTRAPOLATED_SA_SIZE = 256
+
+# Short names of the configurations plotted in the report
+SHORT_NAMES = {config.full_config_name: config.short_name for config in INTERFACE_CONFIGS + VERIF_CONFIGS}
+
+@dataclass
+class ScalingFit:
+    model: str
+    log_a: float                # intercept in log space
+    b: float                    # exponent (power law) or rate (exponential)
+    r_squared: float            # of the fit in log space
+    residual_error: float       # standard deviation of the residuals in log space
+    points: int
+    mean_x: float               # mean and spread of the transformed sizes, for the confidence bands
+    sum_squares_x: float
+
+    def get_t_quantile(self):
+        degrees_of_freedom = self.points - 2
+        return T_QUANTILES_95[degrees_of_freedom - 1] if degrees_of_freedom <= len(T_QUANTILES_95) else 1.96
+
+    def predict(self, sizes, interval='confidence'):
+        """
+        Return (estimate, lower bound, upper bound) at sizes. The bounds are the 95% confidence band of the fitted
+        curve, or with interval='prediction' the band in which 95% of single runs are expected to fall.
+        """
+        x = SCALING_MODELS[self.model](np.asarray(sizes, dtype=float))
+        log_y = self.log_a + self.b * x
+        spread = 1 / self.points + (x - self.mean_x) ** 2 / self.sum_squares_x + (1 if interval == 'prediction' else 0)
+        margin = self.get_t_quantile() * self.residual_error * np.sqrt(spread)
+        return np.exp(log_y), np.exp(log_y - margin), np.exp(log_y + margin)
+
+    def describe(self):
+        if self.model == 'power_law':
+            return f'{math.exp(self.log_a):.3g} * SA_SIZE^{self.b:.2f}'
+        return f'{math.exp(self.log_a):.3g} * e^({self.b:.3f} * SA_SIZE)'
+
+def fit_scaling_model(sizes, values, model):
+    """Least-squares fit of a model in log space, or None with fewer than three runs of two distinct sizes"""
+    if len(sizes) < 3 or len(set(sizes)) < 2:
+        return None
+    x = SCALING_MODELS[model](np.asarray(sizes, dtype=float))
+    log_y = np.log(np.asarray(values, dtype=float))
+
+    b, log_a = np.polyfit(x, log_y, 1)
+    residuals = log_y - (log_a + b * x)
+    total = float(np.sum((log_y - log_y.mean()) ** 2))
+    return ScalingFit(
+        model=model,
+        log_a=float(log_a),
+        b=float(b),
+        r_squared=1 - float(np.sum(residuals ** 2)) / total if total > 0 else 1.0,
+        residual_error=math.sqrt(float(np.sum(residuals ** 2)) / (len(sizes) - 2)),
+        points=len(sizes),
+        mean_x=float(x.mean()),
+        sum_squares_x=float(np.sum((x - x.mean()) ** 2)),
+    )
+
+def get_largest_feasible_size(fit, budget, interval=None):
+    """
+    Largest SA_SIZE whose fitted value (or, with interval, the upper bound of its band) is within budget. Returns
+    None if not even SA_SIZE 1 is, and MAXIMUM_EXTRAPOLATED_SA_SIZE if the fit does not grow.
+    """
+    sizes = np.arange(1, MAXIMUM_EXTRAPOLATED_SA_SIZE + 1)
+    estimate, _, upper = fit.predict(sizes, interval or 'confidence')
+    within_budget = (upper if interval is not None else estimate) <= budget
+    if not within_budget[0]:
+        return None
+    # The first size beyond the budget ends the range, even if the band narrows again further out
+    return int(sizes[np.argmin(within_budget)] - 1) if not within_budget.all() else MAXIMUM_EXTRAPOLATED_SA_SIZE
+
+def load_scaling_points(command, tag=None):
+    """Successful runs of a command with the default driver parameters: {interface: [(SA_SIZE, run), ...]}"""
+    points = {}
+    for result in query_results(command=command, tag=tag, success=True, parameters={}):
+        points.setdefault(result['interface'], []).append((result['SA_SIZE'], result))
+    return points
+
+def analyze_scaling(runs, budgets):
+    """Fit every model to every metric of a list of (SA_SIZE, run) and predict the largest size within the budgets"""
+    analysis = {}
+    for column, metric, unit, budget_name in SCALING_METRICS:
+        measured = [(SA_SIZE, run[column]) for SA_SIZE, run in runs if run[column] is not None and run[column] > 0]
+        sizes = [SA_SIZE for SA_SIZE, _ in measured]
+        values = [value for _, value in measured]
+
+        fits = {model: fit_scaling_model(sizes, values, model) for model in SCALING_MODELS}
+        fits = {model: fit for model, fit in fits.items() if fit is not None}
+        best = max(fits, key=lambda model: fits[model].r_squared, default=None)
+
+        analysis[metric] = {
+            'unit': unit,
+            'budget': budgets[budget_name],
+            'sizes': sizes,
+            'values': values,
+            'fits': {model: asdict(fit) for model, fit in fits.items()},
+            'best': best,
+            'largest_feasible_size': get_largest_feasible_size(fits[best], budgets[budget_name]) if best else None,
+            'largest_safe_size': get_largest_feasible_size(fits[best], budgets[budget_name], 'prediction') if best else None,
+        }
+    return analysis
+
+def compute_analysis_hash(runs, budgets):
+    """Hash the points of an analysis, the budgets and this script, so that unchanged analyses are not redone"""
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    points = sorted(json.dumps([SA_SIZE, column, run[column]]) for SA_SIZE, run in runs for column, _, _, _ in SCALING_METRICS)
+    digest.update(json.dumps({'points': points, 'budgets': budgets}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def plot_scaling(interface, command, analysis, output_path: Path = None):
+    """Log-log plot of time and memory against SA_SIZE, with the fitted models, the confidence band of the best one and the budgets"""
+    fig, axes = plt.subplots(1, 2, figsize=DOUBLE_PLOT_FIG_SIZE)
+    fig.suptitle(f'{SHORT_NAMES.get(interface, interface)} ({command.upper()})')
+
+    for ax, (_, metric, unit, _) in zip(axes, SCALING_METRICS):
+        metric_analysis = analysis[metric]
+        ax.set_title(metric.capitalize())
+        ax.set_xlabel('SA Size')
+        ax.set_ylabel(f'{metric.capitalize()} ({unit})')
+        ax.set_xscale('log', base=2)
+        ax.set_yscale('log')
+        ax.grid(True, which='both', alpha=0.3)
+        ax.scatter(metric_analysis['sizes'], metric_analysis['values'], color='black', zorder=3, label='Runs')
+
+        if metric_analysis['sizes']:
+            largest = max(metric_analysis['sizes'] + [metric_analysis['largest_feasible_size'] or 0])
+            sizes = np.linspace(min(metric_analysis['sizes']), min(2 * largest, MAXIMUM_EXTRAPOLATED_SA_SIZE), 200)
+            for model, fit in metric_analysis['fits'].items():
+                fit = ScalingFit(**fit)
+                estimate, lower, upper = fit.predict(sizes)
+                best = model == metric_analysis['best']
+                ax.plot(sizes, estimate, linestyle='-' if best else '--', label=f'{model.replace("_", " ")} (R²={fit.r_squared:.3f})')
+                if best:
+                    ax.fill_between(sizes, lower, upper, alpha=0.2, label='95% confidence')
+
+        ax.axhline(metric_analysis['budget'], color='red', linestyle=':', label='Budget')
+        if metric_analysis['values']:
+            # Keep the far extrapolation of the worse model from squashing the runs
+            ax.set_ylim(min(metric_analysis['values']) / 2, 10 * max(metric_analysis['values'] + [metric_analysis['budget']]))
+        ax.legend(fontsize=9)
+
+    fig.tight_layout()
+    if output_path is not None:
+        fig.savefig(output_path, bbox_inches='tight')
+    show_or_close(fig)
+
+def print_analysis(interface, command, analysis):
+    print(f'{interface} {command}:')
+    for _, metric, unit, _ in SCALING_METRICS:
+        metric_analysis = analysis[metric]
+        if metric_analysis['best'] is None:
+            print(f'  {metric:<7} not enough runs to fit ({len(metric_analysis["sizes"])})')
+            continue
+        for model, fit in metric_analysis['fits'].items():
+            fit = ScalingFit(**fit)
+            marker = '*' if model == metric_analysis['best'] else ' '
+            print(f' {marker}{metric:<7} {model:<12} {fit.describe():<32} R²={fit.r_squared:.4f}  ({fit.points} runs)')
+        print(f'  {metric:<7} largest SA_SIZE within {metric_analysis["budget"]} {unit}: {metric_analysis["largest_feasible_size"]} '
+              f'(with 95% confidence for a single run: {metric_analysis["largest_safe_size"]})')
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit power-law and exponential models of time and memory against SA_SIZE for every interface and command, and predict the largest SA_SIZE within a budget.')
+    parser.add_argument('--interface', '-i', type=str, nargs='+', help='Interfaces to analyze (all by default)')
+    parser.add_argument('--command', '-c', type=str, nargs='+', choices=['bmc', 'prove', 'live'], default=['bmc', 'prove'], help='Commands to analyze')
+    parser.add_argument('--tag', '-t', type=str, help='Only use the runs of this tag (all tags by default)')
+    parser.add_argument('--time-budget', type=float, default=MAXIMUM_TIME_LIMIT_SECONDS, help='Time budget in seconds of a single run')
+    parser.add_argument('--memory-budget', type=float, default=MAXIMUM_MEMORY_LIMIT_MEGABYTES, help='Memory budget in MB of a single run')
+    parser.add_argument('--no-plots', action='store_true', help='Only print the fits, without rendering the log-log plots into plotting/img/scaling')
+    parser.add_argument('--force', action='store_true', help='Redo every analysis, even if its runs did not change')
+    parser.add_argument('--show', action='store_true', help='Show the plots on screen instead of rendering headless')
+    args = parser.parse_args()
+
+    plot.SHOW_FIGURES = args.show
+    if not args.show:
+        matplotlib.use('Agg')
+
+    import_legacy_results()
+    budgets = {'time_budget': args.time_budget, 'memory_budget': args.memory_budget}
+
+    os.makedirs(SCALING_DIR, exist_ok=True)
+    cache = {}
+    if SCALING_CACHE_FILE.exists():
+        with open(SCALING_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+
+    redone = 0
+    for command in args.command:
+        for interface, runs in sorted(load_scaling_points(command, args.tag).items()):
+            if args.interface and interface not in args.interface:
+                continue
+
+            key = f'{interface}/{command}/{args.tag or ""}'
+            output_path = SCALING_DIR / (f'{interface}_{command}_tag_{args.tag}.pdf' if args.tag else f'{interface}_{command}.pdf')
+            analysis_hash = compute_analysis_hash(runs, budgets)
+            entry = cache.get(key)
+            if args.force or args.show or entry is None or entry['hash'] != analysis_hash or (not args.no_plots and not output_path.exists()):
+                entry = {'hash': analysis_hash, 'analysis': analyze_scaling(runs, budgets)}
+                if not args.no_plots:
+                    plot_scaling(interface, command, entry['analysis'], output_path)
+                cache[key] = entry
+                redone += 1
+            print_analysis(interface, command, entry['analysis'])
+
+    tmp_file = SCALING_CACHE_FILE.with_name(f'{SCALING_CACHE_FILE.name}.{os.getpid()}.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, SCALING_CACHE_FILE)
+    print(f'{redone} analyses redone, the others were unchanged ({SCALING_CACHE_FILE})')
+
+if __name__ == '__main__':
+    main()
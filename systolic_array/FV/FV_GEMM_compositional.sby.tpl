@@ -0,0 +1,32 @@
+[tasks]
+prove
+
+[options]
+prove: mode prove
+prove: depth $PROVE_DEPTH
+
+[engines]
+prove: $ENGINE
+
+[script]
+read -verific
+read -formal GEMM_pkg.sv
+read -formal Count_To_Maximum.sv
+read -formal Delay_Skew_In.sv
+read -formal Delay_Skew_Out.sv
+read -formal GEMM.sv
+read -formal PE.sv
+read -formal SA.sv
+read -formal FV_GEMM_compositional.sv
+hierarchy -check -top FV_GEMM_Compositional -chparam SA_SIZE $SA_SIZE -chparam SUBPROBLEM $SUBPROBLEM -chparam TARGET_ROW $TARGET_ROW -chparam TARGET_COL $TARGET_COL
+prep -top FV_GEMM_Compositional
+
+[files]
+FV_GEMM_compositional.sv
+../RTL/Count_To_Maximum.sv
+../RTL/Delay_Skew_In.sv
+../RTL/Delay_Skew_Out.sv
+../RTL/GEMM_pkg.sv
+../RTL/GEMM.sv
+../RTL/PE.sv
+../RTL/SA.sv
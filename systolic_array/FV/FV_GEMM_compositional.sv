@@ -0,0 +1,264 @@
+import GEMM_pkg::*;
+
+//////////////////////////////////////////////////////////////////////////
+//  Compositional proof of GEMM.
+//
+//  FV_GEMM_driver.sv proves that the outputs of the whole array match the
+//  reference matrix product at once. Instead, each instance of this module
+//  proves one small contract of the SA/PE structure, selected with the
+//  SUBPROBLEM, TARGET_ROW and TARGET_COL parameters:
+//
+//  SUBPROBLEM_PE        PE[TARGET_ROW][TARGET_COL] computes in * w + acc
+//                       (mod 2^WEIGHT_ACTIVATION_SIZE) and passes it down
+//  SUBPROBLEM_ROW       The inputs of row TARGET_ROW reach column c exactly
+//                       c CMD_STREAM cycles after entering the SA
+//  SUBPROBLEM_COLUMN    Column TARGET_COL accumulates the dot product of
+//                       the inputs of every row with its weights, assuming
+//                       the PE and row contracts of the column
+//  SUBPROBLEM_SKEW_IN   Delay_Skew_In delays row TARGET_ROW by TARGET_ROW+1
+//                       CMD_STREAM cycles
+//  SUBPROBLEM_SKEW_OUT  Delay_Skew_Out delays column TARGET_COL by
+//                       SA_SIZE-TARGET_COL CMD_STREAM cycles
+//  SUBPROBLEM_CONTROL   output_valid is set once 2*SA_SIZE CMD_STREAM cycles
+//                       have passed since the weights were written
+//
+//  compositional.py generates one job per contract, and checks against
+//  gemm_model that the proven delays add up to the specification of
+//  FV_GEMM_driver.sv.
+//////////////////////////////////////////////////////////////////////////
+
+module FV_GEMM_Compositional #(
+    parameter SA_SIZE = 4,
+    parameter WEIGHT_ACTIVATION_SIZE = 8,
+    parameter SUBPROBLEM = 0,
+    parameter TARGET_ROW = 0,
+    parameter TARGET_COL = 0
+) (
+    input logic clk,
+    input logic resetn
+);
+
+localparam SUBPROBLEM_PE = 0;
+localparam SUBPROBLEM_ROW = 1;
+localparam SUBPROBLEM_COLUMN = 2;
+localparam SUBPROBLEM_SKEW_IN = 3;
+localparam SUBPROBLEM_SKEW_OUT = 4;
+localparam SUBPROBLEM_CONTROL = 5;
+
+// Number of past CMD_STREAM cycles remembered by the checker
+localparam HISTORY_DEPTH = 2*SA_SIZE;
+
+`ifdef FORMAL
+
+// Default clocking and reset for all properties
+default clocking cb @(posedge clk); endclocking
+default disable iff (!resetn);
+
+`endif
+
+//////////////////////////////////////////////////////////////////////////
+//  GEMM module instantiation
+//////////////////////////////////////////////////////////////////////////
+
+// Unconstrained inputs on every cycle. The access pattern of the drivers is
+//  only assumed where a contract depends on it (SUBPROBLEM_COLUMN).
+(* anyseq *) logic[WEIGHT_ACTIVATION_SIZE-1:0] weight_inputs[SA_SIZE][SA_SIZE];
+(* anyseq *) logic[WEIGHT_ACTIVATION_SIZE-1:0] activation_inputs[SA_SIZE];
+(* anyseq *) logic[1:0] cmd_value;
+
+command_t cmd;
+assign cmd = command_t'(cmd_value);
+
+// Outputs from GEMM module
+logic[WEIGHT_ACTIVATION_SIZE-1:0] activation_outputs[SA_SIZE];
+logic output_valid;
+
+// Instantiate the GEMM module
+GEMM #(
+    .SA_SIZE(SA_SIZE),
+    .WEIGHT_ACTIVATION_SIZE(WEIGHT_ACTIVATION_SIZE)
+) u_GEMM (
+    .resetn(resetn),
+    .clk(clk),
+    .weight_inputs(weight_inputs),
+    .activation_inputs(activation_inputs),
+    .activation_outputs(activation_outputs),
+    .cmd(cmd),
+    .output_valid(output_valid)
+);
+
+logic should_advance_computation;
+assign should_advance_computation = (cmd == CMD_STREAM);
+
+//////////////////////////////////////////////////////////////////////////
+//  History of the checker
+//////////////////////////////////////////////////////////////////////////
+
+// Values seen k+1 CMD_STREAM cycles ago:
+//    activation_history[r][k]    activation_inputs[r]
+//    sa_input_history[r][k]      input of row r of the SA
+//    sa_output_history[c][k]     output of column c of the SA
+logic[WEIGHT_ACTIVATION_SIZE-1:0] activation_history[SA_SIZE][HISTORY_DEPTH];
+logic[WEIGHT_ACTIVATION_SIZE-1:0] sa_input_history[SA_SIZE][HISTORY_DEPTH];
+logic[WEIGHT_ACTIVATION_SIZE-1:0] sa_output_history[SA_SIZE][HISTORY_DEPTH];
+
+// Whether there has been any CMD_STREAM since reset
+logic streamed;
+
+// CMD_STREAM cycles since the weights were last written, saturating at 2*SA_SIZE
+logic[$clog2(2*SA_SIZE+1)-1:0] streams_since_write;
+
+always_ff @(posedge clk) begin
+    if (!resetn) begin
+        activation_history <= '{default: '0};
+        sa_input_history <= '{default: '0};
+        sa_output_history <= '{default: '0};
+        streamed <= 1'b0;
+        streams_since_write <= 0;
+    end else begin
+        if (should_advance_computation) begin
+            for (int i = 0; i < SA_SIZE; i++) begin
+                activation_history[i][0] <= activation_inputs[i];
+                sa_input_history[i][0] <= u_GEMM.systolic_array_inputs[i];
+                sa_output_history[i][0] <= u_GEMM.systolic_array_outputs[i];
+
+                for (int k = 1; k < HISTORY_DEPTH; k++) begin
+                    activation_history[i][k] <= activation_history[i][k-1];
+                    sa_input_history[i][k] <= sa_input_history[i][k-1];
+                    sa_output_history[i][k] <= sa_output_history[i][k-1];
+                end
+            end
+            streamed <= 1'b1;
+        end
+
+        if (cmd == CMD_WRITE_WEIGHTS) begin
+            streams_since_write <= 0;
+        end else if (should_advance_computation && streams_since_write != 2*SA_SIZE) begin
+            streams_since_write <= streams_since_write + 1;
+        end
+    end
+end
+
+// sa_inputs_ago[r][k]: input of row r of the SA k CMD_STREAM cycles ago (k = 0 is the current input)
+logic[WEIGHT_ACTIVATION_SIZE-1:0] sa_inputs_ago[SA_SIZE][HISTORY_DEPTH+1];
+
+always_comb begin
+    for (int r = 0; r < SA_SIZE; r++) begin
+        sa_inputs_ago[r][0] = u_GEMM.systolic_array_inputs[r];
+        for (int k = 0; k < HISTORY_DEPTH; k++) begin
+            sa_inputs_ago[r][k+1] = sa_input_history[r][k];
+        end
+    end
+end
+
+//////////////////////////////////////////////////////////////////////////
+//  PE contracts
+//////////////////////////////////////////////////////////////////////////
+
+// Inputs of every PE read from the registers of the SA, and the output the
+//  PE should compute from them
+logic[WEIGHT_ACTIVATION_SIZE-1:0] pe_in[SA_SIZE][SA_SIZE];
+logic[WEIGHT_ACTIVATION_SIZE-1:0] pe_acc[SA_SIZE][SA_SIZE];
+logic[WEIGHT_ACTIVATION_SIZE-1:0] expected_pe_out[SA_SIZE][SA_SIZE];
+
+genvar r, c;
+generate
+    for (r = 0; r < SA_SIZE; r = r + 1) begin: R_GEN
+        for (c = 0; c < SA_SIZE; c = c + 1) begin: C_GEN
+            assign pe_in[r][c] = (c == 0) ? u_GEMM.systolic_array_inputs[r] : u_GEMM.u_SA.pe_inputs_reg[r][c-1];
+            assign pe_acc[r][c] = (r == 0) ? '0 : u_GEMM.u_SA.accs_reg[r-1][c];
+            assign expected_pe_out[r][c] = pe_in[r][c] * u_GEMM.u_SA.weights_reg[r][c] + pe_acc[r][c];
+        end
+    end
+endgenerate
+
+//////////////////////////////////////////////////////////////////////////
+//  Formal verification properties
+//////////////////////////////////////////////////////////////////////////
+
+`ifdef FORMAL
+
+// Assume that we always start at reset
+initial assume(!resetn);
+
+generate
+    if (SUBPROBLEM == SUBPROBLEM_PE) begin: PE_CONTRACT
+        if (TARGET_ROW == SA_SIZE-1) begin: LAST_ROW
+            // The last row drives the outputs of the SA
+            assert property (u_GEMM.systolic_array_outputs[TARGET_COL] == expected_pe_out[TARGET_ROW][TARGET_COL]);
+        end else begin: INNER_ROW
+            // The other rows pass their output down through accs_reg on CMD_STREAM
+            assert property (should_advance_computation |=> u_GEMM.u_SA.accs_reg[TARGET_ROW][TARGET_COL] == $past(expected_pe_out[TARGET_ROW][TARGET_COL]));
+            assert property (!should_advance_computation |=> $stable(u_GEMM.u_SA.accs_reg[TARGET_ROW][TARGET_COL]));
+        end
+    end
+
+    if (SUBPROBLEM == SUBPROBLEM_ROW) begin: ROW_CONTRACT
+        for (c = 0; c < SA_SIZE-1; c = c + 1) begin: C_GEN
+            assert property (u_GEMM.u_SA.pe_inputs_reg[TARGET_ROW][c] == sa_inputs_ago[TARGET_ROW][c+1]);
+        end
+    end
+
+    if (SUBPROBLEM == SUBPROBLEM_COLUMN) begin: COLUMN_CONTRACT
+        // The drivers only write the weights before streaming the inputs
+        assume property (streamed |-> cmd != CMD_WRITE_WEIGHTS);
+
+        // Contracts of the PEs of the column and of the rows feeding it, proven by SUBPROBLEM_PE and SUBPROBLEM_ROW
+        for (r = 0; r < SA_SIZE; r = r + 1) begin: R_GEN
+            assume property (pe_in[r][TARGET_COL] == sa_inputs_ago[r][TARGET_COL]);
+
+            if (r == SA_SIZE-1) begin: LAST_ROW
+                assume property (u_GEMM.systolic_array_outputs[TARGET_COL] == expected_pe_out[r][TARGET_COL]);
+            end else begin: INNER_ROW
+                assume property (should_advance_computation |=> u_GEMM.u_SA.accs_reg[r][TARGET_COL] == $past(expected_pe_out[r][TARGET_COL]));
+                assume property (!should_advance_computation |=> $stable(u_GEMM.u_SA.accs_reg[r][TARGET_COL]));
+            end
+        end
+
+        // Before the first CMD_STREAM, the SA has only seen zeros, so weights written then do not change any result
+        logic no_inputs_seen;
+        always_comb begin
+            no_inputs_seen = 1'b1;
+            for (int i = 0; i < SA_SIZE; i++) begin
+                for (int k = 0; k < HISTORY_DEPTH; k++) begin
+                    no_inputs_seen = no_inputs_seen && (sa_input_history[i][k] == '0);
+                end
+            end
+        end
+        assert property (!streamed |-> no_inputs_seen);
+
+        // Accumulator r of the column holds what PE[r] computed on the last CMD_STREAM cycle, and the SA output what
+        //   the last PE computes now: the sum of the products of the column weights with the inputs that entered each
+        //   row of the SA at the right time
+        logic[WEIGHT_ACTIVATION_SIZE-1:0] expected_accs[SA_SIZE];
+        always_comb begin
+            for (int i = 0; i < SA_SIZE; i++) begin
+                expected_accs[i] = '0;
+                for (int k = 0; k <= i; k++) begin
+                    expected_accs[i] += sa_inputs_ago[k][TARGET_COL + i - k + ((i < SA_SIZE-1) ? 1 : 0)] * u_GEMM.u_SA.weights_reg[k][TARGET_COL];
+                end
+            end
+        end
+
+        for (r = 0; r < SA_SIZE-1; r = r + 1) begin: ACC_GEN
+            assert property (u_GEMM.u_SA.accs_reg[r][TARGET_COL] == expected_accs[r]);
+        end
+        assert property (u_GEMM.systolic_array_outputs[TARGET_COL] == expected_accs[SA_SIZE-1]);
+    end
+
+    if (SUBPROBLEM == SUBPROBLEM_SKEW_IN) begin: SKEW_IN_CONTRACT
+        assert property (u_GEMM.systolic_array_inputs[TARGET_ROW] == activation_history[TARGET_ROW][TARGET_ROW]);
+    end
+
+    if (SUBPROBLEM == SUBPROBLEM_SKEW_OUT) begin: SKEW_OUT_CONTRACT
+        assert property (activation_outputs[TARGET_COL] == sa_output_history[TARGET_COL][SA_SIZE-TARGET_COL-1]);
+    end
+
+    if (SUBPROBLEM == SUBPROBLEM_CONTROL) begin: CONTROL_CONTRACT
+        assert property (output_valid == (streams_since_write == 2*SA_SIZE));
+    end
+endgenerate
+
+`endif
+
+endmodule
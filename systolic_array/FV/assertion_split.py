@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from sby_files import parse_sby_sections
+
+REWRITTEN_SOURCE_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'rewritten_sources'
+
+# What a job of a split configuration does with the assertions it does not check:
+#   disable: they are replaced with assertions that always hold, so every job checks exactly one property and the
+#            verdicts combine soundly
+#   assume:  they become assumptions, which constrain the solver more. Two properties that first fail in the same
+#            cycle then hide each other, so a pass of every job is only conclusive in disable mode.
+split_mode_choices = ['disable', 'assume']
+
+# Commands that check liveness assertions (s_eventually). The others only check the safety assertions.
+LIVENESS_COMMANDS = ['live']
+
+ASSERTION_PATTERN = re.compile(r'(?:\b(?P<label>[A-Za-z_]\w*)\s*:\s*)?\b(?P<keyword>assert)\s+(?:property\s*)?\(')
+
+# Words that can precede a colon without labelling the assertion (case items, ternaries)
+NOT_LABELS = {'default', 'begin', 'end', 'else'}
+
+@dataclass(frozen=True)
+class Assertion:
+    name: str
+    source: str             # [files] entry of the file that holds it
+    line: int
+    keyword_start: int      # offset of the assert keyword in the file
+    expression_start: int   # offsets of the property between the parentheses
+    expression_end: int
+    liveness: bool
+
+def mask_comments(text):
+    """Replace the comments and strings of a SystemVerilog source with spaces, keeping every offset and newline"""
+    masked = list(text)
+    for match in re.finditer(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"', text, re.DOTALL):
+        for i in range(match.start(), match.end()):
+            if masked[i] != '\n':
+                masked[i] = ' '
+    return ''.join(masked)
+
+def _find_closing_parenthesis(masked, open_index):
+    depth = 0
+    for i in range(open_index, len(masked)):
+        if masked[i] == '(':
+            depth += 1
+        elif masked[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError(f'unbalanced parentheses in the assertion at offset {open_index}')
+
+def find_assertions(text, source):
+    """
+    Return the assertions of a SystemVerilog source, concurrent (assert property) and immediate, skipping the
+    commented out ones. An assertion is named after its label or the named property it asserts, or otherwise after
+    its file and line. An assertion in a generate loop is one statement, and so one job, for every iteration.
+    """
+    masked = mask_comments(text)
+    assertions = []
+    for match in ASSERTION_PATTERN.finditer(masked):
+        open_index = match.end() - 1
+        close_index = _find_closing_parenthesis(masked, open_index)
+        expression = masked[open_index + 1:close_index].strip()
+        line = text.count('\n', 0, match.start('keyword')) + 1
+
+        label = match.group('label')
+        if label is not None and label not in NOT_LABELS:
+            name = label
+        elif re.fullmatch(r'[A-Za-z_]\w*', expression):
+            name = expression
+        else:
+            name = f'{Path(source).stem}_line_{line}'
+
+        assertions.append(Assertion(
+            name=name,
+            source=source,
+            line=line,
+            keyword_start=match.start('keyword'),
+            expression_start=open_index + 1,
+            expression_end=close_index,
+            liveness=re.search(r'\bs_eventually\b', expression) is not None,
+        ))
+    return assertions
+
+def get_interface_assertions(sby_template, base_dir):
+    """Return the assertions of every source in the [files] section of a template, in file and line order"""
+    assertions = []
+    for entry in parse_sby_sections(sby_template).get('files', []):
+        source = entry.split()[-1]
+        if source.endswith(('.sv', '.v')):
+            assertions += find_assertions((base_dir / source).read_text(), source)
+
+    # Names are the labels of the jobs, so they must be unique
+    counts = {}
+    for assertion in assertions:
+        counts[assertion.name] = counts.get(assertion.name, 0) + 1
+    return [assertion if counts[assertion.name] == 1 else replace(assertion, name=f'{assertion.name}_line_{assertion.line}')
+            for assertion in assertions]
+
+def get_checked_assertions(assertions, sby_command):
+    """The assertions that sby_command checks, each of which becomes one job"""
+    liveness = sby_command in LIVENESS_COMMANDS
+    return [assertion for assertion in assertions if assertion.liveness == liveness]
+
+def rewrite_source(text, assertions, target, split_mode):
+    """
+    Return the source with every assertion but target (of the same file) disabled or turned into an assumption.
+    Liveness assertions are never assumed, as an assumed s_eventually is a fairness constraint on the environment
+    instead of a fact about the design.
+    """
+    assert split_mode in split_mode_choices
+    for assertion in sorted(assertions, key=lambda assertion: assertion.keyword_start, reverse=True):
+        if assertion == target:
+            continue
+        if split_mode == 'assume' and not assertion.liveness:
+            text = text[:assertion.keyword_start] + 'assume' + text[assertion.keyword_start + len('assert'):]
+        else:
+            text = text[:assertion.expression_start] + "1'b1" + text[assertion.expression_end:]
+    return text
+
+def write_rewritten_source(source, text):
+    """
+    Write a rewritten copy of a source into REWRITTEN_SOURCE_DIR and return its path. Copies are named after their
+    content, so jobs that rewrite a source the same way share them.
+    """
+    digest = hashlib.sha256(text.encode()).hexdigest()[:16]
+    rewritten_file = REWRITTEN_SOURCE_DIR / f'{Path(source).stem}_{digest}{Path(source).suffix}'
+    if not rewritten_file.exists():
+        os.makedirs(REWRITTEN_SOURCE_DIR, exist_ok=True)
+        tmp_file = rewritten_file.with_name(f'{rewritten_file.name}.{os.getpid()}.tmp')
+        tmp_file.write_text(text)
+        os.replace(tmp_file, rewritten_file)
+    return str(rewritten_file)
+
+def write_split_sources(base_dir, assertions, target, split_mode):
+    """Write the sources of the job that checks target, and return a dict from their [files] entries to the copies"""
+    overrides = {}
+    for source in sorted({assertion.source for assertion in assertions}):
+        source_assertions = [assertion for assertion in assertions if assertion.source == source]
+        overrides[source] = write_rewritten_source(source, rewrite_source((base_dir / source).read_text(), source_assertions, target, split_mode))
+    return overrides
+
+def combine_split_verdicts(checked_assertions, results):
+    """
+    Combine the benchmark data of every job (a dict from Assertion) into the verdict of the whole configuration.
+    Returns (success, names of the assertions that failed or did not run).
+    """
+    failed = [assertion.name for assertion in checked_assertions if not results.get(assertion, {}).get('success')]
+    return not failed, failed
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from gemm_model import GEMMModel, CMD_WRITE_WEIGHTS, CMD_STREAM
+
+# Checker of FV_GEMM_compositional.sv, run once per sub-problem with different template parameters
+COMPOSITIONAL_INTERFACE = 'FV_GEMM_compositional'
+
+# Name under which a failed check_composition is reported among the failed sub-problems
+COMPOSITION_CHECK = 'composition'
+
+# Values of the SUBPROBLEM parameter of FV_GEMM_compositional.sv
+SUBPROBLEM_KINDS = {
+    'pe': 0,
+    'row': 1,
+    'column': 2,
+    'skew_in': 3,
+    'skew_out': 4,
+    'control': 5,
+}
+
+# The PE, row and column contracts are 1-inductive, so k-induction proves them directly. The delay lines and the
+#   counter need invariants about their internal registers (stalls can be repeated forever), which PDR finds by itself.
+SUBPROBLEM_ENGINES = {
+    'pe': 'smtbmc boolector',
+    'row': 'smtbmc boolector',
+    'column': 'smtbmc boolector',
+    'skew_in': 'abc pdr',
+    'skew_out': 'abc pdr',
+    'control': 'abc pdr',
+}
+
+@dataclass(frozen=True)
+class Subproblem:
+    kind: str
+    row: int = 0
+    column: int = 0
+
+    @property
+    def name(self):
+        if self.kind == 'pe':
+            return f'pe_{self.row}_{self.column}'
+        if self.kind in ('row', 'skew_in'):
+            return f'{self.kind}_{self.row}'
+        if self.kind in ('column', 'skew_out'):
+            return f'{self.kind}_{self.column}'
+        return self.kind
+
+    def get_template_parameters(self):
+        return {
+            'SUBPROBLEM': SUBPROBLEM_KINDS[self.kind],
+            'TARGET_ROW': self.row,
+            'TARGET_COL': self.column,
+            'ENGINE': SUBPROBLEM_ENGINES[self.kind],
+        }
+
+def get_subproblems(SA_SIZE):
+    """
+    Return the contracts that together prove that GEMM computes the matrix product: one per PE, two per row and two per
+    column, and the output counter. Each only involves one PE, row or column, so their number and size grow with the
+    number of PEs instead of the whole array being one problem.
+    """
+    subproblems = [Subproblem('pe', r, c) for r in range(SA_SIZE) for c in range(SA_SIZE)]
+    subproblems += [Subproblem('row', r) for r in range(SA_SIZE)]
+    subproblems += [Subproblem('column', column=c) for c in range(SA_SIZE)]
+    subproblems += [Subproblem('skew_in', r) for r in range(SA_SIZE)]
+    subproblems += [Subproblem('skew_out', column=c) for c in range(SA_SIZE)]
+    subproblems.append(Subproblem('control'))
+    return subproblems
+
+def get_stream_delay(SA_SIZE, row, column):
+    """
+    CMD_STREAM cycles between activation_inputs[row] entering GEMM and its product with weight [row][column] reaching
+    activation_outputs[column], according to the delays proven by the contracts.
+    """
+    skew_in_delay = row + 1                         # skew_in
+    column_delay = column + (SA_SIZE - 1 - row)     # row (to reach the column) and column (to reach the last row)
+    skew_out_delay = SA_SIZE - column               # skew_out
+    return skew_in_delay + column_delay + skew_out_delay
+
+def check_composition(SA_SIZE):
+    """
+    Check the composition of the contracts into the property of FV_GEMM_driver.sv against gemm_model: the output
+    captured on the (2*SA_SIZE + t)-th CMD_STREAM cycle is row t of the inputs times the weights if every product
+    reaches its output 2*SA_SIZE CMD_STREAM cycles after its row was streamed, and output_valid (control) rises
+    exactly when the first row arrives. The model runs one instance per weight [row][column], with only that weight
+    and activation_inputs[row] of the first streamed row set to 1. The product must reach activation_outputs[column]
+    after get_stream_delay cycles (the sum of the delays the skew_in, row, column and skew_out contracts prove), and
+    that must be the cycle output_valid is set in.
+
+    The contracts themselves are proven on the RTL; this only guards the hand-written argument that their delays add
+    up, e.g. after a change of the contracts or of the delay lines of GEMM.
+    """
+    N = SA_SIZE
+    targets = [(r, c) for r in range(N) for c in range(N)]
+    weights = np.zeros((len(targets), N, N), np.uint8)
+    activations = np.zeros((len(targets), N), np.uint8)
+    for i, (r, c) in enumerate(targets):
+        weights[i, r, c] = 1
+        activations[i, r] = 1
+
+    model = GEMMModel(N, len(targets))
+    model.step(CMD_WRITE_WEIGHTS, weight_inputs=weights)
+
+    arrivals = np.full(len(targets), -1)
+    output_valid_cycle = None
+    for cycle in range(4 * N + 1):
+        outputs = model.activation_outputs[np.arange(len(targets)), [c for _, c in targets]]
+        arrivals = np.where((arrivals < 0) & (outputs != 0), cycle, arrivals)
+        if output_valid_cycle is None and model.output_valid[0]:
+            output_valid_cycle = cycle
+        model.step(CMD_STREAM, activation_inputs=activations if cycle == 0 else None)
+
+    return output_valid_cycle == 2 * N and all(arrivals[i] == get_stream_delay(N, r, c) == output_valid_cycle for i, (r, c) in enumerate(targets))
+
+def combine_verdicts(SA_SIZE, results):
+    """
+    Combine the benchmark data of every sub-problem (a dict from Subproblem) into the verdict of the whole
+    configuration. Returns (success, names of the sub-problems that failed or did not run), where the names end with
+    COMPOSITION_CHECK if the proven delays do not compose into the full property.
+    """
+    failed = [subproblem.name for subproblem in get_subproblems(SA_SIZE) if not results.get(subproblem, {}).get('success')]
+    if not check_composition(SA_SIZE):
+        failed.append(COMPOSITION_CHECK)
+    return not failed, failed
@@ -0,0 +1,164 @@
+import re
+from collections import Counter
+from pathlib import Path
+
+# Cells of the coarse-grain RTLIL library that hold state, with their width in the WIDTH parameter. Fine-grain
+#   flip-flops ($_DFF_P_, $_SDFFE_PP0P_, ...) are one bit each.
+FLIP_FLOP_CELLS = {'$ff', '$dff', '$dffe', '$adff', '$adffe', '$sdff', '$sdffe', '$sdffce', '$aldff', '$aldffe', '$dffsr', '$dffsre'}
+
+# Memories prep leaves unmapped, with SIZE words of WIDTH bits of state
+MEMORY_CELLS = {'$mem', '$mem_v2'}
+
+# Scalar metrics of a design, as stored in the results database next to the time and memory of every run:
+#   cells:            cells of the flattened design, submodule instances excluded
+#   flip_flop_bits:   state bits, of the flip-flops and of the memories
+#   multipliers:      $mul cells, multiplier_bits the sum of the products of their operand widths (the size of the
+#                     partial-product arrays the solvers bit-blast), multiplier_width the widest operand
+#   anyconst_bits:    bits of the (* anyconst *) values the solver has to consider, anyseq_bits the same for anyseq
+#   assertions:       $assert cells, and the $check cells of the assert flavour newer Yosys versions create instead
+#   smt2_bytes:       size of the SMT-LIB 2 model written by sby for the smtbmc engines
+#   aiger_latches, aiger_ands: size of the AIGER model written by sby for the abc and aiger engines
+DESIGN_METRICS = ['cells', 'flip_flop_bits', 'multipliers', 'multiplier_bits', 'multiplier_width', 'anyconst_bits', 'anyseq_bits',
+                  'assertions', 'smt2_bytes', 'aiger_latches', 'aiger_ands']
+
+def _parse_constant(token):
+    """Value of an RTLIL constant, e.g. 8, 32'00000000000000000000000000001000 or "text" (text)"""
+    match = re.fullmatch(r"(\d+)'([01xzm-]*)", token)
+    if match is not None:
+        bits = re.sub('[^1]', '0', match.group(2))
+        return int(bits, 2) if bits else 0
+    if re.fullmatch(r'-?\d+', token):
+        return int(token)
+    if len(token) >= 2 and token.startswith('"') and token.endswith('"'):
+        return token[1:-1]
+    return None
+
+def parse_rtlil(text):
+    """
+    Return the modules of an RTLIL design, {name: [(cell type, {parameter: value}), ...]}, and the name of its top
+    module (marked with the top attribute, otherwise the module no other module instantiates)
+    """
+    modules = {}
+    top = None
+    top_attribute = False
+    blocks = []
+    cells = None
+    cell = None
+
+    for line in text.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        keyword = tokens[0]
+        if keyword == 'attribute' and not blocks and len(tokens) >= 3 and tokens[1] == '\\top':
+            top_attribute = _parse_constant(tokens[2]) == 1
+        elif keyword == 'module':
+            blocks.append('module')
+            cells = modules.setdefault(tokens[1], [])
+            if top_attribute:
+                top = tokens[1]
+            top_attribute = False
+        elif keyword == 'cell' and cells is not None:
+            blocks.append('cell')
+            cell = (tokens[1], {})
+            cells.append(cell)
+        elif keyword == 'parameter' and cell is not None:
+            cell[1][tokens[-2].lstrip('\\')] = _parse_constant(tokens[-1])
+        elif keyword in ('process', 'switch'):
+            blocks.append(keyword)
+        elif keyword == 'end' and blocks:
+            block = blocks.pop()
+            if block == 'cell':
+                cell = None
+            elif block == 'module':
+                cells = None
+
+    if top is None:
+        instantiated = {cell_type for cells in modules.values() for cell_type, _ in cells}
+        top = next((name for name in modules if name not in instantiated), None)
+    return modules, top
+
+def _get_module_metrics(modules, name, memo):
+    """Metrics of a module with its submodules flattened into it"""
+    if name in memo:
+        return memo[name]
+
+    metrics = {'cell_counts': Counter(), 'flip_flop_bits': 0, 'multipliers': 0, 'multiplier_bits': 0, 'multiplier_width': 0,
+               'anyconst_bits': 0, 'anyseq_bits': 0, 'assertions': 0}
+    for cell_type, parameters in modules[name]:
+        if cell_type in modules:
+            submodule = _get_module_metrics(modules, cell_type, memo)
+            metrics['cell_counts'] += submodule['cell_counts']
+            for metric, value in submodule.items():
+                if metric == 'multiplier_width':
+                    metrics[metric] = max(metrics[metric], value)
+                elif metric != 'cell_counts':
+                    metrics[metric] += value
+            continue
+
+        metrics['cell_counts'][cell_type] += 1
+        width = parameters.get('WIDTH') or 0
+        if cell_type in FLIP_FLOP_CELLS:
+            metrics['flip_flop_bits'] += width
+        elif cell_type.startswith('$_') and 'FF' in cell_type:
+            metrics['flip_flop_bits'] += 1
+        elif cell_type in MEMORY_CELLS:
+            metrics['flip_flop_bits'] += width * (parameters.get('SIZE') or 0)
+        elif cell_type == '$mul':
+            a_width, b_width = parameters.get('A_WIDTH') or 0, parameters.get('B_WIDTH') or 0
+            metrics['multipliers'] += 1
+            metrics['multiplier_bits'] += a_width * b_width
+            metrics['multiplier_width'] = max(metrics['multiplier_width'], a_width, b_width)
+        elif cell_type == '$anyconst':
+            metrics['anyconst_bits'] += width
+        elif cell_type == '$anyseq':
+            metrics['anyseq_bits'] += width
+        elif cell_type == '$assert' or (cell_type == '$check' and parameters.get('FLAVOR') == 'assert'):
+            metrics['assertions'] += 1
+
+    memo[name] = metrics
+    return metrics
+
+def get_design_metrics(rtlil_file):
+    """
+    The size of an elaborated design (the RTLIL written after prep), counted from its cells with the submodules
+    flattened into the top module: cells by type, state bits, multipliers, anyconst bits and assertions. Returns None
+    if the file is not RTLIL.
+    """
+    try:
+        modules, top = parse_rtlil(Path(rtlil_file).read_text(errors='replace'))
+    except OSError:
+        return None
+    if top is None:
+        return None
+
+    metrics = dict(_get_module_metrics(modules, top, {}))
+    metrics['cell_counts'] = dict(sorted(metrics['cell_counts'].items()))
+    metrics['cells'] = sum(metrics['cell_counts'].values())
+    return metrics
+
+def get_model_sizes(work_dir):
+    """
+    Size of the models sby wrote for the solvers of a job, from the model directories of its work directory:
+    bytes of the SMT2, AIGER and BTOR files, and the inputs, latches and AND gates in the AIGER header.
+    """
+    sizes = {}
+    for model_file in sorted(Path(work_dir).glob('*/model/*')):
+        if model_file.suffix == '.smt2':
+            sizes['smt2_bytes'] = max(sizes.get('smt2_bytes', 0), model_file.stat().st_size)
+        elif model_file.suffix == '.btor':
+            sizes['btor_bytes'] = max(sizes.get('btor_bytes', 0), model_file.stat().st_size)
+        elif model_file.suffix in ('.aig', '.aag'):
+            sizes['aiger_bytes'] = max(sizes.get('aiger_bytes', 0), model_file.stat().st_size)
+            # Header: aig M I L O A, with M the largest variable index
+            with open(model_file, 'rb') as f:
+                header = f.readline().split()
+            if len(header) >= 6 and header[0] in (b'aig', b'aag'):
+                sizes['aiger_inputs'], sizes['aiger_latches'], sizes['aiger_ands'] = int(header[2]), int(header[3]), int(header[5])
+    return sizes
+
+def get_work_dir_design_metrics(work_dir):
+    """Metrics of the design sby elaborated itself, for jobs that did not start from the elaboration cache"""
+    for rtlil_file in sorted(Path(work_dir).glob('*/model/design.il')):
+        return get_design_metrics(rtlil_file)
+    return None
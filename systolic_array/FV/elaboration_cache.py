@@ -0,0 +1,189 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from design_metrics import get_design_metrics
+from sby_files import parse_sby_sections, replace_sby_section
+from supervisor import supervise_command
+
+ELABORATION_CACHE_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'elaboration_cache'
+
+DEFAULT_ELABORATION_CACHE_BUDGET_MEGABYTES = 4 * 1024
+
+# RTLIL of the design after the [script] section of the .sby file (front-end, hierarchy -chparam and prep)
+ELABORATED_DESIGN_FILE = 'design_elaborated.il'
+
+@dataclass
+class ElaboratedDesign:
+    design_hash: str
+    design_file: Path
+    elaboration_time: float     # in seconds, of the run that filled the cache entry
+    cache_hit: bool
+    lock_file: object
+    metrics: dict = None        # size of the design after prep, see design_metrics.get_design_metrics
+
+    def apply(self, sby_text):
+        """Make an .sby file start from the elaborated design instead of reading and elaborating its sources"""
+        sby_text = replace_sby_section(sby_text, 'script', [f'read_rtlil {ELABORATED_DESIGN_FILE}'])
+        return replace_sby_section(sby_text, 'files', [str(self.design_file)])
+
+    def release(self):
+        """Allow the entry to be evicted again once sby has copied the design into its work directory"""
+        self.lock_file.close()
+
+def compute_design_hash(sby_text, base_dir):
+    """
+    Hash what determines the elaborated design: the contents of every file in the [files] section and the
+    [script] section, which holds the substituted parameters (e.g. hierarchy -chparam SA_SIZE). Tasks, options and
+    engines do not change the design, so every command and engine shares the same entry.
+    """
+    sections = parse_sby_sections(sby_text)
+    digest = hashlib.sha256()
+
+    for entry in sorted(sections.get('files', [])):
+        source = entry.split()[-1]
+        digest.update(source.encode())
+        digest.update((base_dir / source).read_bytes())
+
+    digest.update('\n'.join(sections.get('script', [])).encode())
+    return digest.hexdigest()
+
+def _open_entry_lock(design_hash):
+    os.makedirs(ELABORATION_CACHE_DIR, exist_ok=True)
+    return open(ELABORATION_CACHE_DIR / f'{design_hash}.lock', 'a')
+
+def _get_entry_size(entry_dir):
+    return sum(f.stat().st_size for f in entry_dir.rglob('*') if f.is_file())
+
+def _elaborate(sby_text, base_dir, entry_dir, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement):
+    """Run the [script] section of an .sby file with Yosys and write the resulting RTLIL into entry_dir"""
+    sections = parse_sby_sections(sby_text)
+    # Jobs hold the entry lock while elaborating, so the temporary directory is never shared
+    tmp_dir = entry_dir.parent / f'{entry_dir.name}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    src_dir = tmp_dir / 'src'
+    os.makedirs(src_dir)
+
+    # Lay out the sources like sby does in its src directory, so that the script reads them by the same names
+    for entry in sections.get('files', []):
+        *destination, source = entry.split()
+        shutil.copy(base_dir / source, src_dir / (destination[0] if destination else Path(source).name))
+
+    script = sections.get('script', []) + [f'write_rtlil ../{ELABORATED_DESIGN_FILE}']
+    (src_dir / 'elaborate.ys').write_text('\n'.join(script) + '\n')
+
+    start_time = time.perf_counter()
+    supervision = supervise_command(
+        f'cd {src_dir} && yosys -q -l ../elaboration.log -s elaborate.ys',
+        tmp_dir / 'elaboration_output.txt',
+        maximum_memory_limit_in_megabytes,
+        maximum_time_limit_in_seconds,
+        memory_enforcement
+    )
+    elaboration_time = time.perf_counter() - start_time
+
+    if supervision.returncode != 0 or not (tmp_dir / ELABORATED_DESIGN_FILE).exists():
+        return None, tmp_dir
+
+    shutil.rmtree(src_dir)
+    with open(tmp_dir / 'metadata.json', 'w') as f:
+        json.dump({'elaboration_time': elaboration_time, 'created': time.time(), 'metrics': get_design_metrics(tmp_dir / ELABORATED_DESIGN_FILE)}, f, indent=4)
+    os.replace(tmp_dir, entry_dir)
+    return elaboration_time, None
+
+def evict_elaboration_cache(budget_in_megabytes, keep=()):
+    """
+    Delete the least recently used entries until the cache fits in the budget. Entries in use by a running job
+    (or listed in keep) are never deleted.
+    """
+    if not ELABORATION_CACHE_DIR.exists():
+        return
+
+    entries = []
+    for entry_dir in ELABORATION_CACHE_DIR.iterdir():
+        if entry_dir.is_dir() and (entry_dir / 'metadata.json').exists():
+            entries.append((entry_dir.stat().st_mtime, entry_dir, _get_entry_size(entry_dir)))
+
+    total_size = sum(size for _, _, size in entries)
+    budget = budget_in_megabytes * 1024 * 1024
+
+    for _, entry_dir, size in sorted(entries):
+        if total_size <= budget:
+            break
+        if entry_dir.name in keep:
+            continue
+        with _open_entry_lock(entry_dir.name) as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+def get_elaborated_design(sby_text, base_dir, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement='auto', budget_in_megabytes=DEFAULT_ELABORATION_CACHE_BUDGET_MEGABYTES):
+    """
+    Return the cached elaborated design of an .sby file, elaborating it first if no other job has done so yet.
+
+    Returns None if Yosys is not available or the elaboration fails, in which case the job should run the full sby
+    flow. Otherwise the caller must call release() on the result once sby has started.
+    """
+    if shutil.which('yosys') is None:
+        return None
+
+    try:
+        design_hash = compute_design_hash(sby_text, base_dir)
+    except OSError as e:
+        print(f'ERROR: cannot hash the design for the elaboration cache ({e}), running sby on the sources instead')
+        return None
+    entry_dir = ELABORATION_CACHE_DIR / design_hash
+
+    lock_file = _open_entry_lock(design_hash)
+    # Only one job elaborates a design; the other jobs that need it wait here and then reuse it
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    cache_hit = (entry_dir / 'metadata.json').exists()
+    if not cache_hit:
+        # Copying the sources or starting Yosys under the memory enforcement may fail as well (e.g. a RuntimeError
+        #   when no cgroup can be created), which falls back the same way
+        try:
+            elaboration_time, failed_dir = _elaborate(sby_text, base_dir, entry_dir, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement)
+        except (OSError, RuntimeError) as e:
+            print(f'ERROR: elaboration failed ({e}), running sby on the sources instead')
+            lock_file.close()
+            return None
+        if elaboration_time is None:
+            print(f'ERROR: elaboration failed (see {failed_dir / "elaboration_output.txt"}), running sby on the sources instead')
+            lock_file.close()
+            return None
+
+    with open(entry_dir / 'metadata.json', 'r') as f:
+        metadata = json.load(f)
+    # Entries filled before the metrics were recorded get them on their next use
+    if 'metrics' not in metadata:
+        metadata['metrics'] = get_design_metrics(entry_dir / ELABORATED_DESIGN_FILE)
+        with open(entry_dir / 'metadata.json', 'w') as f:
+            json.dump(metadata, f, indent=4)
+
+    # Mark the entry as recently used, and keep it from being evicted while the job uses it
+    os.utime(entry_dir)
+    fcntl.flock(lock_file, fcntl.LOCK_SH)
+
+    evict_elaboration_cache(budget_in_megabytes, keep=(design_hash,))
+
+    return ElaboratedDesign(
+        design_hash=design_hash,
+        design_file=entry_dir / ELABORATED_DESIGN_FILE,
+        elaboration_time=metadata['elaboration_time'],
+        cache_hit=cache_hit,
+        lock_file=lock_file,
+        metrics=metadata['metrics']
+    )
+
+def invalidate_elaboration_cache():
+    """Delete every elaborated design"""
+    shutil.rmtree(ELABORATION_CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,7 @@
+"""
+NumPy models of the GEMM pipeline in RTL/, used as an oracle by the benchmark tooling and to screen RTL and driver
+changes on random matrices before running the solvers.
+"""
+
+from .model import GEMMModel, run_gemm, CMD_WRITE_WEIGHTS, CMD_STREAM, CMD_NONE
+from .reference import gemm_reference, random_gemm_batch
@@ -0,0 +1,46 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from .model import run_gemm
+from .reference import gemm_reference, random_gemm_batch
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the cycle-accurate GEMM model against inputs @ weights on random matrices.')
+    parser.add_argument('--sa-size', '-s', type=int, nargs='+', default=[2, 4, 8, 16, 32, 64], help='Systolic array sizes to check')
+    parser.add_argument('--input-size', type=int, help='Number of input rows (defaults to SA_SIZE)')
+    parser.add_argument('--batch-size', '-b', type=int, default=1024, help='Random matrices simulated together')
+    parser.add_argument('--batches', type=int, default=4, help='Number of batches per size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reference-only', action='store_true', help='Only measure the throughput of the closed-form reference')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failed = False
+
+    for SA_SIZE in args.sa_size:
+        start_time = time.perf_counter()
+        for _ in range(args.batches):
+            weights, inputs = random_gemm_batch(rng, args.batch_size, SA_SIZE, args.input_size)
+            expected = gemm_reference(weights, inputs)
+            if args.reference_only:
+                continue
+
+            actual = run_gemm(weights, inputs)
+            mismatches = np.argwhere(actual != expected)
+            if len(mismatches):
+                b, row, col = mismatches[0]
+                print(f'ERROR: SA_SIZE={SA_SIZE} output[{row}][{col}] of batch element {b} is {actual[b, row, col]}, expected {expected[b, row, col]}')
+                failed = True
+                break
+
+        elapsed_time = time.perf_counter() - start_time
+        matrices_per_second = args.batch_size * args.batches / elapsed_time
+        print(f'{"REFERENCE" if args.reference_only else "SUCCESS"}: SA_SIZE={SA_SIZE} {args.batch_size * args.batches} random matrices in {elapsed_time:.3f} seconds ({matrices_per_second:.0f} matrices per second)')
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Commands of GEMM_pkg::command_t
+CMD_WRITE_WEIGHTS = 0
+CMD_STREAM = 1
+CMD_NONE = 2
+
+class GEMMModel:
+    """
+    Cycle-accurate model of a batch of independent instances of RTL/GEMM.sv with 8-bit weights and activations.
+
+    Every register of the RTL is an array with the batch as its first axis:
+        weights_reg[b, r, c]        SA weights
+        pe_inputs_reg[b, r, c]      SA inputs passed to the right (SA_SIZE-1 columns)
+        accs_reg[b, r, c]           SA partial sums passed down (SA_SIZE-1 rows)
+        skew_in_reg[b, r, k]        Delay_Skew_In shift register of row r (only k <= r is used)
+        skew_out_reg[b, c, k]       Delay_Skew_Out shift register of column c (only k < SA_SIZE-c is used)
+        count, output_valid         Count_To_Maximum with MAX_COUNT = 2*SA_SIZE
+
+    The outputs (activation_outputs, output_valid) are read before calling step(), which applies one clock edge.
+    """
+
+    def __init__(self, SA_SIZE, batch_size=1):
+        self.SA_SIZE = SA_SIZE
+        self.batch_size = batch_size
+        self.max_count = 2 * SA_SIZE
+        self._rows = np.arange(SA_SIZE)
+        self.reset()
+
+    def reset(self):
+        """Apply resetn = 0 for one clock edge"""
+        B, N = self.batch_size, self.SA_SIZE
+        self.weights_reg = np.zeros((B, N, N), np.uint8)
+        self.pe_inputs_reg = np.zeros((B, N, N - 1), np.uint8)
+        self.accs_reg = np.zeros((B, N - 1, N), np.uint8)
+        self.skew_in_reg = np.zeros((B, N, N), np.uint8)
+        self.skew_out_reg = np.zeros((B, N, N), np.uint8)
+        self.count = np.zeros(B, np.int32)
+        self.output_valid = np.zeros(B, bool)
+
+    @property
+    def systolic_array_inputs(self):
+        # Row r of Delay_Skew_In outputs its last register, row_shift_reg[r]
+        return self.skew_in_reg[:, self._rows, self._rows]
+
+    @property
+    def activation_outputs(self):
+        # Column c of Delay_Skew_Out outputs its last register, col_shift_reg[SA_SIZE-c-1]
+        return self.skew_out_reg[:, self._rows, self.SA_SIZE - 1 - self._rows]
+
+    def _compute_pe_outputs(self):
+        """Return the combinational (pe_in, pe_out) of every PE, with the 8-bit wrap-around of PE.sv"""
+        B, N = self.batch_size, self.SA_SIZE
+        pe_in = np.concatenate([self.systolic_array_inputs[:, :, None], self.pe_inputs_reg], axis=2)
+        pe_acc = np.concatenate([np.zeros((B, 1, N), np.uint8), self.accs_reg], axis=1)
+        # uint8 arithmetic wraps around, which is what truncating mult_acc to ACTIVATION_SIZE bits does
+        pe_out = pe_in * self.weights_reg + pe_acc
+        return pe_in, pe_out
+
+    def step(self, cmd, weight_inputs=None, activation_inputs=None):
+        """
+        Apply one clock edge. cmd is a command or an array of one command per batch element; weight_inputs has shape
+        (batch, SA_SIZE, SA_SIZE) and activation_inputs (batch, SA_SIZE), and may be None when they are not used.
+        """
+        B, N = self.batch_size, self.SA_SIZE
+        cmd = np.asarray(cmd)
+        stream = cmd == CMD_STREAM
+        write_weights = cmd == CMD_WRITE_WEIGHTS
+        if activation_inputs is None:
+            activation_inputs = np.zeros((B, N), np.uint8)
+
+        pe_in, pe_out = self._compute_pe_outputs()
+        systolic_array_outputs = pe_out[:, N - 1, :]
+
+        new_pe_inputs_reg = pe_in[:, :, :N - 1]
+        new_accs_reg = pe_out[:, :N - 1, :]
+        new_skew_in_reg = np.concatenate([np.asarray(activation_inputs, np.uint8)[:, :, None], self.skew_in_reg[:, :, :N - 1]], axis=2)
+        new_skew_out_reg = np.concatenate([systolic_array_outputs[:, :, None], self.skew_out_reg[:, :, :N - 1]], axis=2)
+
+        if stream.ndim == 0:
+            # The same command for the whole batch avoids the per-element selects
+            if stream:
+                self.pe_inputs_reg, self.accs_reg = new_pe_inputs_reg, new_accs_reg
+                self.skew_in_reg, self.skew_out_reg = new_skew_in_reg, new_skew_out_reg
+            if write_weights:
+                self.weights_reg = np.array(weight_inputs, np.uint8)
+        else:
+            mask = stream[:, None, None]
+            self.pe_inputs_reg = np.where(mask, new_pe_inputs_reg, self.pe_inputs_reg)
+            self.accs_reg = np.where(mask, new_accs_reg, self.accs_reg)
+            self.skew_in_reg = np.where(mask, new_skew_in_reg, self.skew_in_reg)
+            self.skew_out_reg = np.where(mask, new_skew_out_reg, self.skew_out_reg)
+            if weight_inputs is not None:
+                self.weights_reg = np.where(write_weights[:, None, None], np.asarray(weight_inputs, np.uint8), self.weights_reg)
+
+        # Count_To_Maximum: cleared on CMD_WRITE_WEIGHTS, counts CMD_STREAM cycles up to MAX_COUNT
+        increment = np.broadcast_to(stream, (B,)) & (self.count != self.max_count)
+        clear = np.broadcast_to(write_weights, (B,))
+        self.output_valid = np.where(clear, False, self.output_valid | (increment & (self.count == self.max_count - 1)))
+        self.count = np.where(clear, 0, self.count + increment)
+
+def run_gemm(weights, inputs):
+    """
+    Drive a batch of GEMM models like the FV drivers do: reset, write the weights, stream every input row followed by
+    zeros, and collect an output row on every CMD_STREAM cycle in which output_valid is set.
+
+    weights has shape (batch, SA_SIZE, SA_SIZE) and inputs (batch, INPUT_SIZE, SA_SIZE). Returns the outputs with
+    shape (batch, INPUT_SIZE, SA_SIZE), which match inputs @ weights modulo 256.
+    """
+    weights = np.asarray(weights, np.uint8)
+    inputs = np.asarray(inputs, np.uint8)
+    batch_size, input_size, SA_SIZE = inputs.shape
+
+    model = GEMMModel(SA_SIZE, batch_size)
+    model.step(CMD_WRITE_WEIGHTS, weight_inputs=weights)
+
+    outputs = np.zeros((batch_size, input_size, SA_SIZE), np.uint8)
+    zeros = np.zeros((batch_size, SA_SIZE), np.uint8)
+    output_row_idx = 0
+    stream_idx = 0
+
+    while output_row_idx < input_size:
+        # The output of input row i is valid after 2*SA_SIZE + i streaming cycles
+        if model.output_valid[0]:
+            outputs[:, output_row_idx, :] = model.activation_outputs
+            output_row_idx += 1
+        model.step(CMD_STREAM, activation_inputs=inputs[:, stream_idx, :] if stream_idx < input_size else zeros)
+        stream_idx += 1
+
+    return outputs
@@ -0,0 +1,29 @@
+import numpy as np
+
+# float32 sums of products of 8-bit values are exact while they stay below 2^24
+_FLOAT32_EXACT_LIMIT = 2 ** 24
+
+def gemm_reference(weights, inputs):
+    """
+    Closed-form result of GEMM: inputs @ weights modulo 256, i.e. compute_output_element of the FV drivers for every
+    row and column. Truncating every partial sum to 8 bits in the PEs gives the same result as truncating the final sum.
+
+    weights has shape (batch, SA_SIZE, SA_SIZE) and inputs (batch, INPUT_SIZE, SA_SIZE).
+    """
+    weights = np.asarray(weights, np.uint8)
+    inputs = np.asarray(inputs, np.uint8)
+    SA_SIZE = weights.shape[-1]
+
+    if SA_SIZE * 255 * 255 < _FLOAT32_EXACT_LIMIT:
+        # Batched float32 matmul goes through BLAS and is exact at these sizes
+        products = np.matmul(inputs.astype(np.float32), weights.astype(np.float32)).astype(np.uint32)
+    else:
+        products = np.matmul(inputs.astype(np.uint64), weights.astype(np.uint64))
+    return (products & 0xFF).astype(np.uint8)
+
+def random_gemm_batch(rng, batch_size, SA_SIZE, input_size=None):
+    """Return random (weights, inputs) with shapes (batch, SA_SIZE, SA_SIZE) and (batch, INPUT_SIZE, SA_SIZE)"""
+    input_size = SA_SIZE if input_size is None else input_size
+    weights = rng.integers(0, 256, size=(batch_size, SA_SIZE, SA_SIZE), dtype=np.uint8)
+    inputs = rng.integers(0, 256, size=(batch_size, input_size, SA_SIZE), dtype=np.uint8)
+    return weights, inputs
@@ -0,0 +1,168 @@
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+from string import Template
+
+from sby_files import parse_sby_sections, set_hierarchy_parameters
+from sweep_spec import get_design_parameters, get_recorded_parameters, resolve_depths
+from results_db import encode_parameters
+
+SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+DEPTHS_FILE = SCRIPT_DIR / 'benchmark_output' / 'induction_depths.json'
+
+# The search gives up above this multiple of the default PROVE_DEPTH, 2*(SA_SIZE + 1)
+MAXIMUM_DEPTH_FACTOR = 4
+
+# Outcomes of a prove run at a given depth that the search can use. Any other outcome (fail, i.e. the base case
+#   found a counterexample, an error or a resource limit) stops the search, as a larger depth would not help.
+INDUCTIVE_OUTCOMES = ['pass', 'unknown']
+
+def get_probe_label(interface_sby_filename_without_extension):
+    """Label the prove runs of a search are recorded under, apart from the prove runs of the interface"""
+    return f'{interface_sby_filename_without_extension}_depth_probe'
+
+def compute_design_hash(interface_sby_filename_without_extension, SA_SIZE, parameters=None):
+    """
+    Hash the sources and the prove task of a configuration, leaving PROVE_DEPTH out, so that a stored depth is only
+    used while the design, the driver and the engines it was found with are unchanged.
+    """
+    sby_template = (SCRIPT_DIR / f'{interface_sby_filename_without_extension}.sby.tpl').read_text()
+    sby_text = Template(sby_template).safe_substitute(SA_SIZE=SA_SIZE)
+    design_parameters = get_design_parameters(parameters)
+    if design_parameters:
+        sby_text = set_hierarchy_parameters(sby_text, design_parameters)
+
+    digest = hashlib.sha256()
+    for entry in sorted(parse_sby_sections(sby_text).get('files', [])):
+        source = entry.split()[-1]
+        digest.update(source.encode())
+        digest.update((SCRIPT_DIR / source).read_bytes())
+    digest.update(sby_text.encode())
+    return digest.hexdigest()
+
+def _depth_key(interface_sby_filename_without_extension, SA_SIZE, parameters):
+    recorded_parameters = get_recorded_parameters(interface_sby_filename_without_extension, parameters)
+    return f'{interface_sby_filename_without_extension}/{SA_SIZE}/{encode_parameters(recorded_parameters)}'
+
+def _locked_depths_file():
+    os.makedirs(DEPTHS_FILE.parent, exist_ok=True)
+    f = open(DEPTHS_FILE, 'a+')
+    fcntl.flock(f, fcntl.LOCK_EX)
+    f.seek(0)
+    return f
+
+def _read_depths():
+    if not DEPTHS_FILE.exists():
+        return {}
+    with _locked_depths_file() as f:
+        content = f.read()
+    return json.loads(content) if content else {}
+
+def record_induction_depth(interface_sby_filename_without_extension, SA_SIZE, parameters, depth, outcomes, search_time):
+    """Remember the minimal induction depth of a configuration, with the outcome of every depth tried to find it"""
+    with _locked_depths_file() as f:
+        content = f.read()
+        depths = json.loads(content) if content else {}
+
+        depths[_depth_key(interface_sby_filename_without_extension, SA_SIZE, parameters)] = {
+            'depth': depth,
+            'design_hash': compute_design_hash(interface_sby_filename_without_extension, SA_SIZE, parameters),
+            'outcomes': {str(probed_depth): outcome for probed_depth, outcome in sorted(outcomes.items())},
+            'search_time': search_time,
+        }
+
+        f.seek(0)
+        f.truncate()
+        json.dump(depths, f, indent=4, sort_keys=True)
+
+def get_stored_induction_depth(interface_sby_filename_without_extension, SA_SIZE, parameters=None):
+    """Return the minimal induction depth found for this configuration, or None if it is unknown or out of date"""
+    entry = _read_depths().get(_depth_key(interface_sby_filename_without_extension, SA_SIZE, parameters))
+    if entry is None or entry['design_hash'] != compute_design_hash(interface_sby_filename_without_extension, SA_SIZE, parameters):
+        return None
+    return entry['depth']
+
+def get_starting_depth(interface_sby_filename_without_extension, SA_SIZE, parameters=None):
+    """
+    Depth to start a search from: the depth found before for the same configuration (even if the design changed
+    since, it is usually close), else the one of the closest smaller SA_SIZE, else the default PROVE_DEPTH.
+    """
+    depths = _read_depths()
+    recorded_parameters = encode_parameters(get_recorded_parameters(interface_sby_filename_without_extension, parameters))
+
+    known_sizes = []
+    for key, entry in depths.items():
+        interface, size, encoded_parameters = key.split('/', 2)
+        if interface == interface_sby_filename_without_extension and encoded_parameters == recorded_parameters and int(size) <= SA_SIZE:
+            known_sizes.append(int(size))
+
+    if not known_sizes:
+        return resolve_depths(SA_SIZE)[0]
+    return depths[_depth_key(interface_sby_filename_without_extension, max(known_sizes), parameters)]['depth']
+
+def get_maximum_depth(SA_SIZE):
+    return MAXIMUM_DEPTH_FACTOR * resolve_depths(SA_SIZE)[0]
+
+def search_minimal_depth(probe, start_depth, maximum_depth):
+    """
+    Find the smallest depth at which k-induction proves the properties. probe(depth) runs the prove task at that
+    depth and returns its outcome: pass, unknown (the induction step failed) or anything else, which stops the search.
+
+    A property that is k-inductive is also (k+1)-inductive, so the outcomes are unknown up to the minimal depth and
+    pass from it on. The search gallops from start_depth (doubling the step) towards the minimal depth until it is
+    bracketed between an unknown and a pass, and then bisects the bracket. Starting from a good guess, e.g. the
+    depth of the previous SA_SIZE, takes a few probes instead of one per depth.
+
+    Returns (minimal depth or None, dict from every depth tried to its outcome).
+    """
+    outcomes = {}
+    lower = 0       # Largest depth known not to be inductive
+    upper = None    # Smallest depth known to be inductive
+
+    def try_depth(depth):
+        nonlocal lower, upper
+        outcomes[depth] = probe(depth)
+        if outcomes[depth] == 'pass':
+            upper = depth if upper is None else min(upper, depth)
+        elif outcomes[depth] == 'unknown':
+            lower = max(lower, depth)
+        return outcomes[depth] in INDUCTIVE_OUTCOMES
+
+    if not try_depth(min(max(start_depth, 1), maximum_depth)):
+        return None, outcomes
+
+    step = 1
+    if upper is not None:
+        # Gallop down until a depth is not inductive (or depth 1 is reached)
+        while upper - step > lower:
+            depth = upper - step
+            if not try_depth(depth):
+                return None, outcomes
+            if outcomes[depth] == 'unknown':
+                break
+            step *= 2
+    else:
+        # Gallop up until a depth is inductive
+        while upper is None:
+            if lower >= maximum_depth:
+                return None, outcomes
+            if not try_depth(min(lower + step, maximum_depth)):
+                return None, outcomes
+            step *= 2
+
+    while upper - lower > 1:
+        if not try_depth((lower + upper) // 2):
+            return None, outcomes
+
+    return upper, outcomes
+
+def get_probe_outcome(benchmark_data):
+    """Outcome of a prove run for search_minimal_depth"""
+    if benchmark_data.get('memory_limit_exceeded') or benchmark_data.get('time_limit_exceeded'):
+        return 'limit'
+    if benchmark_data.get('sby_status') is not None:
+        return benchmark_data['sby_status']
+    # Cached results of runs before sby_status was stored
+    return 'pass' if benchmark_data['success'] else 'error'
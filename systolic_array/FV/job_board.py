@@ -0,0 +1,382 @@
+import itertools
+import json
+import multiprocessing
+import os
+import secrets
+import socket
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+
+from supervisor import get_process_tree_memory, kill_process_tree
+from sweeps import get_chain
+from sweep_spec import format_parameters
+from results_db import record_result
+
+DEFAULT_COORDINATOR_HOST = '127.0.0.1'
+DEFAULT_COORDINATOR_PORT = 50051
+# The job board is served with pickle, so whoever knows the key can run code in the coordinator. There is no
+#   built-in key: without one the coordinator generates a random key for its workers.
+DEFAULT_AUTHKEY = os.environ.get('FV_BENCHMARK_AUTHKEY')
+
+# Workers report every HEARTBEAT_INTERVAL_SECONDS. A worker that has not been heard from for WORKER_TIMEOUT_SECONDS
+#   is considered dead and its jobs are handed to other workers, at most MAXIMUM_JOB_ATTEMPTS times per job.
+HEARTBEAT_INTERVAL_SECONDS = 5.0
+WORKER_TIMEOUT_SECONDS = 30.0
+MAXIMUM_JOB_ATTEMPTS = 3
+
+# How often the coordinator and the workers look at the board and at their jobs
+POLL_INTERVAL_SECONDS = 1.0
+
+class JobBoard:
+    """
+    Jobs published by the coordinator and the results pushed back by workers. Lives in the coordinator process
+    and is shared with workers on other hosts through JobBoardManager; every method is thread-safe, as the manager
+    serves each worker connection in its own thread.
+
+    Jobs are plain dicts with at least 'interface', 'command', 'SA_SIZE' and 'estimated_memory', so that they can be
+    sent to workers without depending on the classes of the coordinator.
+    """
+
+    def __init__(self, worker_timeout_in_seconds=WORKER_TIMEOUT_SECONDS):
+        self.worker_timeout_in_seconds = worker_timeout_in_seconds
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._pending = []
+        self._assigned = {}         # job_id -> (job, worker_id)
+        self._attempts = {}         # job_id -> number of times the job was handed out
+        self._workers = {}          # worker_id -> {'cores', 'memory', 'last_seen'}
+        self._cancelled = {}        # worker_id -> job ids the worker must kill
+        self._results = []
+        self._finished = False
+
+    # Coordinator side
+
+    def publish(self, job):
+        with self._lock:
+            job = dict(job, job_id=next(self._job_ids))
+            self._pending.append(job)
+            self._pending.sort(key=lambda job: (job.get('priority', 0), job['SA_SIZE'], job['estimated_memory']))
+            return job['job_id']
+
+    def cancel(self, interface, command, sizes, parameters=None):
+        """Drop the pending jobs of these sizes and tell the workers running them to kill them"""
+        def matches(job):
+            return job['interface'] == interface and job['command'] == command and job.get('parameters', {}) == (parameters or {}) and job['SA_SIZE'] in sizes
+
+        with self._lock:
+            skipped = [job for job in self._pending if matches(job)]
+            self._pending = [job for job in self._pending if job not in skipped]
+
+            cancelled = []
+            for job_id, (job, worker_id) in list(self._assigned.items()):
+                if matches(job):
+                    cancelled.append(job)
+                    self._cancelled.setdefault(worker_id, set()).add(job_id)
+                    del self._assigned[job_id]
+            return skipped, cancelled
+
+    def take_results(self):
+        """Return the (job, benchmark_data) pairs pushed back since the last call"""
+        with self._lock:
+            results, self._results = self._results, []
+            return results
+
+    def reassign_lost_jobs(self):
+        """
+        Put the jobs of workers that stopped reporting back into the queue. Returns the jobs that were given up
+        because they were already handed out MAXIMUM_JOB_ATTEMPTS times.
+        """
+        with self._lock:
+            now = time.monotonic()
+            dead_workers = [worker_id for worker_id, worker in self._workers.items() if now - worker['last_seen'] > self.worker_timeout_in_seconds]
+
+            given_up = []
+            for worker_id in dead_workers:
+                print(f'WORKER LOST: {worker_id} (no heartbeat for {self.worker_timeout_in_seconds:.0f} seconds)')
+                del self._workers[worker_id]
+                self._cancelled.pop(worker_id, None)
+
+                for job_id, (job, assigned_worker_id) in list(self._assigned.items()):
+                    if assigned_worker_id != worker_id:
+                        continue
+                    del self._assigned[job_id]
+                    if self._attempts[job_id] >= MAXIMUM_JOB_ATTEMPTS:
+                        given_up.append(job)
+                    else:
+                        print(f'REASSIGNED: {job["command"]} {job["interface"]} SA_SIZE={job["SA_SIZE"]}')
+                        self._pending.append(job)
+
+            self._pending.sort(key=lambda job: (job.get('priority', 0), job['SA_SIZE'], job['estimated_memory']))
+            return given_up
+
+    def is_idle(self):
+        with self._lock:
+            return not self._pending and not self._assigned and not self._results
+
+    def finish(self):
+        """Tell the workers that no more jobs will be published"""
+        with self._lock:
+            self._finished = True
+
+    # Worker side
+
+    def register_worker(self, worker_id, cores, memory):
+        with self._lock:
+            self._workers[worker_id] = {'cores': cores, 'memory': memory, 'last_seen': time.monotonic()}
+            print(f'WORKER JOINED: {worker_id} ({cores} cores, {memory} MB)')
+
+    def heartbeat(self, worker_id):
+        """Returns False if the worker was declared dead, in which case it must register again"""
+        with self._lock:
+            if worker_id not in self._workers:
+                return False
+            self._workers[worker_id]['last_seen'] = time.monotonic()
+            return True
+
+    def request_job(self, worker_id, free_memory, idle):
+        """
+        Hand the smallest pending job whose estimated memory fits in the free memory of the worker to it.
+
+        A job estimated to be larger than every live worker is given to an idle worker with the most memory, so that
+        it still runs (and fails quickly if it really does not fit). Returns None if there is nothing to do for this
+        worker right now, or the string 'finished' once the coordinator is done.
+        """
+        with self._lock:
+            if self._finished:
+                return 'finished'
+            if worker_id not in self._workers:
+                return None
+
+            chosen = next((job for job in self._pending if job['estimated_memory'] <= free_memory), None)
+            if chosen is None and idle and self._pending:
+                largest_memory = max(worker['memory'] for worker in self._workers.values())
+                if self._workers[worker_id]['memory'] >= largest_memory and self._pending[0]['estimated_memory'] > largest_memory:
+                    chosen = self._pending[0]
+            if chosen is None:
+                return None
+
+            self._pending.remove(chosen)
+            self._assigned[chosen['job_id']] = (chosen, worker_id)
+            self._attempts[chosen['job_id']] = self._attempts.get(chosen['job_id'], 0) + 1
+            return chosen
+
+    def submit_result(self, worker_id, job_id, benchmark_data):
+        with self._lock:
+            # Results of jobs that were cancelled or reassigned in the meantime are dropped
+            if job_id not in self._assigned or self._assigned[job_id][1] != worker_id:
+                return
+            job, _ = self._assigned.pop(job_id)
+            self._results.append((job, benchmark_data))
+
+    def get_cancelled_jobs(self, worker_id):
+        with self._lock:
+            return list(self._cancelled.pop(worker_id, set()))
+
+class JobBoardManager(BaseManager):
+    pass
+
+def generate_authkey():
+    return secrets.token_hex(16)
+
+def serve_job_board(board, address, authkey):
+    """Serve a job board to workers on a background thread of this process"""
+    if not authkey:
+        raise ValueError('the job board is never served without an authkey')
+    JobBoardManager.register('get_job_board', callable=lambda: board)
+    manager = JobBoardManager(address=address, authkey=authkey.encode())
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def connect_to_job_board(address, authkey):
+    """Return a proxy of the job board served by a coordinator"""
+    JobBoardManager.register('get_job_board')
+    manager = JobBoardManager(address=address, authkey=authkey.encode())
+    manager.connect()
+    return manager.get_job_board()
+
+def parse_address(address):
+    """Parse HOST:PORT, HOST or :PORT into a (host, port) tuple. The host defaults to the loopback interface."""
+    host, _, port = address.rpartition(':') if ':' in address else (address, None, None)
+    return host or DEFAULT_COORDINATOR_HOST, int(port) if port else DEFAULT_COORDINATOR_PORT
+
+def describe_job(job):
+    return f'{job["command"]} {job["interface"]}{format_parameters(job["parameters"])} SA_SIZE={job["SA_SIZE"]}'
+
+def store_remote_result(benchmark_data):
+    """Keep the bench file and the results database entry of a job that ran on another host"""
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    bench_file = SCRIPT_DIR / benchmark_data['bench_file']
+    if not bench_file.exists():
+        os.makedirs(bench_file.parent, exist_ok=True)
+        with open(bench_file, 'w') as f:
+            json.dump(benchmark_data, f, indent=4, sort_keys=True)
+    record_result(benchmark_data, bench_file)
+
+def run_coordinator(tag, sweeps, manifest, address, authkey, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    """
+    Publish the jobs planned by several sweeps on a job board served at address, and let workers (possibly on other
+    hosts, see run_worker) run them. run_options is the dict of options every job runs with. Returns once every sweep
+    is done.
+
+    As in run_benchmarks_parallel, sizes that a sweep no longer wants to run are dropped or killed, and the results
+    of jobs that finished in an earlier run are replayed. Jobs of workers that stop sending heartbeats are handed to
+    other workers.
+    """
+    board = JobBoard()
+    if authkey is None:
+        authkey = generate_authkey()
+        print(f'Coordinator authkey: {authkey} (pass it to the workers with --authkey or $FV_BENCHMARK_AUTHKEY)')
+    serve_job_board(board, address, authkey)
+    print(f'Coordinator listening on {address[0]}:{address[1]}')
+
+    sweeps_by_chain = {sweep.chain: sweep for sweep in sweeps}
+    results = {}
+
+    def make_job(sweep, SA_SIZE):
+        return {
+            'tag': tag,
+            'interface': sweep.interface,
+            'command': sweep.command,
+            'SA_SIZE': SA_SIZE,
+            'parameters': sweep.parameters,
+            'estimated_memory': sweep.estimate_memory(SA_SIZE, maximum_memory_limit_in_megabytes),
+            'priority': sweep.priority,
+            'config_label': sweep.config_label,
+            'maximum_memory_limit_in_megabytes': maximum_memory_limit_in_megabytes,
+            'maximum_time_limit_in_seconds': maximum_time_limit_in_seconds,
+            'run_options': run_options,
+        }
+
+    def finish_job(job, benchmark_data):
+        chain = get_chain(job['interface'], job['command'], job['parameters'])
+        results[(chain, job['SA_SIZE'])] = benchmark_data
+        cancelled_sizes = sweeps_by_chain[chain].record(job['SA_SIZE'], benchmark_data)
+
+        skipped_jobs, cancelled_jobs = board.cancel(job['interface'], job['command'], cancelled_sizes, job['parameters'])
+        for skipped_job in skipped_jobs:
+            print(f'SKIPPED: {describe_job(skipped_job)} (SA_SIZE={job["SA_SIZE"]} failed)')
+        for cancelled_job in cancelled_jobs:
+            print(f'CANCELLED: {describe_job(cancelled_job)} (SA_SIZE={job["SA_SIZE"]} failed)')
+        for skipped_job in skipped_jobs + cancelled_jobs:
+            manifest.set_state(chain, skipped_job['SA_SIZE'], 'skipped', f'SA_SIZE={job["SA_SIZE"]} failed')
+
+    while True:
+        for job, benchmark_data in board.take_results():
+            print(f'{"SUCCESS" if benchmark_data["success"] else "ERROR"}: {describe_job(job)} on {benchmark_data.get("host")}')
+            if 'bench_file' in benchmark_data:
+                store_remote_result(benchmark_data)
+            manifest.set_finished(get_chain(job['interface'], job['command'], job['parameters']), job['SA_SIZE'], benchmark_data)
+            finish_job(job, benchmark_data)
+
+        # Jobs whose workers kept dying count as failures
+        for job in board.reassign_lost_jobs():
+            print(f'ERROR: {describe_job(job)} (every worker running it was lost)')
+            benchmark_data = {'success': False, 'execution_time': None, 'memory': None}
+            manifest.set_finished(get_chain(job['interface'], job['command'], job['parameters']), job['SA_SIZE'], benchmark_data)
+            finish_job(job, benchmark_data)
+
+        # Published jobs are marked running, as the coordinator does not know when a worker starts them
+        replayed_jobs = []
+        for sweep in sweeps:
+            for SA_SIZE in sweep.pop_ready_sizes():
+                job = make_job(sweep, SA_SIZE)
+                benchmark_data = manifest.get_replayed_result(sweep.chain, SA_SIZE)
+                if benchmark_data is not None:
+                    replayed_jobs.append((job, benchmark_data))
+                    continue
+                board.publish(job)
+                manifest.set_state(sweep.chain, SA_SIZE, 'running')
+            manifest.record_skipped_sizes(sweep)
+
+        # Replayed after publishing the sizes handed out with them, so that the sizes they cancel are dropped
+        for job, benchmark_data in sorted(replayed_jobs, key=lambda replayed_job: replayed_job[0]['SA_SIZE']):
+            print(f'RESUMED: {describe_job(job)} ({"SUCCESS" if benchmark_data["success"] else "ERROR"} in an earlier run)')
+            finish_job(job, benchmark_data)
+        if replayed_jobs:
+            continue
+
+        if board.is_idle():
+            break
+
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+    # Give the workers the chance to learn that there is nothing left before the board goes away
+    board.finish()
+    time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+    return results
+
+def _run_worker_job(run_job, job, maximum_memory_limit_in_megabytes, result_queue):
+    result_queue.put((job['job_id'], run_job(job, maximum_memory_limit_in_megabytes)))
+
+def run_worker(address, authkey, maximum_parallel_jobs, memory_budget_in_megabytes, run_job, live_metrics=False):
+    """
+    Pull jobs from the coordinator at address and run them with run_job(job, memory limit), which returns the bench
+    data, at most maximum_parallel_jobs at once and only while their estimated memory fits in the memory budget of this
+    host. Returns once the coordinator is done or gone. Whether the jobs publish live metrics is up to the worker, as
+    the endpoint is served by the host that runs them.
+    """
+    board = connect_to_job_board(address, authkey)
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    board.register_worker(worker_id, maximum_parallel_jobs, memory_budget_in_megabytes)
+    print(f'Worker {worker_id} connected to {address[0]}:{address[1]}')
+
+    running = {}
+    result_queue = multiprocessing.Queue()
+    finished = False
+    last_heartbeat = time.monotonic()
+
+    try:
+        while not (finished and not running):
+            if time.monotonic() - last_heartbeat > HEARTBEAT_INTERVAL_SECONDS:
+                if not board.heartbeat(worker_id):
+                    # Declared dead (e.g. the host was suspended): the jobs were already reassigned
+                    print(f'Worker {worker_id} was declared lost by the coordinator, abandoning its jobs')
+                    for job, process in running.values():
+                        kill_process_tree(process.pid)
+                    running = {}
+                    board.register_worker(worker_id, maximum_parallel_jobs, memory_budget_in_megabytes)
+                last_heartbeat = time.monotonic()
+
+            while not result_queue.empty():
+                job_id, benchmark_data = result_queue.get()
+                if job_id in running:
+                    running.pop(job_id)[1].join()
+                    board.submit_result(worker_id, job_id, benchmark_data)
+
+            for job_id, (job, process) in list(running.items()):
+                if not process.is_alive() and result_queue.empty():
+                    process.join()
+                    del running[job_id]
+                    board.submit_result(worker_id, job_id, {'success': False, 'execution_time': None, 'memory': None})
+
+            for job_id in board.get_cancelled_jobs(worker_id):
+                if job_id in running:
+                    job, process = running.pop(job_id)
+                    kill_process_tree(process.pid)
+                    process.join()
+
+            while not finished and len(running) < maximum_parallel_jobs:
+                committed_memory = sum(max(job['estimated_memory'], get_process_tree_memory(process.pid)) for job, process in running.values())
+                job = board.request_job(worker_id, memory_budget_in_megabytes - committed_memory, not running)
+                if job is None:
+                    break
+                if job == 'finished':
+                    finished = True
+                    break
+
+                # A host may have less memory than the per-job limit of the coordinator
+                maximum_memory_limit_in_megabytes = min(job['maximum_memory_limit_in_megabytes'], memory_budget_in_megabytes)
+                job['run_options'] = dict(job['run_options'], live_metrics=live_metrics)
+                process = multiprocessing.Process(target=_run_worker_job, args=(run_job, job, maximum_memory_limit_in_megabytes, result_queue))
+                process.start()
+                running[job['job_id']] = (job, process)
+
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    except (ConnectionError, EOFError):
+        print(f'Worker {worker_id} lost the connection to the coordinator')
+        for job, process in running.values():
+            kill_process_tree(process.pid)
@@ -0,0 +1,176 @@
+import json
+import os
+import socket
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+
+MANIFEST_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'manifests'
+
+# Every process started by a run of run_benchmarks.py, down to the solvers started by sby, inherits this variable.
+#   The processes left behind by a run that died can then be found even after they were re-parented. Processes
+#   forked without exec (the job processes) do not show it in /proc, so the manifest records them instead.
+RUN_ID_VARIABLE = 'FV_BENCHMARK_RUN_ID'
+
+# States of a job in the manifest:
+#   pending: planned by its sweep, not started yet
+#   running: started by the run that owns the manifest (or interrupted, if that run is gone)
+#   done:    finished successfully
+#   failed:  finished unsuccessfully (including resource limits)
+#   skipped: not run, because its time or memory was predicted to exceed the limits or a smaller size failed
+JOB_STATES = ['pending', 'running', 'done', 'failed', 'skipped']
+
+# Results of jobs in these states are replayed into their sweep instead of running the job again
+REPLAYED_STATES = ['done', 'failed']
+
+def _get_process_identity(pid):
+    """(pid, start time) of a process, which unlike the pid alone is not reused by another process"""
+    return {'host': socket.gethostname(), 'pid': pid, 'create_time': psutil.Process(pid).create_time()}
+
+def _is_process_alive(identity):
+    """Whether the process of an identity is still running. Processes of other hosts are assumed alive."""
+    if identity['host'] != socket.gethostname():
+        return True
+    try:
+        return psutil.Process(identity['pid']).create_time() == identity['create_time']
+    except psutil.NoSuchProcess:
+        return False
+
+def reap_orphaned_processes(run_id, job_processes=()):
+    """
+    Kill the processes left behind by the run with this id, and the job processes (identities) it recorded.
+    Returns the number of processes found.
+
+    They are all stopped before any is killed, as a job process that saw its sby process die would otherwise record
+    (and cache) the killed run as a failure.
+    """
+    orphans = []
+    for identity in job_processes:
+        if _is_process_alive(identity):
+            orphans.append(psutil.Process(identity['pid']))
+
+    for process in psutil.process_iter():
+        try:
+            if process.pid != os.getpid() and process not in orphans and process.environ().get(RUN_ID_VARIABLE) == run_id:
+                orphans.append(process)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+
+    for action in (psutil.Process.suspend, psutil.Process.kill):
+        for process in orphans:
+            try:
+                action(process)
+            except psutil.NoSuchProcess:
+                pass
+    return len(orphans)
+
+def get_job_key(chain, SA_SIZE):
+    interface, command, parameters = chain
+    return f'{interface}/{command}/{SA_SIZE}/{parameters}'
+
+class JobManifest:
+    """
+    Persistent state of every job of the sweeps run under a tag, in benchmark_output/manifests/<tag>.json.
+
+    The manifest is owned by one run at a time and rewritten atomically on every change, so that it always holds the
+    state of the last job that started or finished. When a run is interrupted (Ctrl-C, reboot, the harness being
+    killed), the next run with the same tag kills the process trees the dead run left behind, replays the results
+    of its finished jobs into the sweeps and only runs the jobs that were pending or interrupted.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.path = MANIFEST_DIR / f'{tag}.json'
+        self.owner = _get_process_identity(os.getpid())
+        self.owner['run_id'] = f'{self.owner["host"]}:{self.owner["pid"]}:{self.owner["create_time"]}'
+        self.jobs = {}
+
+    @classmethod
+    def open(cls, tag, restart=False):
+        """
+        Take over the manifest of a tag, resuming the state left by the previous run unless restart is set. Raises
+        RuntimeError if another run that is still alive owns it.
+        """
+        manifest = cls(tag)
+        os.environ[RUN_ID_VARIABLE] = manifest.owner['run_id']
+
+        if manifest.path.exists():
+            with open(manifest.path, 'r') as f:
+                content = json.load(f)
+
+            previous_owner = content.get('owner')
+            if previous_owner is not None and _is_process_alive(previous_owner):
+                raise RuntimeError(f'the sweep of tag {tag} is being run by process {previous_owner["pid"]} on {previous_owner["host"]} ({manifest.path})')
+
+            reaped = 0
+            if previous_owner is not None and previous_owner['host'] == socket.gethostname():
+                job_processes = [job['process'] for job in content['jobs'].values() if job['state'] == 'running' and job.get('process') is not None]
+                reaped = reap_orphaned_processes(previous_owner['run_id'], job_processes)
+
+            if not restart:
+                manifest.jobs = content['jobs']
+                interrupted = 0
+                for job in manifest.jobs.values():
+                    if job['state'] == 'running':
+                        job['state'] = 'pending'
+                        interrupted += 1
+
+                counts = {state: sum(job['state'] == state for job in manifest.jobs.values()) for state in REPLAYED_STATES + ['skipped']}
+                print(f'MANIFEST: resuming tag {tag}: ' + ', '.join(f'{count} {state}' for state, count in counts.items())
+                      + f', {interrupted} interrupted' + (f' ({reaped} orphaned processes killed)' if reaped else ''))
+
+        manifest.save()
+        return manifest
+
+    def save(self):
+        os.makedirs(self.path.parent, exist_ok=True)
+        tmp_file = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({'tag': self.tag, 'owner': self.owner, 'jobs': self.jobs}, f, indent=4, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+
+    def set_state(self, chain, SA_SIZE, state, reason=None, benchmark_data=None, pid=None):
+        """Change the state of a job. pid is the process that runs a job that is started."""
+        assert state in JOB_STATES
+        interface, command, parameters = chain
+        job = self.jobs.setdefault(get_job_key(chain, SA_SIZE), {
+            'interface': interface,
+            'command': command,
+            'SA_SIZE': SA_SIZE,
+            'parameters': json.loads(parameters),
+        })
+        job['state'] = state
+        job['updated'] = datetime.now().isoformat()
+        job['reason'] = reason
+        job['process'] = _get_process_identity(pid) if pid is not None else None
+        if benchmark_data is not None:
+            job['result'] = {
+                'success': benchmark_data['success'],
+                'execution_time': benchmark_data['execution_time'],
+                'memory': benchmark_data['memory'],
+                'bench_file': benchmark_data.get('bench_file'),
+            }
+        self.save()
+
+    def set_pending(self, chain, SA_SIZE):
+        """Record that a sweep planned a job, unless the manifest already knows it"""
+        if get_job_key(chain, SA_SIZE) not in self.jobs:
+            self.set_state(chain, SA_SIZE, 'pending')
+
+    def set_finished(self, chain, SA_SIZE, benchmark_data):
+        self.set_state(chain, SA_SIZE, 'done' if benchmark_data['success'] else 'failed', benchmark_data=benchmark_data)
+
+    def record_skipped_sizes(self, sweep):
+        """Mark the sizes a sweep gave up on as skipped"""
+        for SA_SIZE, reason in sweep.pop_skipped_sizes():
+            self.set_state(sweep.chain, SA_SIZE, 'skipped', reason)
+
+    def get_replayed_result(self, chain, SA_SIZE):
+        """The result of a job that finished in an earlier run of the sweep, or None if it still has to run"""
+        job = self.jobs.get(get_job_key(chain, SA_SIZE))
+        if job is None or job['state'] not in REPLAYED_STATES:
+            return None
+        return job['result']
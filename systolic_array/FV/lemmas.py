@@ -0,0 +1,313 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from gemm_model import GEMMModel, CMD_WRITE_WEIGHTS, CMD_STREAM, CMD_NONE, gemm_reference, random_gemm_batch
+from assertion_split import find_assertions, rewrite_source, write_rewritten_source
+
+# Driver whose design (RTL/GEMM.sv) gemm_model simulates, and to which the lemmas refer
+LEMMA_INTERFACE = 'FV_GEMM_driver'
+LEMMA_DRIVER_SOURCE = 'FV_GEMM_driver.sv'
+
+# How the lemmas that survive the simulation are checked:
+#   assert: one prove job with the lemmas as assertions next to the ones of the driver. k-induction assumes every
+#           assertion in the steps before the last, so the lemmas strengthen the induction hypothesis.
+#   assume: two concurrent prove jobs, one proving the lemmas alone and one proving the driver assertions with the
+#           lemmas assumed. The configuration passes when both do.
+lemma_mode_choices = ['assert', 'assume']
+
+# Candidates are generated at every offset within this many streaming cycles of the latency the structure of the
+#   array implies, and the simulation keeps the right ones. A register whose latency the structure gets wrong (e.g.
+#   after a change of the RTL) still gets its lemma, as long as the real latency is within the window.
+LEMMA_OFFSET_WINDOW = 2
+
+# With the lemmas, the output property is 1-inductive, so a shallow induction replaces the default 2*SA_SIZE + 2
+LEMMA_PROVE_DEPTH = 2
+
+LEMMA_SIMULATION_BATCH_SIZE = 256
+
+# States of the driver FSM of FV_GEMM_driver.sv
+S_INITIAL, S_LOAD_WEIGHTS, S_STREAM_INPUTS, S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED, S_DONE = range(5)
+
+# Every family of candidates: the register or driver signal it constrains, and how
+#   skew_in[r][k]        stage k of the Delay_Skew_In shift register of row r holds input row s - offset
+#   pe_input[r][c]       pe_inputs_reg[r][c] holds input row s - offset
+#   partial_sum[r][c]    accs_reg[r][c] holds the sum over k <= r of the products of input row s - offset
+#   skew_out[c][k]       stage k of the Delay_Skew_Out shift register of column c holds the full sum of row s - offset
+#   weight[r][c]         weights_reg[r][c] holds the weights once they are written
+#   counter, output_valid, output_row, outputs_stored: the output counters reach their maximum at s = offset
+#   stream_row, stream_bound, stream_done: the stream count against the state of the driver FSM
+#   reference[i][j]      the registered reference outputs hold the product of the anyconst matrices
+# where s is the number of CMD_STREAM cycles since reset (lemma_stream_count).
+LEMMA_FAMILIES = ['skew_in', 'pe_input', 'partial_sum', 'skew_out', 'weight', 'counter', 'output_valid', 'output_row',
+                  'outputs_stored', 'stream_row', 'stream_bound', 'stream_done', 'reference']
+
+@dataclass(frozen=True)
+class Lemma:
+    family: str
+    index: tuple = ()
+    offset: int = 0
+
+    @property
+    def name(self):
+        offset = [] if self.offset == 0 else [f'd{self.offset}'] if self.offset > 0 else [f'dm{-self.offset}']
+        return '_'.join(['lemma', self.family] + [str(i) for i in self.index] + offset)
+
+    def get_expression(self, SA_SIZE):
+        """The SystemVerilog property of the lemma, in the scope of the FV_GEMM module"""
+        s = 'lemma_stream_count'
+        index, offset = self.index, self.offset
+        # Input row that reached the register, i.e. the stream count minus the offset
+        row = s if offset == 0 else f'{s} - {offset}' if offset > 0 else f'{s} + {-offset}'
+        if self.family == 'skew_in':
+            return f'u_GEMM.u_Delay_Skew_In.R_GEN[{index[0]}].row_shift_reg[{index[1]}] == lemma_input({row}, {index[0]})'
+        if self.family == 'pe_input':
+            return f'u_GEMM.u_SA.pe_inputs_reg[{index[0]}][{index[1]}] == lemma_input({row}, {index[0]})'
+        if self.family == 'partial_sum':
+            return f'u_GEMM.u_SA.accs_reg[{index[0]}][{index[1]}] == lemma_partial_sum({row}, {index[0]}, {index[1]})'
+        if self.family == 'skew_out':
+            return f'u_GEMM.u_Delay_Skew_Out.R_GEN[{index[0]}].col_shift_reg[{index[1]}] == lemma_partial_sum({row}, {SA_SIZE - 1}, {index[0]})'
+        if self.family == 'weight':
+            return f'lemma_weights_loaded |-> u_GEMM.u_SA.weights_reg[{index[0]}][{index[1]}] == weights[{index[0]}][{index[1]}]'
+        if self.family == 'counter':
+            return f'u_GEMM.u_Count_To_Maximum.count == ({s} < {offset} ? {s} : {offset})'
+        if self.family == 'output_valid':
+            return f'output_valid == ({s} >= {offset})'
+        if self.family == 'output_row':
+            return f'!all_outputs_stored |-> output_row_idx == ({s} > {offset} ? {s} - {offset} : 0)'
+        if self.family == 'outputs_stored':
+            return f'all_outputs_stored == ({s} >= {offset})'
+        if self.family == 'stream_row':
+            return f'state == S_STREAM_INPUTS |-> {row} == input_row_idx'
+        if self.family == 'stream_bound':
+            return f'(state == S_INITIAL || state == S_LOAD_WEIGHTS) |-> {s} == 0'
+        if self.family == 'stream_done':
+            return f'state == S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED |-> {s} >= {offset}'
+        if self.family == 'reference':
+            return f'reference_outputs[{index[0]}][{index[1]}] == lemma_partial_sum({index[0]}, {SA_SIZE - 1}, {index[1]})'
+        raise ValueError(f'unknown lemma family {self.family}')
+
+def _offsets(structural_offset):
+    return range(structural_offset - LEMMA_OFFSET_WINDOW, structural_offset + LEMMA_OFFSET_WINDOW + 1)
+
+def generate_candidates(SA_SIZE, INPUT_SIZE):
+    """
+    Return the candidate lemmas of FV_GEMM_driver for one size. Values move one register per CMD_STREAM cycle, so
+    the structural offset of a register is the number of registers between the driver and it: an input reaches
+    stage k of row r of Delay_Skew_In after k+1 cycles, PE (r, c) after r+c+1 more, and so on. The counters reach
+    their maximum after 2*SA_SIZE cycles, and the last output is stored after INPUT_SIZE more.
+    """
+    N = SA_SIZE
+    candidates = []
+    candidates += [Lemma('skew_in', (r, k), d) for r in range(N) for k in range(r + 1) for d in _offsets(k + 1)]
+    candidates += [Lemma('pe_input', (r, c), d) for r in range(N) for c in range(N - 1) for d in _offsets(r + c + 2)]
+    candidates += [Lemma('partial_sum', (r, c), d) for r in range(N - 1) for c in range(N) for d in _offsets(r + c + 2)]
+    candidates += [Lemma('skew_out', (c, k), d) for c in range(N) for k in range(N - c) for d in _offsets(N + c + k + 1)]
+    candidates += [Lemma('weight', (r, c)) for r in range(N) for c in range(N)]
+    candidates += [Lemma(family, (), d) for family in ('counter', 'output_valid', 'output_row') for d in _offsets(2 * N)]
+    candidates += [Lemma('outputs_stored', (), d) for d in _offsets(2 * N + INPUT_SIZE)]
+    candidates += [Lemma('stream_row', (), d) for d in _offsets(0)]
+    candidates.append(Lemma('stream_bound'))
+    candidates += [Lemma('stream_done', (), d) for d in _offsets(INPUT_SIZE)]
+    candidates += [Lemma('reference', (i, j)) for i in range(INPUT_SIZE) for j in range(N)]
+    return candidates
+
+def get_maximum_stream_count(SA_SIZE, INPUT_SIZE):
+    """lemma_stream_count saturates here, beyond the largest offset of any candidate, so that it stays bounded"""
+    return 2 * SA_SIZE + INPUT_SIZE + LEMMA_OFFSET_WINDOW + 1
+
+def simulate_driver(weights, inputs):
+    """
+    Run a batch of GEMM models the way the FSM of FV_GEMM_driver.sv drives GEMM, from reset until S_DONE, where
+    nothing changes anymore. Yields the state of the driver and the model before every clock edge.
+    """
+    batch_size, INPUT_SIZE, SA_SIZE = inputs.shape
+    model = GEMMModel(SA_SIZE, batch_size)
+    maximum_stream_count = get_maximum_stream_count(SA_SIZE, INPUT_SIZE)
+    zeros = np.zeros((batch_size, SA_SIZE), np.uint8)
+
+    state, input_row_idx, output_row_idx, all_outputs_stored, stream_count = S_INITIAL, 0, 0, False, 0
+    while True:
+        cmd = {S_LOAD_WEIGHTS: CMD_WRITE_WEIGHTS, S_STREAM_INPUTS: CMD_STREAM, S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED: CMD_STREAM}.get(state, CMD_NONE)
+        yield {
+            'model': model,
+            'state': state,
+            'input_row_idx': input_row_idx,
+            'output_row_idx': output_row_idx,
+            'all_outputs_stored': all_outputs_stored,
+            'stream_count': stream_count,
+        }
+        if state == S_DONE:
+            return
+
+        next_state = state
+        if state == S_INITIAL:
+            next_state = S_LOAD_WEIGHTS
+        elif state == S_LOAD_WEIGHTS:
+            next_state = S_STREAM_INPUTS
+        elif state == S_STREAM_INPUTS and input_row_idx == INPUT_SIZE - 1:
+            next_state = S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED
+        elif state == S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED and all_outputs_stored:
+            next_state = S_DONE
+
+        if model.output_valid[0] and cmd == CMD_STREAM and not all_outputs_stored:
+            all_outputs_stored = output_row_idx == INPUT_SIZE - 1
+            output_row_idx += 1
+
+        model.step(cmd, weight_inputs=weights, activation_inputs=inputs[:, input_row_idx, :] if state == S_STREAM_INPUTS else zeros)
+        if cmd == CMD_STREAM and stream_count != maximum_stream_count:
+            stream_count += 1
+        if state == S_STREAM_INPUTS:
+            input_row_idx += 1
+        state = next_state
+
+class _StreamValues:
+    """Input rows and partial sums by input row, zero for the rows before and after the ones streamed"""
+
+    def __init__(self, weights, inputs):
+        batch_size, self.input_size, SA_SIZE = inputs.shape
+        self.inputs = inputs
+        self.zeros = np.zeros((batch_size, SA_SIZE), np.uint8)
+        # partial_sums[b, i, k, c]: sum over k' <= k of inputs[b, i, k'] * weights[b, k', c], modulo 256
+        products = inputs.astype(np.uint32)[:, :, :, None] * weights.astype(np.uint32)[:, None, :, :]
+        self.partial_sums = (np.cumsum(products, axis=2) & 0xFF).astype(np.uint8)
+        self.zero_sums = np.zeros((batch_size, SA_SIZE, SA_SIZE), np.uint8)
+        self.reference = gemm_reference(weights, inputs)
+
+    def row(self, i):
+        return self.inputs[:, i, :] if 0 <= i < self.input_size else self.zeros
+
+    def sums(self, i):
+        return self.partial_sums[:, i] if 0 <= i < self.input_size else self.zero_sums
+
+def _holds(lemma, cycle, values, weights):
+    """Whether a lemma holds for every matrix of the batch in one cycle of simulate_driver"""
+    model, s = cycle['model'], cycle['stream_count']
+    index, offset = lemma.index, lemma.offset
+    N = model.SA_SIZE
+    if lemma.family == 'skew_in':
+        return np.array_equal(model.skew_in_reg[:, index[0], index[1]], values.row(s - offset)[:, index[0]])
+    if lemma.family == 'pe_input':
+        return np.array_equal(model.pe_inputs_reg[:, index[0], index[1]], values.row(s - offset)[:, index[0]])
+    if lemma.family == 'partial_sum':
+        return np.array_equal(model.accs_reg[:, index[0], index[1]], values.sums(s - offset)[:, index[0], index[1]])
+    if lemma.family == 'skew_out':
+        return np.array_equal(model.skew_out_reg[:, index[0], index[1]], values.sums(s - offset)[:, N - 1, index[0]])
+    if lemma.family == 'weight':
+        loaded = cycle['state'] not in (S_INITIAL, S_LOAD_WEIGHTS)
+        return not loaded or np.array_equal(model.weights_reg[:, index[0], index[1]], weights[:, index[0], index[1]])
+    if lemma.family == 'counter':
+        return bool(np.all(model.count == min(s, offset)))
+    if lemma.family == 'output_valid':
+        return bool(np.all(model.output_valid == (s >= offset)))
+    if lemma.family == 'output_row':
+        return cycle['all_outputs_stored'] or cycle['output_row_idx'] == max(s - offset, 0)
+    if lemma.family == 'outputs_stored':
+        return cycle['all_outputs_stored'] == (s >= offset)
+    if lemma.family == 'stream_row':
+        return cycle['state'] != S_STREAM_INPUTS or s == cycle['input_row_idx'] + offset
+    if lemma.family == 'stream_bound':
+        return cycle['state'] not in (S_INITIAL, S_LOAD_WEIGHTS) or s == 0
+    if lemma.family == 'stream_done':
+        return cycle['state'] != S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED or s >= offset
+    if lemma.family == 'reference':
+        # reference_outputs is registered without reset from the anyconst matrices, so it holds the reference product
+        #   in every cycle after reset: check the partial sum the lemma compares it to against that product
+        return np.array_equal(values.reference[:, index[0], index[1]], values.sums(index[0])[:, N - 1, index[1]])
+    raise ValueError(f'unknown lemma family {lemma.family}')
+
+def filter_candidates(candidates, SA_SIZE, INPUT_SIZE, batch_size=LEMMA_SIMULATION_BATCH_SIZE, seed=0):
+    """
+    Keep the candidates that hold in every cycle of the driver on batch_size random matrices. The survivors are
+    likely invariants of the design, which the solver then proves; a candidate that a simulation refutes would
+    only cost a failed proof. Random 8-bit values tell apart the rows and partial sums at different offsets.
+    """
+    rng = np.random.default_rng(seed)
+    weights, inputs = random_gemm_batch(rng, batch_size, SA_SIZE, INPUT_SIZE)
+    # Corner cases of the arithmetic: all zeros and all ones (the products wrap around)
+    weights[:2], inputs[:2] = 0, 0
+    weights[1], inputs[1] = 255, 255
+    values = _StreamValues(weights, inputs)
+
+    alive = list(candidates)
+    for cycle in simulate_driver(weights, inputs):
+        alive = [lemma for lemma in alive if _holds(lemma, cycle, values, weights)]
+
+    # Lower bounds of the stream count all hold below the real one, and the largest implies the others
+    largest_bound = max((lemma.offset for lemma in alive if lemma.family == 'stream_done'), default=None)
+    return [lemma for lemma in alive if lemma.family != 'stream_done' or lemma.offset == largest_bound]
+
+def render_lemmas(lemmas, SA_SIZE, INPUT_SIZE, keyword='assert'):
+    """The SystemVerilog block that declares the lemma helpers and asserts (or assumes) every lemma"""
+    lines = [
+        '',
+        '`ifdef FORMAL',
+        '',
+        '///////////////////////////////////////////////',
+        f'//  LEMMAS (generated by lemmas.py for SA_SIZE = {SA_SIZE}, INPUT_SIZE = {INPUT_SIZE})',
+        '///////////////////////////////////////////////',
+        '',
+        '// Number of CMD_STREAM cycles since reset, saturating beyond the latency of the last output',
+        'int lemma_stream_count;',
+        'always_ff @(posedge clk) begin',
+        '    if (!resetn) begin',
+        '        lemma_stream_count <= 0;',
+        f'    end else if (cmd == CMD_STREAM && lemma_stream_count != {get_maximum_stream_count(SA_SIZE, INPUT_SIZE)}) begin',
+        '        lemma_stream_count <= lemma_stream_count + 1;',
+        '    end',
+        'end',
+        '',
+        'logic lemma_weights_loaded;',
+        'assign lemma_weights_loaded = state != S_INITIAL && state != S_LOAD_WEIGHTS;',
+        '',
+        '// Input row of a stream cycle, zero before and after the rows the driver streams',
+        'function automatic logic[WEIGHT_ACTIVATION_SIZE-1:0] lemma_input(input int row, input int k);',
+        "    return (row >= 0 && row < INPUT_SIZE) ? inputs[row][k] : '0;",
+        'endfunction',
+        '',
+        '// Partial sum of an input row down to row last_k of column col',
+        'function automatic logic[WEIGHT_ACTIVATION_SIZE-1:0] lemma_partial_sum(input int row, input int last_k, input int col);',
+        '    logic[WEIGHT_ACTIVATION_SIZE-1:0] sum;',
+        '    sum = 0;',
+        '    for (int k = 0; k <= last_k; k++) begin',
+        '        sum += lemma_input(row, k) * weights[k][col];',
+        '    end',
+        '    return sum;',
+        'endfunction',
+        '',
+    ]
+    lines += [f'{lemma.name}: {keyword} property ({lemma.get_expression(SA_SIZE)});' for lemma in lemmas]
+    lines += ['', '`endif', '']
+    return '\n'.join(lines)
+
+def insert_lemmas(driver_text, lemma_block):
+    """Insert a lemma block at the end of the FV_GEMM module of the driver"""
+    position = driver_text.rindex('endmodule')
+    return driver_text[:position] + lemma_block + '\n' + driver_text[position:]
+
+def write_lemma_sources(base_dir, lemmas, SA_SIZE, INPUT_SIZE, lemma_mode):
+    """
+    Write the drivers of the jobs that check the lemmas, and return a dict from the label of every job to the
+    source overrides it runs with (see run_single_benchmark)
+    """
+    assert lemma_mode in lemma_mode_choices
+    driver_text = (base_dir / LEMMA_DRIVER_SOURCE).read_text()
+    if lemma_mode == 'assert':
+        text = insert_lemmas(driver_text, render_lemmas(lemmas, SA_SIZE, INPUT_SIZE, 'assert'))
+        return {f'{LEMMA_INTERFACE}_lemmas': {LEMMA_DRIVER_SOURCE: write_rewritten_source(LEMMA_DRIVER_SOURCE, text)}}
+
+    # The lemmas alone, with every assertion of the driver disabled, and the driver with the lemmas assumed
+    lemmas_only_text = rewrite_source(driver_text, find_assertions(driver_text, LEMMA_DRIVER_SOURCE), None, 'disable')
+    lemmas_only_text = insert_lemmas(lemmas_only_text, render_lemmas(lemmas, SA_SIZE, INPUT_SIZE, 'assert'))
+    assumed_text = insert_lemmas(driver_text, render_lemmas(lemmas, SA_SIZE, INPUT_SIZE, 'assume'))
+    return {
+        f'{LEMMA_INTERFACE}_lemmas_only': {LEMMA_DRIVER_SOURCE: write_rewritten_source(LEMMA_DRIVER_SOURCE, lemmas_only_text)},
+        f'{LEMMA_INTERFACE}_lemmas_assumed': {LEMMA_DRIVER_SOURCE: write_rewritten_source(LEMMA_DRIVER_SOURCE, assumed_text)},
+    }
+
+def get_lemma_input_size(declared_parameters, parameters):
+    """INPUT_SIZE of a lemma run, from its parameters or the default of the driver"""
+    input_size = (parameters or {}).get('INPUT_SIZE', declared_parameters.get('INPUT_SIZE'))
+    if (parameters or {}).get('WEIGHT_ACTIVATION_SIZE', declared_parameters.get('WEIGHT_ACTIVATION_SIZE')) != 8:
+        raise ValueError('lemmas are only generated for WEIGHT_ACTIVATION_SIZE = 8, the width gemm_model simulates')
+    return input_size
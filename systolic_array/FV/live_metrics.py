@@ -0,0 +1,234 @@
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import psutil
+
+from sweeps import fit_power_law, predict_power_law
+
+LIVE_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'live'
+
+# A job writes its status at most this often, whatever the rate of its output and memory samples
+LIVE_STATUS_INTERVAL_SECONDS = 1.0
+
+# Interval between two snapshots of the running jobs in the JSON-lines stream
+JSONL_INTERVAL_SECONDS = 10.0
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+# Name, help and status field of every per-job gauge
+JOB_METRICS = [
+    ('fv_job_elapsed_seconds', 'Wall time since the job started', 'elapsed'),
+    ('fv_job_memory_megabytes', 'Current memory (RSS) of the process tree of the job', 'memory'),
+    ('fv_job_peak_memory_megabytes', 'Peak memory (RSS) of the process tree of the job', 'peak_memory'),
+    ('fv_job_memory_limit_megabytes', 'Memory limit of the job', 'memory_limit'),
+    ('fv_job_time_limit_seconds', 'Time limit of the job', 'time_limit'),
+    ('fv_job_step', 'Current BMC or base case step of the job (the deepest step of any engine)', 'step'),
+    ('fv_job_induction_step', 'Current induction step of a prove job (counts down from the target step)', 'induction_step'),
+    ('fv_job_target_step', 'Depth at which the job finishes', 'target_step'),
+    ('fv_job_step_elapsed_seconds', 'Time spent in the current step of the least advanced engine', 'step_elapsed'),
+    ('fv_job_seconds_since_output', 'Time since the job last printed a line', 'since_output'),
+    ('fv_job_projected_remaining_seconds', 'Projected time until the job reaches its target step', 'projected_remaining'),
+    ('fv_job_projected_completion_timestamp_seconds', 'Projected Unix time at which the job reaches its target step', 'projected_completion'),
+]
+
+JOB_LABELS = ['job', 'tag', 'interface', 'command', 'sa_size', 'host', 'pid']
+
+def get_step_progress(step, target_step):
+    """
+    Number of steps its engine has finished once a step (of the timeline of SbyTimelineObserver) ends, out of
+    target_step. BMC and base case steps count up from 0, but induction counts down from target_step.
+    """
+    if step['kind'] == 'induction':
+        return target_step - step['step'] + 1
+    return step['step'] + 1
+
+def project_total_time(steps, target_step):
+    """
+    Project the elapsed time at which the job reaches target_step, from the steps that finished so far (timeline
+    steps of SbyTimelineObserver). The end time of the steps of every engine and kind is fitted with a power law of
+    its progress (get_step_progress), as each step unrolls one more cycle. The job finishes with the slowest of
+    them. Returns None if no engine finished two steps yet.
+    """
+    if target_step is None:
+        return None
+
+    end_times = {}
+    for step in steps:
+        end_times.setdefault((step['engine'], step['kind']), []).append((get_step_progress(step, target_step), step['start'] + step['duration']))
+
+    projections = []
+    for points in end_times.values():
+        fit = fit_power_law(points)
+        if fit is not None:
+            projections.append(predict_power_law(fit, target_step))
+    return max(projections, default=None)
+
+class LiveJobObserver:
+    """
+    Follows a running job through its timeline observer and the memory samples of its supervisor, and keeps its
+    status in a file of LIVE_DIR for the metrics endpoint. The file is rewritten at most every
+    LIVE_STATUS_INTERVAL_SECONDS, so following the job costs nothing measurable. It is deleted when the job ends.
+    """
+
+    def __init__(self, timeline_observer, labels, target_step, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds):
+        self.timeline_observer = timeline_observer
+        self.labels = dict(labels, host=socket.gethostname(), pid=str(os.getpid()))
+        self.target_step = target_step
+        self.maximum_memory_limit_in_megabytes = maximum_memory_limit_in_megabytes
+        self.maximum_time_limit_in_seconds = maximum_time_limit_in_seconds
+
+        self.status_file = LIVE_DIR / f'{labels["job"]}_{os.getpid()}.json'
+        self.start_timestamp = time.time()
+        self.memory = 0.0
+        self.peak_memory = 0.0
+        self.last_output = time.perf_counter()
+        self.last_write = None
+        os.makedirs(LIVE_DIR, exist_ok=True)
+        self._write_status()
+
+    def on_output_line(self, line):
+        self.last_output = time.perf_counter()
+        self._write_status_if_due()
+
+    def on_memory_sample(self, memory):
+        self.memory = memory
+        self.peak_memory = max(self.peak_memory, memory)
+        self._write_status_if_due()
+
+    def _write_status_if_due(self):
+        if time.perf_counter() - self.last_write >= LIVE_STATUS_INTERVAL_SECONDS:
+            self._write_status()
+
+    def get_status(self):
+        now = time.perf_counter()
+        elapsed = now - self.timeline_observer.start_time
+
+        open_steps = self.timeline_observer.get_open_steps()
+        base_steps = [step['step'] for step in open_steps if step['kind'] != 'induction']
+        induction_steps = [step['step'] for step in open_steps if step['kind'] == 'induction']
+        # The job is as far as its least advanced engine
+        current_step = None
+        if open_steps and self.target_step is not None:
+            current_step = min(open_steps, key=lambda step: get_step_progress(step, self.target_step))
+        elif open_steps:
+            current_step = open_steps[0]
+
+        projected_total = project_total_time(self.timeline_observer.steps, self.target_step)
+        projected_remaining = max(projected_total - elapsed, 0.0) if projected_total is not None else None
+
+        return {
+            'labels': self.labels,
+            'timestamp': time.time(),
+            'elapsed': elapsed,
+            'memory': self.memory,
+            'peak_memory': self.peak_memory,
+            'memory_limit': self.maximum_memory_limit_in_megabytes,
+            'time_limit': self.maximum_time_limit_in_seconds,
+            'step': max(base_steps, default=None),
+            'induction_step': min(induction_steps, default=None),
+            'step_kind': current_step['kind'] if current_step is not None else None,
+            'target_step': self.target_step,
+            'step_elapsed': elapsed - current_step['start'] if current_step is not None else None,
+            'since_output': now - self.last_output,
+            'projected_remaining': projected_remaining,
+            'projected_completion': time.time() + projected_remaining if projected_remaining is not None else None,
+        }
+
+    def _write_status(self):
+        self.last_write = time.perf_counter()
+        tmp_file = self.status_file.with_name(f'{self.status_file.name}.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.get_status(), f)
+        os.replace(tmp_file, self.status_file)
+
+    def finish(self):
+        self.status_file.unlink(missing_ok=True)
+
+def read_live_statuses():
+    """Status of every running job of this host. Files of jobs whose process is gone (e.g. killed) are deleted."""
+    statuses = []
+    for status_file in sorted(LIVE_DIR.glob('*.json')):
+        try:
+            with open(status_file, 'r') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not psutil.pid_exists(int(status['labels']['pid'])):
+            status_file.unlink(missing_ok=True)
+            continue
+        # Times are as of the last write of the status, bring them up to date
+        delay = time.time() - status['timestamp']
+        for name in ('elapsed', 'step_elapsed', 'since_output'):
+            if status[name] is not None:
+                status[name] += delay
+        if status['projected_remaining'] is not None:
+            status['projected_remaining'] = max(status['projected_remaining'] - delay, 0.0)
+        statuses.append(status)
+    return statuses
+
+def _format_labels(labels):
+    escaped = {name: str(labels[name]).replace('\\', '\\\\').replace('"', '\\"') for name in JOB_LABELS}
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped.items()) + '}'
+
+def render_prometheus(statuses):
+    """The statuses of the running jobs in the Prometheus text exposition format"""
+    lines = [
+        '# HELP fv_jobs_running Number of verification jobs running on this host',
+        '# TYPE fv_jobs_running gauge',
+        f'fv_jobs_running {len(statuses)}',
+    ]
+    for name, description, field in JOB_METRICS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} gauge')
+        for status in statuses:
+            value = status[field]
+            lines.append(f'{name}{_format_labels(status["labels"])} {value if value is not None else "NaN"}')
+    return '\n'.join(lines) + '\n'
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = render_prometheus(read_live_statuses()).encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/jobs':
+            body = json.dumps(read_live_statuses(), indent=4).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404, 'Metrics are served at /metrics (Prometheus) and /jobs (JSON)')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a line in the benchmark output
+        pass
+
+def _write_jsonl_snapshots(jsonl_file):
+    while True:
+        statuses = read_live_statuses()
+        if statuses:
+            with open(jsonl_file, 'a') as f:
+                for status in statuses:
+                    f.write(json.dumps(status) + '\n')
+        time.sleep(JSONL_INTERVAL_SECONDS)
+
+def serve_live_metrics(address=None, jsonl_file=None):
+    """
+    Serve the metrics of the running jobs of this host at http://HOST:PORT/metrics, and/or append a snapshot of
+    them to jsonl_file every JSONL_INTERVAL_SECONDS, from daemon threads of the calling process. Scrapes read the
+    status files of the jobs, so they never touch the processes that supervise them.
+    """
+    if address is not None:
+        server = ThreadingHTTPServer(address, _MetricsRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f'Metrics served at http://{address[0]}:{server.server_address[1]}/metrics')
+    if jsonl_file is not None:
+        threading.Thread(target=_write_jsonl_snapshots, args=(jsonl_file,), daemon=True).start()
@@ -0,0 +1,115 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from sby_files import parse_sby_sections
+from sweep_spec import resolve_depths
+from results_db import encode_parameters
+
+WINNERS_FILE = Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'portfolio_winners.json'
+
+# Commands whose engines are replaced by the portfolio. live keeps the engines of the template, as only a few
+#   engines (e.g. aiger suprove) support liveness properties.
+PORTFOLIO_COMMANDS = ['bmc', 'prove']
+
+# Engine statuses that settle a task. Other statuses (UNKNOWN, TIMEOUT, ERROR) let the remaining engines continue.
+CONCLUSIVE_STATUSES = ['pass', 'fail']
+
+# sby reports the engine that settled the task with a line such as
+#   SBY 12:00:00 [workdir] summary: engine_1 (smtbmc yices) returned pass
+ENGINE_SUMMARY_PATTERN = re.compile(r'summary: engine_(\d+) \((.*?)\) returned (\w+)')
+
+class EngineRaceObserver:
+    """Follows the sby output of a portfolio run and records which engine settled the task first"""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.winning_engine = None
+        self.winning_status = None
+
+    def on_output_line(self, line):
+        match = ENGINE_SUMMARY_PATTERN.search(line)
+        if match is None or self.winning_engine is not None:
+            return
+
+        engine_index, engine, status = int(match.group(1)), match.group(2), match.group(3).lower()
+        if status in CONCLUSIVE_STATUSES:
+            self.winning_engine = engine if engine else self.engines[engine_index]
+            self.winning_status = status
+
+def compute_design_hash(sby_text, base_dir):
+    """
+    Hash the contents of every file in the [files] section of a task, so that a winner is only steered to while the
+    design and the driver it won on are unchanged. The .sby text is left out, as it differs between SA sizes and the
+    engines are what the portfolio picks.
+    """
+    digest = hashlib.sha256()
+    for entry in sorted(parse_sby_sections(sby_text).get('files', [])):
+        source = entry.split()[-1]
+        digest.update(source.encode())
+        digest.update((base_dir / source).read_bytes())
+    return digest.hexdigest()
+
+def get_portfolio_parameters(recorded_parameters, sby_command, SA_SIZE, PROVE_DEPTH, BMC_DEPTH):
+    """The parameters a winner is remembered under: the recorded ones, and the depth of the command if not the default"""
+    default_depth = dict(zip(('prove', 'bmc'), resolve_depths(SA_SIZE))).get(sby_command)
+    depth = {'prove': PROVE_DEPTH, 'bmc': BMC_DEPTH}.get(sby_command)
+    if depth == default_depth:
+        return dict(recorded_parameters)
+    return {**recorded_parameters, f'{sby_command.upper()}_DEPTH': depth}
+
+def _winner_key(interface_sby_filename_without_extension, sby_command, SA_SIZE, parameters):
+    return f'{interface_sby_filename_without_extension}/{sby_command}/{SA_SIZE}/{encode_parameters(parameters)}'
+
+def _locked_winners_file():
+    os.makedirs(WINNERS_FILE.parent, exist_ok=True)
+    f = open(WINNERS_FILE, 'a+')
+    fcntl.flock(f, fcntl.LOCK_EX)
+    f.seek(0)
+    return f
+
+def record_winning_engine(interface_sby_filename_without_extension, sby_command, SA_SIZE, parameters, design_hash, engine, execution_time):
+    """
+    Remember the engine that won a portfolio race, keeping the fastest winning time seen for each configuration. A
+    winner found on an older design is replaced.
+    """
+    with _locked_winners_file() as f:
+        content = f.read()
+        winners = json.loads(content) if content else {}
+
+        key = _winner_key(interface_sby_filename_without_extension, sby_command, SA_SIZE, parameters)
+        if key not in winners or winners[key].get('design_hash') != design_hash or execution_time < winners[key]['execution_time']:
+            winners[key] = {'engine': engine, 'execution_time': execution_time, 'design_hash': design_hash}
+
+        f.seek(0)
+        f.truncate()
+        json.dump(winners, f, indent=4, sort_keys=True)
+
+def get_preferred_engine(interface_sby_filename_without_extension, sby_command, SA_SIZE, parameters, design_hash):
+    """
+    Return the engine that won the portfolio for this interface, command and parameters on the same design at the
+    same SA_SIZE, or else at the closest smaller SA_SIZE, or None if no portfolio has been run for them yet.
+    """
+    if not WINNERS_FILE.exists():
+        return None
+
+    with _locked_winners_file() as f:
+        content = f.read()
+        winners = json.loads(content) if content else {}
+
+    encoded_parameters = encode_parameters(parameters)
+    known_sizes = []
+    for key, entry in winners.items():
+        # Winners of older designs, and the ones recorded before the design was part of the entry, are never used
+        if entry.get('design_hash') != design_hash:
+            continue
+        interface, command, size, winner_parameters = key.split('/', 3)
+        if interface == interface_sby_filename_without_extension and command == sby_command and winner_parameters == encoded_parameters and int(size) <= SA_SIZE:
+            known_sizes.append(int(size))
+
+    if not known_sizes:
+        return None
+    return winners[_winner_key(interface_sby_filename_without_extension, sby_command, max(known_sizes), parameters)]['engine']
@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import math
+import statistics
+import sys
+
+from results_db import query_results
+
+# Points of the regression suite: (interface, command, SA_SIZE). Each is run several times under a tag (see
+#   --regression of run_benchmarks.py), and the runs of two tags are compared with compare_tags. The points cover
+#   both commands and grow up to SA_SIZE 16, where a slowdown of the design or the driver shows the most.
+REGRESSION_POINTS = [
+    ('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'bmc', 4),
+    ('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'bmc', 8),
+    ('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'bmc', 16),
+    ('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'prove', 4),
+    ('FV_GEMM_Fixed_Weights_Each_Cycle_driver', 'prove', 8),
+    ('FV_GEMM_driver', 'bmc', 8),
+]
+
+# Metrics compared between tags: result column, name and unit
+REGRESSION_METRICS = [
+    ('execution_time', 'time', 's'),
+    ('cpu_time', 'cpu', 's'),
+    ('memory', 'memory', 'MB'),
+]
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SIGNIFICANCE = 0.05
+
+# A difference must also be at least this large (relative to the baseline median) to count as a regression, so that
+#   many runs of a stable point do not flag differences of a few percent
+DEFAULT_THRESHOLD = 0.1
+
+# Above this number of rank assignments the p-value of the Mann-Whitney test uses the normal approximation
+EXACT_TEST_MAXIMUM_ASSIGNMENTS = 100000
+
+def median_confidence_interval(values, confidence=DEFAULT_CONFIDENCE):
+    """
+    Distribution-free confidence interval of the median of values: the order statistics x_(k) and x_(n+1-k), with k
+    the largest rank such that P(Binomial(n, 1/2) < k) <= (1 - confidence)/2. Fewer than 6 values are too few for a
+    95% interval, so their whole range is returned.
+    """
+    values = sorted(values)
+    n = len(values)
+    k = 0
+    tail = 0.0
+    while k < n:
+        tail += math.comb(n, k) / 2 ** n
+        if tail > (1 - confidence) / 2:
+            break
+        k += 1
+    if k == 0:
+        return values[0], values[-1]
+    return values[k - 1], values[n - k]
+
+def _ranks(values):
+    """Ranks (from 1) of values, ties getting the average of their ranks"""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for position in range(i, j + 1):
+            ranks[order[position]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+def mann_whitney_p_value(baseline, candidate):
+    """
+    One-sided p-value of the Mann-Whitney U test that the values of candidate tend to be larger than the ones of
+    baseline. It makes no assumption on the distribution of the run times, which have long tails. Small samples get
+    the exact p-value (enumerating every assignment of the ranks), larger ones the normal approximation.
+    """
+    ranks = _ranks(list(baseline) + list(candidate))
+    candidate_ranks = ranks[len(baseline):]
+    rank_sum = sum(candidate_ranks)
+
+    n, m = len(ranks), len(candidate)
+    if math.comb(n, m) <= EXACT_TEST_MAXIMUM_ASSIGNMENTS:
+        sums = [sum(assignment) for assignment in itertools.combinations(ranks, m)]
+        return sum(s >= rank_sum - 1e-9 for s in sums) / len(sums)
+
+    mean = m * (n + 1) / 2
+    deviation = math.sqrt(m * (n - m) * (n + 1) / 12)
+    # Continuity correction
+    return 0.5 * math.erfc((rank_sum - 0.5 - mean) / deviation / math.sqrt(2))
+
+def _group_by_point(results):
+    points = {}
+    for result in results:
+        points.setdefault((result['interface'], result['command'], result['SA_SIZE'], result['parameters']), []).append(result)
+    return points
+
+def compare_tags(baseline_tag, candidate_tag, confidence=DEFAULT_CONFIDENCE, significance=DEFAULT_SIGNIFICANCE, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the runs of every point that both tags ran. Returns a list of comparisons, one per point and metric:
+    dicts with the point, the median and confidence interval of each tag, the ratio of the medians, the p-value and
+    whether the candidate regressed. A point whose runs all succeeded in the baseline and not in the candidate is a
+    regression whatever its metrics.
+    """
+    baseline_points = _group_by_point(query_results(tag=baseline_tag))
+    candidate_points = _group_by_point(query_results(tag=candidate_tag))
+
+    comparisons = []
+    for point in sorted(baseline_points.keys() & candidate_points.keys()):
+        baseline_runs, candidate_runs = baseline_points[point], candidate_points[point]
+        new_failures = all(run['success'] for run in baseline_runs) and not all(run['success'] for run in candidate_runs)
+
+        for column, metric, unit in REGRESSION_METRICS:
+            baseline_values = [run[column] for run in baseline_runs if run['success'] and run[column] is not None]
+            candidate_values = [run[column] for run in candidate_runs if run['success'] and run[column] is not None]
+            comparison = {
+                'interface': point[0],
+                'command': point[1],
+                'SA_SIZE': point[2],
+                'parameters': json.loads(point[3]),
+                'metric': metric,
+                'unit': unit,
+                'baseline_runs': len(baseline_runs),
+                'candidate_runs': len(candidate_runs),
+                'new_failures': new_failures,
+                'baseline_median': None,
+                'baseline_interval': None,
+                'candidate_median': None,
+                'candidate_interval': None,
+                'ratio': None,
+                'p_value': None,
+                'regression': new_failures,
+            }
+            if baseline_values and candidate_values:
+                comparison['baseline_median'] = statistics.median(baseline_values)
+                comparison['baseline_interval'] = median_confidence_interval(baseline_values, confidence)
+                comparison['candidate_median'] = statistics.median(candidate_values)
+                comparison['candidate_interval'] = median_confidence_interval(candidate_values, confidence)
+                if comparison['baseline_median'] > 0:
+                    comparison['ratio'] = comparison['candidate_median'] / comparison['baseline_median']
+                comparison['p_value'] = mann_whitney_p_value(baseline_values, candidate_values)
+                slower = comparison['ratio'] is not None and comparison['ratio'] > 1 + threshold
+                comparison['regression'] = new_failures or (slower and comparison['p_value'] < significance)
+            comparisons.append(comparison)
+    return comparisons
+
+def summarize_tag(tag, confidence=DEFAULT_CONFIDENCE):
+    """Median and confidence interval of every metric of every point run under a tag"""
+    summaries = []
+    for point, runs in sorted(_group_by_point(query_results(tag=tag)).items()):
+        summary = {'interface': point[0], 'command': point[1], 'SA_SIZE': point[2], 'parameters': json.loads(point[3]),
+                   'runs': len(runs), 'failures': sum(not run['success'] for run in runs)}
+        for column, metric, unit in REGRESSION_METRICS:
+            values = [run[column] for run in runs if run['success'] and run[column] is not None]
+            summary[metric] = (statistics.median(values), *median_confidence_interval(values, confidence)) if values else None
+        summaries.append(summary)
+    return summaries
+
+def _format_point(result):
+    parameters = ''.join(f' {name}={value}' for name, value in sorted(result['parameters'].items()))
+    return f'{result["interface"]} {result["command"]} {result["SA_SIZE"]}{parameters}'
+
+def _format_estimate(median, interval, unit):
+    if median is None:
+        return '-'
+    return f'{median:.2f} {unit} [{interval[0]:.2f}, {interval[1]:.2f}]'
+
+def print_summary(tag, summaries, confidence=DEFAULT_CONFIDENCE):
+    print(f'Tag {tag}: median [{confidence:.0%} confidence interval] of the successful runs')
+    print(f'{"Point":<55} {"Runs":>5} {"Failed":>6}  ' + ' '.join(f'{metric.capitalize():<32}' for _, metric, _ in REGRESSION_METRICS))
+    for summary in summaries:
+        estimates = [_format_estimate(summary[metric][0], summary[metric][1:], unit) if summary[metric] is not None else '-' for _, metric, unit in REGRESSION_METRICS]
+        print(f'{_format_point(summary):<55} {summary["runs"]:>5} {summary["failures"]:>6}  ' + ' '.join(f'{estimate:<32}' for estimate in estimates))
+
+def print_comparison(baseline_tag, candidate_tag, comparisons, confidence=DEFAULT_CONFIDENCE):
+    print(f'{candidate_tag} against {baseline_tag}: median [{confidence:.0%} confidence interval] of the successful runs')
+    print(f'{"Point":<55} {"Metric":<7} {"Runs":>7}  {baseline_tag:<32} {candidate_tag:<32} {"Ratio":>6} {"p":>7}')
+    for comparison in comparisons:
+        ratio = f'{comparison["ratio"]:.2f}' if comparison['ratio'] is not None else '-'
+        p_value = f'{comparison["p_value"]:.4f}' if comparison['p_value'] is not None else '-'
+        verdict = ' REGRESSION' + (' (new failures)' if comparison['new_failures'] else '') if comparison['regression'] else ''
+        print(f'{_format_point(comparison):<55} {comparison["metric"]:<7} {comparison["baseline_runs"]:>3}/{comparison["candidate_runs"]:<3}  '
+              f'{_format_estimate(comparison["baseline_median"], comparison["baseline_interval"], comparison["unit"]):<32} '
+              f'{_format_estimate(comparison["candidate_median"], comparison["candidate_interval"], comparison["unit"]):<32} '
+              f'{ratio:>6} {p_value:>7}{verdict}')
+
+def report_regressions(baseline_tag, candidate_tag, confidence=DEFAULT_CONFIDENCE, significance=DEFAULT_SIGNIFICANCE, threshold=DEFAULT_THRESHOLD):
+    """Print the comparison of two tags and return whether the candidate regressed"""
+    comparisons = compare_tags(baseline_tag, candidate_tag, confidence, significance, threshold)
+    if not comparisons:
+        print(f'ERROR: tags {baseline_tag} and {candidate_tag} have no point in common')
+        return True
+    print_comparison(baseline_tag, candidate_tag, comparisons, confidence)
+
+    regressions = {_format_point(comparison) for comparison in comparisons if comparison['regression']}
+    if regressions:
+        print(f'REGRESSION: {len(regressions)} of {len({_format_point(c) for c in comparisons})} points of {candidate_tag} are significantly worse than {baseline_tag} (p < {significance}, more than {threshold:.0%} slower or larger)')
+    else:
+        print(f'SUCCESS: no significant regression of {candidate_tag} against {baseline_tag}')
+    return bool(regressions)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the repeated runs of two tags, e.g. before and after a change of the design or the driver. Exits with 1 on a significant regression.')
+    parser.add_argument('baseline', type=str, help='Tag of the reference runs')
+    parser.add_argument('candidate', type=str, nargs='?', help='Tag of the runs to check (without it, only summarize the baseline)')
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE, help='Confidence level of the intervals of the medians')
+    parser.add_argument('--significance', type=float, default=DEFAULT_SIGNIFICANCE, help='Largest p-value of the Mann-Whitney test for a slowdown to be significant')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Smallest relative increase of the median that counts as a regression')
+    args = parser.parse_args()
+
+    if args.candidate is None:
+        print_summary(args.baseline, summarize_tag(args.baseline, args.confidence), args.confidence)
+        return
+    sys.exit(1 if report_regressions(args.baseline, args.candidate, args.confidence, args.significance, args.threshold) else 0)
+
+if __name__ == '__main__':
+    main()
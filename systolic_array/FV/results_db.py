@@ -0,0 +1,329 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+from design_metrics import DESIGN_METRICS
+
+SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+RESULTS_DIR = SCRIPT_DIR / 'benchmark_output'
+DB_FILE = RESULTS_DIR / 'results.sqlite'
+
+# Seconds a writer waits for the lock held by another writer before giving up
+DB_LOCK_TIMEOUT_SECONDS = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,       -- identifies a run, so that importing it twice is a no-op
+    timestamp TEXT,
+    interface TEXT NOT NULL,
+    command TEXT NOT NULL,              -- bmc, prove, live or cover
+    SA_SIZE INTEGER NOT NULL,
+    prove_depth INTEGER,
+    bmc_depth INTEGER,
+    engine TEXT,
+    tag TEXT NOT NULL,
+    config_hash TEXT,
+    execution_time REAL,                -- in seconds, NULL if unknown
+    memory REAL,                        -- in MB, NULL if unknown
+    status TEXT NOT NULL,               -- one of STATUSES
+    success INTEGER NOT NULL,
+    bench_file TEXT,                    -- relative to the FV directory when it is known
+    source TEXT NOT NULL,               -- run, csv or results.txt
+    parameters TEXT NOT NULL DEFAULT '{}',  -- JSON of the design parameters overridden with -chparam (besides SA_SIZE)
+    cpu_time REAL                       -- user + system time in seconds of the whole process tree, NULL if unknown
+    -- followed by one INTEGER column per design metric (see design_metrics.DESIGN_METRICS), NULL if unknown
+);
+CREATE INDEX IF NOT EXISTS idx_results_config ON results (interface, command, SA_SIZE);
+CREATE INDEX IF NOT EXISTS idx_results_tag ON results (tag);
+CREATE INDEX IF NOT EXISTS idx_results_config_hash ON results (config_hash);
+
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+'''
+
+STATUSES = ['success', 'error', 'memory_limit_exceeded', 'time_limit_exceeded']
+
+RESULT_COLUMNS = ['timestamp', 'interface', 'command', 'SA_SIZE', 'prove_depth', 'bmc_depth', 'engine', 'tag',
+                  'config_hash', 'execution_time', 'memory', 'status', 'success', 'bench_file', 'source', 'parameters', 'cpu_time'] + DESIGN_METRICS
+
+# Columns added after the first version of the schema, with their definition
+MIGRATED_COLUMNS = {
+    'parameters': "TEXT NOT NULL DEFAULT '{}'",
+    'cpu_time': 'REAL',
+    **{metric: 'INTEGER' for metric in DESIGN_METRICS},
+}
+
+# Name of a generated configuration, e.g. gen_FV_GEMM_driver_sa_size_4_prove_depth_10_bmc_depth_18_tag_default
+CONFIG_NAME_PATTERN = re.compile(r'gen_(\w+?)_sa_size_(\d+)_prove_depth_(\d+)_bmc_depth_(\d+)_tag_(\w+?)(?:_(?:bmc|prove|live|cover))?(?:_(\d{4}_\d{2}_\d{2}_\d{2}\.\d{2}\.\d{2})(?:_\d+)?)?(?:\.txt)?$')
+
+# Lines printed by run_benchmarks.py and collected by hand in results.txt
+RESULT_LINE_PATTERN = re.compile(r'^(SUCCESS|ERROR): (\w+) (gen_\S+)(?: in ([\d.]+) seconds using ([\d.]+) MB)?(?: \((.*)\))?$')
+
+def open_results_db(db_file=DB_FILE):
+    """Open the results database, creating it if needed. Several processes may write to it concurrently."""
+    os.makedirs(Path(db_file).parent, exist_ok=True)
+    connection = sqlite3.connect(db_file, timeout=DB_LOCK_TIMEOUT_SECONDS)
+    connection.row_factory = sqlite3.Row
+    # Write-ahead logging lets readers run while a writer appends results
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+
+    # Databases created before a column existed get it added in place
+    existing_columns = {row['name'] for row in connection.execute('PRAGMA table_info(results)')}
+    for column, definition in MIGRATED_COLUMNS.items():
+        if column not in existing_columns:
+            connection.execute(f'ALTER TABLE results ADD COLUMN {column} {definition}')
+    return connection
+
+def encode_parameters(parameters):
+    """Canonical JSON of a dict of design parameters, as stored in the parameters column"""
+    return json.dumps(parameters or {}, sort_keys=True)
+
+def _insert_result(connection, run_key, result):
+    result = dict(result, parameters=encode_parameters(result.get('parameters')))
+    connection.execute(
+        f'INSERT OR IGNORE INTO results (run_key, {", ".join(RESULT_COLUMNS)}) VALUES (?, {", ".join("?" * len(RESULT_COLUMNS))})',
+        [run_key] + [result.get(column) for column in RESULT_COLUMNS]
+    )
+
+def _relative_bench_file(bench_file):
+    """Bench files of older runs were stored as absolute paths of another machine; keep them relative to FV"""
+    bench_file = str(bench_file)
+    index = bench_file.find('benchmark_output/')
+    return bench_file[index:] if index >= 0 else bench_file
+
+def get_status(benchmark_data):
+    if benchmark_data['success']:
+        return 'success'
+    if benchmark_data.get('memory_limit_exceeded'):
+        return 'memory_limit_exceeded'
+    if benchmark_data.get('time_limit_exceeded'):
+        return 'time_limit_exceeded'
+    return 'error'
+
+def get_engine(benchmark_data):
+    if benchmark_data.get('winning_engine'):
+        return benchmark_data['winning_engine']
+    if benchmark_data.get('engines'):
+        return '; '.join(benchmark_data['engines'])
+    return None
+
+def record_result(benchmark_data, bench_file, db_file=DB_FILE):
+    """Store the result of a run of run_single_benchmark"""
+    bench_file = _relative_bench_file(Path(bench_file).relative_to(SCRIPT_DIR) if Path(bench_file).is_absolute() else bench_file)
+    result = {
+        'timestamp': benchmark_data['timestamp'],
+        'interface': benchmark_data['interface_sby_filename'],
+        'command': benchmark_data['cmd'],
+        'SA_SIZE': benchmark_data['SA_SIZE'],
+        'prove_depth': benchmark_data.get('PROVE_DEPTH'),
+        'bmc_depth': benchmark_data.get('BMC_DEPTH'),
+        'engine': get_engine(benchmark_data),
+        'tag': benchmark_data['tag'],
+        'config_hash': benchmark_data.get('config_hash'),
+        'execution_time': benchmark_data['execution_time'],
+        'memory': benchmark_data['memory'],
+        'status': get_status(benchmark_data),
+        'success': 1 if benchmark_data['success'] else 0,
+        'bench_file': bench_file,
+        'source': 'run',
+        'parameters': benchmark_data.get('parameters'),
+        'cpu_time': benchmark_data.get('cpu_time'),
+        **{metric: (benchmark_data.get('design_metrics') or {}).get(metric) for metric in DESIGN_METRICS},
+    }
+    with closing(open_results_db(db_file)) as connection, connection:
+        _insert_result(connection, bench_file, result)
+
+def query_results(interface=None, command=None, SA_SIZE=None, tag=None, success=None, config_hash=None, parameters=None, db_file=DB_FILE):
+    """
+    Return the matching results as dicts, oldest first. Every argument left as None matches anything; parameters is
+    a dict of design parameters, and {} only matches runs with the default parameters of the driver.
+    """
+    filters = {'interface': interface, 'command': command, 'SA_SIZE': SA_SIZE, 'tag': tag, 'config_hash': config_hash,
+               'success': None if success is None else int(success),
+               'parameters': None if parameters is None else encode_parameters(parameters)}
+    conditions = [(f'{column} = ?', value) for column, value in filters.items() if value is not None]
+
+    query = 'SELECT * FROM results'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(condition for condition, _ in conditions)
+    query += ' ORDER BY id'
+
+    with closing(open_results_db(db_file)) as connection:
+        return [dict(row) for row in connection.execute(query, [value for _, value in conditions])]
+
+def _parse_config_name(name):
+    """Return (interface, SA_SIZE, prove_depth, bmc_depth, tag, timestamp) of a generated config or bench file name"""
+    match = CONFIG_NAME_PATTERN.search(name)
+    if match is None:
+        return None
+    interface, SA_SIZE, prove_depth, bmc_depth, tag, date_time_str = match.groups()
+    timestamp = datetime.strptime(date_time_str, '%Y_%m_%d_%H.%M.%S').isoformat() if date_time_str else None
+    return interface, int(SA_SIZE), int(prove_depth), int(bmc_depth), tag, timestamp
+
+def _content_run_key(interface, command, SA_SIZE, tag, execution_time, memory, success):
+    # Runs without a bench file (copied from results.txt) are identified by their content
+    return f'{interface}/{command}/{SA_SIZE}/{tag}/{execution_time!r}/{memory!r}/{success}'
+
+def _file_is_imported(connection, path):
+    stat = path.stat()
+    row = connection.execute('SELECT size, mtime FROM imported_files WHERE path = ?', [str(path)]).fetchone()
+    return row is not None and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime
+
+def _mark_file_imported(connection, path):
+    stat = path.stat()
+    connection.execute('INSERT OR REPLACE INTO imported_files (path, size, mtime) VALUES (?, ?, ?)', [str(path), stat.st_size, stat.st_mtime])
+
+def import_csv(connection, csv_path):
+    """Import an all_run_benchmarks CSV file. Returns the number of new results."""
+    before = connection.total_changes
+    with open(csv_path, 'r') as f:
+        for row in csv.reader(f):
+            # CSV structure: interface, SA_SIZE, command, tag, time, memory, success, bench_file
+            if len(row) < 8:
+                continue
+            interface, command, tag = row[0], row[2], row[3]
+            SA_SIZE, execution_time, memory, success = int(row[1]), float(row[4]), float(row[5]), bool(int(row[6]))
+            bench_file = _relative_bench_file(row[7])
+            prove_depth = bmc_depth = timestamp = None
+
+            # Older CSVs use shortened interface names, the config name in the bench file has the real one
+            parsed = _parse_config_name(Path(bench_file).name)
+            if parsed is not None:
+                interface, _, prove_depth, bmc_depth, _, timestamp = parsed
+
+            benchmark_data = {}
+            if (SCRIPT_DIR / bench_file).is_file():
+                try:
+                    benchmark_data = json.loads((SCRIPT_DIR / bench_file).read_text())
+                except (OSError, ValueError):
+                    pass
+
+            if 'bench_data' in bench_file:
+                run_key = bench_file
+            else:
+                run_key = _content_run_key(interface, command, SA_SIZE, tag, execution_time, memory, int(success))
+
+            # Runs converted from results.txt store -1 when the time and memory of a failed run are unknown
+            execution_time = execution_time if execution_time >= 0 else None
+            memory = memory if memory >= 0 else None
+
+            _insert_result(connection, run_key, {
+                'timestamp': benchmark_data.get('timestamp', timestamp),
+                'interface': interface,
+                'command': command,
+                'SA_SIZE': SA_SIZE,
+                'prove_depth': prove_depth,
+                'bmc_depth': bmc_depth,
+                'engine': get_engine(benchmark_data),
+                'tag': tag,
+                'config_hash': benchmark_data.get('config_hash'),
+                'execution_time': execution_time,
+                'memory': memory,
+                'status': get_status({'success': success, **benchmark_data}),
+                'success': int(success),
+                'bench_file': bench_file,
+                'source': 'csv',
+            })
+    return connection.total_changes - before
+
+def import_results_txt(connection, results_path):
+    """Import the SUCCESS/ERROR lines printed by run_benchmarks.py. Returns the number of new results."""
+    before = connection.total_changes
+    with open(results_path, 'r') as f:
+        for line in f:
+            match = RESULT_LINE_PATTERN.match(line.strip())
+            if match is None:
+                continue
+            status, command, config_name, execution_time, memory, error = match.groups()
+            parsed = _parse_config_name(config_name)
+            if parsed is None:
+                continue
+            interface, SA_SIZE, prove_depth, bmc_depth, tag, _ = parsed
+
+            success = status == 'SUCCESS'
+            execution_time = float(execution_time) if execution_time else None
+            memory = float(memory) if memory else None
+            if success:
+                status = 'success'
+            elif error == 'Memory limit exceeded':
+                status = 'memory_limit_exceeded'
+            elif error == 'Time limit exceeded':
+                status = 'time_limit_exceeded'
+            else:
+                status = 'error'
+
+            run_key = _content_run_key(interface, command, SA_SIZE, tag,
+                                       execution_time if execution_time is not None else -1.0,
+                                       memory if memory is not None else -1.0,
+                                       int(success))
+            _insert_result(connection, run_key, {
+                'interface': interface,
+                'command': command,
+                'SA_SIZE': SA_SIZE,
+                'prove_depth': prove_depth,
+                'bmc_depth': bmc_depth,
+                'tag': tag,
+                'execution_time': execution_time,
+                'memory': memory,
+                'status': status,
+                'success': int(success),
+                'source': 'results.txt',
+            })
+    return connection.total_changes - before
+
+def import_legacy_results(db_file=DB_FILE):
+    """Import every all_run_benchmarks CSV and results.txt that changed since it was last imported"""
+    # results.txt goes first, as it keeps the reason of failed runs that the CSV converted from it lost
+    sources = [SCRIPT_DIR / 'results.txt'] + sorted(RESULTS_DIR.glob('all_run_benchmarks_*.csv'))
+
+    imported = 0
+    with closing(open_results_db(db_file)) as connection:
+        for path in sources:
+            if not path.is_file():
+                continue
+            with connection:
+                if _file_is_imported(connection, path):
+                    continue
+                imported += import_results_txt(connection, path) if path.suffix == '.txt' else import_csv(connection, path)
+                _mark_file_imported(connection, path)
+    return imported
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the benchmark results database')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    subparsers.add_parser('import', help='Import the all_run_benchmarks CSV files and results.txt')
+
+    query_parser = subparsers.add_parser('query', help='Print the matching results')
+    query_parser.add_argument('-i', '--interface', type=str)
+    query_parser.add_argument('-c', '--command', type=str, choices=['bmc', 'prove', 'live', 'cover'])
+    query_parser.add_argument('-s', '--sa-size', type=int)
+    query_parser.add_argument('-t', '--tag', type=str)
+    query_parser.add_argument('--success', action=argparse.BooleanOptionalAction, default=None)
+
+    args = parser.parse_args()
+
+    if args.action == 'import':
+        print(f'Imported {import_legacy_results()} results into {DB_FILE}')
+    elif args.action == 'query':
+        results = query_results(interface=args.interface, command=args.command, SA_SIZE=args.sa_size, tag=args.tag, success=args.success)
+        print(f'{"Interface":<40} {"Command":>7} {"SA Size":>7} {"Tag":>10} {"Time (s)":>10} {"Memory (MB)":>11}  {"Status":<21}  Parameters')
+        for result in results:
+            execution_time = f'{result["execution_time"]:.3f}' if result['execution_time'] is not None else '-'
+            memory = f'{result["memory"]:.2f}' if result['memory'] is not None else '-'
+            print(f'{result["interface"]:<40} {result["command"]:>7} {result["SA_SIZE"]:>7} {result["tag"]:>10} {execution_time:>10} {memory:>11}  {result["status"]:<21}  {result["parameters"] if result["parameters"] != "{}" else ""}')
+
+if __name__ == '__main__':
+    main()
@@ -2,53 +2,173 @@ from string import Template
 from pathlib import Path
 import os
 import argparse
-import subprocess
 import time
 import json
 from datetime import datetime
-import psutil
-import signal
+from dataclasses import dataclass, field, asdict, replace
+import multiprocessing
+import shutil
+import tempfile
+import hashlib
+import socket
+import itertools
+
+from sby_files import make_sby_files_absolute, parse_sby_sections, get_task_engines, replace_task_engines, set_hierarchy_parameters, replace_sby_sources
+from supervisor import get_process_tree_memory, kill_process_tree, supervise_command, get_cgroup_unavailable_reason, memory_enforcement_choices
+from sweeps import FixedSweep, AdaptiveSweep, DEFAULT_JOB_MEMORY_ESTIMATE_MEGABYTES, get_chain, PIPELINE_STAGES, DEFAULT_PIPELINE_STAGES, plan_pipeline
+from sweep_spec import resolve_depths, get_design_parameters, get_recorded_parameters, get_declared_parameters, format_parameters, load_sweep_spec, plan_sweep_spec
+from portfolio import EngineRaceObserver, PORTFOLIO_COMMANDS, record_winning_engine, get_preferred_engine, get_portfolio_parameters, compute_design_hash
+from sby_log import SbyTimelineObserver
+from live_metrics import LiveJobObserver, serve_live_metrics, DEFAULT_METRICS_HOST
+from results_db import record_result
+from design_metrics import get_model_sizes, get_work_dir_design_metrics
+from elaboration_cache import get_elaborated_design, invalidate_elaboration_cache, DEFAULT_ELABORATION_CACHE_BUDGET_MEGABYTES
+from job_board import run_coordinator, run_worker, parse_address, DEFAULT_AUTHKEY, DEFAULT_COORDINATOR_PORT
+from trace_replay import replay_trace, find_traces
+from compositional import COMPOSITIONAL_INTERFACE, get_subproblems, combine_verdicts
+from assertion_split import get_interface_assertions, get_checked_assertions, write_split_sources, combine_split_verdicts, split_mode_choices
+from lemmas import LEMMA_INTERFACE, LEMMA_PROVE_DEPTH, generate_candidates, filter_candidates, write_lemma_sources, get_lemma_input_size, lemma_mode_choices
+from job_manifest import JobManifest
+from regression import REGRESSION_POINTS, summarize_tag, print_summary, report_regressions
+from induction_depth import get_probe_label, search_minimal_depth, get_probe_outcome, get_starting_depth, get_maximum_depth, get_stored_induction_depth, record_induction_depth
+
+def compute_config_hash(sby_text, base_dir, sby_command, SA_SIZE, PROVE_DEPTH, BMC_DEPTH, config_label=None):
+    """
+    Hash everything that determines the result of a job: the contents of every file in the [files] section,
+    the generated .sby file itself and the substituted parameters, command and engine. The label the result is recorded
+    under is part of it, so that a cached result is never returned under another label (e.g. a depth probe as a
+    regular prove run). The host is not part of it,
+    so hosts that share the benchmark output share the cached results; the host of a run is kept in its bench data.
+    """
+    sections = parse_sby_sections(sby_text)
+    digest = hashlib.sha256()
+
+    for entry in sorted(sections.get('files', [])):
+        source = entry.split()[-1]
+        digest.update(source.encode())
+        digest.update((base_dir / source).read_bytes())
+
+    digest.update(sby_text.encode())
+    digest.update(json.dumps({
+        'SA_SIZE': SA_SIZE,
+        'PROVE_DEPTH': PROVE_DEPTH,
+        'BMC_DEPTH': BMC_DEPTH,
+        'command': sby_command,
+        'engine': get_task_engines(sections, sby_command),
+        'label': config_label,
+    }, sort_keys=True).encode())
+
+    return digest.hexdigest()
+
+def get_result_cache_dir():
+    return Path(os.path.dirname(os.path.realpath(__file__))) / 'benchmark_output' / 'cache'
+
+def load_cached_result(config_hash):
+    """Return the benchmark_data stored for a configuration hash, or None if it has not been run yet"""
+    cache_file = get_result_cache_dir() / f'{config_hash}.json'
+    if not cache_file.exists():
+        return None
+    with open(cache_file, 'r') as f:
+        return json.load(f)
+
+def store_cached_result(config_hash, benchmark_data):
+    cache_dir = get_result_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Write to a temporary file first, so that concurrent jobs never read a half-written entry
+    tmp_file = cache_dir / f'{config_hash}.json.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(benchmark_data, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, cache_dir / f'{config_hash}.json')
 
-def get_process_tree_memory(pid):
-    """Get total memory usage of a process and all its children in MB"""
-    try:
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)  # Get all child processes recursively
-        total_memory = parent.memory_info().rss  # Memory of parent process
-        
-        # Add memory of all child processes
-        for child in children:
-            try:
-                total_memory += child.memory_info().rss
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-                
-        return total_memory / (1024 * 1024)  # Convert to MB
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
-        return 0.0
-    
-def kill_process_tree(pid):
-    """Kill a process and all its children"""
-    try:
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)
-        
-        # Kill children first
-        for child in children:
-            try:
-                os.kill(child.pid, signal.SIGTERM)
-            except (psutil.NoSuchProcess, ProcessLookupError):
-                pass
-                
-        # Kill parent
-        os.kill(pid, signal.SIGTERM)
-    except (psutil.NoSuchProcess, ProcessLookupError):
-        pass
-
-def run_single_benchmark(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds):
-    PROVE_DEPTH = 2*(SA_SIZE + 1)
-    BMC_EXPAND = 10
-    BMC_DEPTH = 2*SA_SIZE + BMC_EXPAND
+def invalidate_result_cache():
+    """Delete every cached result"""
+    shutil.rmtree(get_result_cache_dir(), ignore_errors=True)
+
+def create_job_work_dir(config_name, sby_command):
+    """Create a unique scratch directory for the generated .sby file and the SymbiYosys output of a single job"""
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    work_root = SCRIPT_DIR / 'benchmark_output' / 'work'
+    os.makedirs(work_root, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f'{config_name}_{sby_command}_{time.strftime("%Y_%m_%d_%H.%M.%S")}_', dir=work_root))
+
+def retire_job_work_dir(work_dir, success, work_dir_retention):
+    """Keep, archive or delete a finished job work directory according to the retention policy"""
+    assert work_dir_retention in work_dir_retention_choices
+
+    if work_dir_retention == 'keep' or (work_dir_retention == 'keep-failed' and not success):
+        return
+
+    if work_dir_retention == 'archive':
+        archive_dir = work_dir.parent.parent / 'work_archive'
+        os.makedirs(archive_dir, exist_ok=True)
+        shutil.make_archive(str(archive_dir / work_dir.name), 'gztar', root_dir=work_dir.parent, base_dir=work_dir.name)
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def decode_counterexamples(work_dir, bench_file, SA_SIZE, input_size=None, element_width=8):
+    """
+    Replay the counterexample traces of a failed job and store the report next to the bench data. The sizes of the
+    job are passed to the replay, instead of being guessed from the widths of the traced ports.
+    """
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    traces = find_traces(work_dir)
+    if not traces:
+        return None
+
+    # gemm_model only models 8-bit weights and activations
+    if element_width != 8:
+        print(f'SKIPPED: {len(traces)} counterexamples (WEIGHT_ACTIVATION_SIZE = {element_width} is not replayed, the model is 8-bit)')
+        return None
+
+    reports = []
+    for trace in traces:
+        try:
+            report = replay_trace(trace, SA_SIZE, input_size, element_width)
+        except Exception as e:
+            # Traces of drivers that do not instantiate GEMM cannot be replayed
+            print(f'SKIPPED: counterexample {trace.relative_to(work_dir)} ({e})')
+            continue
+        report['vcd'] = str(trace.relative_to(work_dir))
+        reports.append(report)
+
+        divergence = report['first_divergence']
+        if divergence is not None:
+            print(f'COUNTEREXAMPLE: {divergence["signal"]} diverges from the model in cycle {divergence["cycle"]} ({divergence["state"]})' + (f' at PE {divergence["pe"]}' if 'pe' in divergence else ''))
+
+    if not reports:
+        return None
+
+    counterexample_file = bench_file.with_suffix('.counterexample.json')
+    with open(counterexample_file, 'w') as f:
+        json.dump(reports, f, indent=4)
+    return str(counterexample_file.relative_to(SCRIPT_DIR))
+
+@dataclass(frozen=True)
+class RunOptions:
+    """How the jobs of a run are executed, the same for every job (see the arguments of main)"""
+    work_dir_retention: str = 'keep-failed'
+    use_cache: bool = True
+    memory_enforcement: str = 'auto'
+    portfolio_engines: list = None
+    steer_portfolio: bool = False
+    use_elaboration_cache: bool = True
+    elaboration_cache_budget_in_megabytes: int = DEFAULT_ELABORATION_CACHE_BUDGET_MEGABYTES
+    use_stored_induction_depth: bool = True
+    live_metrics: bool = False
+
+def run_single_benchmark(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options=None, template_parameters=None, config_label=None, parameters=None, source_overrides=None):
+    run_options = run_options or RunOptions()
+    # parameters may set the depths and other parameters of the driver (see sweep_spec.py)
+    # Prove tasks go straight to the minimal induction depth found by --find-induction-depth, if any. That depth holds
+    #   for the unmodified sources, so jobs with other template parameters or sources keep the default depth.
+    if sby_command == 'prove' and run_options.use_stored_induction_depth and template_parameters is None and not source_overrides and 'PROVE_DEPTH' not in (parameters or {}):
+        stored_depth = get_stored_induction_depth(interface_sby_filename_without_extension, SA_SIZE, parameters)
+        if stored_depth is not None:
+            parameters = {**(parameters or {}), 'PROVE_DEPTH': stored_depth}
+    PROVE_DEPTH, BMC_DEPTH = resolve_depths(SA_SIZE, parameters)
+    design_parameters = get_design_parameters(parameters)
+    recorded_parameters = get_recorded_parameters(interface_sby_filename_without_extension, parameters)
 
     SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
     sby_template = (SCRIPT_DIR / f'{interface_sby_filename_without_extension}.sby.tpl').read_text()
@@ -56,80 +176,123 @@ def run_single_benchmark(tag, interface_sby_filename_without_extension, sby_comm
     res = Template(sby_template).substitute(
         PROVE_DEPTH=PROVE_DEPTH,
         BMC_DEPTH=BMC_DEPTH,
-        SA_SIZE=SA_SIZE
+        SA_SIZE=SA_SIZE,
+        **(template_parameters or {})
     )
-    
-    config_name = f'gen_{interface_sby_filename_without_extension}_sa_size_{SA_SIZE}_prove_depth_{PROVE_DEPTH}_bmc_depth_{BMC_DEPTH}_tag_{tag}'
+    if design_parameters:
+        res = set_hierarchy_parameters(res, design_parameters)
+    # Sources replaced by rewritten copies (e.g. a driver with all assertions but one disabled, see assertion_split.py)
+    if source_overrides:
+        res = replace_sby_sources(res, source_overrides)
+
+    # Templates instantiated with extra parameters (e.g. the sub-problems of a compositional proof) are stored under
+    #   their own label, so that their results are not mixed with each other
+    config_label = config_label or interface_sby_filename_without_extension
+    parameter_suffix = ''.join(f'_{name.lower()}_{value}' for name, value in sorted(recorded_parameters.items()))
+    config_name = f'gen_{config_label}{parameter_suffix}_sa_size_{SA_SIZE}_prove_depth_{PROVE_DEPTH}_bmc_depth_{BMC_DEPTH}_tag_{tag}'
+
+    # Race a portfolio of engines on the task. sby runs them concurrently and stops at the first conclusive result.
+    engine_race_observer = None
+    if run_options.portfolio_engines and sby_command in PORTFOLIO_COMMANDS:
+        engines = list(run_options.portfolio_engines)
+        portfolio_parameters = get_portfolio_parameters(recorded_parameters, sby_command, SA_SIZE, PROVE_DEPTH, BMC_DEPTH)
+        design_hash = compute_design_hash(res, SCRIPT_DIR)
+        if run_options.steer_portfolio:
+            preferred_engine = get_preferred_engine(config_label, sby_command, SA_SIZE, portfolio_parameters, design_hash)
+            if preferred_engine is not None:
+                engines = [preferred_engine]
+        res = replace_task_engines(res, sby_command, engines)
+        engine_race_observer = EngineRaceObserver(engines)
+
+    # Skip configurations whose design, driver, template and parameters have not changed since they were last run
+    config_hash = compute_config_hash(res, SCRIPT_DIR, sby_command, SA_SIZE, PROVE_DEPTH, BMC_DEPTH, config_label)
+    if run_options.use_cache:
+        cached_benchmark_data = load_cached_result(config_hash)
+        if cached_benchmark_data is not None:
+            print(f'CACHED: {sby_command} {config_name} ({"SUCCESS" if cached_benchmark_data["success"] else "ERROR"} in {cached_benchmark_data["execution_time"]:.3f} seconds using {cached_benchmark_data["memory"]:.2f} MB)')
+            return cached_benchmark_data
+
+    # Every job gets its own work directory, so that concurrent runs never share a generated .sby file or sby output
+    work_dir = create_job_work_dir(config_name, sby_command)
+
+    # Elaborate the design once per design hash and SA_SIZE, and let every command and engine start from it
+    elaborated_design = None
+    if run_options.use_elaboration_cache:
+        elaborated_design = get_elaborated_design(res, SCRIPT_DIR, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options.memory_enforcement, run_options.elaboration_cache_budget_in_megabytes)
+
+    RES_FILE = work_dir / f'{config_name}.sby'
+    RES_FILE.write_text(make_sby_files_absolute(elaborated_design.apply(res) if elaborated_design is not None else res, SCRIPT_DIR))
+
+    bash_command = f'sby --prefix {work_dir / "symbiyosys"} -f {RES_FILE} {sby_command}'
+
+    date_time_str = time.strftime("%Y_%m_%d_%H.%M.%S")
+
+    # The sby output is streamed into the raw log while it runs, instead of being buffered in memory
+    raw_log_dir = SCRIPT_DIR / 'benchmark_output' / 'raw_logs'
+    os.makedirs(raw_log_dir, exist_ok=True)
+    raw_log_file = raw_log_dir / f'{config_name}_{sby_command}_{date_time_str}_{os.getpid()}_{next(_run_counter)}.txt'
+
+    # Every observer follows the sby output as it is streamed
+    timeline_observer = SbyTimelineObserver()
+    observers = [timeline_observer] + ([engine_race_observer] if engine_race_observer is not None else [])
 
-    RES_FILE = SCRIPT_DIR / f'{config_name}.sby'
-    RES_FILE.write_text(res)
+    # The status of the job is published for the metrics endpoint while it runs
+    live_observer = None
+    if run_options.live_metrics:
+        live_labels = {'job': f'{config_name}_{sby_command}', 'tag': tag, 'interface': config_label, 'command': sby_command, 'sa_size': SA_SIZE}
+        target_step = {'bmc': BMC_DEPTH, 'prove': PROVE_DEPTH}.get(sby_command)
+        live_observer = LiveJobObserver(timeline_observer, live_labels, target_step, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds)
+        observers.append(live_observer)
 
-    bash_command = f'sby --prefix symbiyosys_{interface_sby_filename_without_extension} -f {RES_FILE} {sby_command}'
+    def on_output_line(line):
+        for observer in observers:
+            observer.on_output_line(line)
 
     start_time = time.perf_counter()
     max_memory = 0
+    memory_limit_exceeded = False
+    time_limit_exceeded = False
+    supervision = None
 
     try:
-        process = subprocess.Popen(
+        supervision = supervise_command(
             bash_command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+            raw_log_file,
+            maximum_memory_limit_in_megabytes,
+            maximum_time_limit_in_seconds,
+            run_options.memory_enforcement,
+            on_output_line=on_output_line,
+            on_memory_sample=live_observer.on_memory_sample if live_observer is not None else None
         )
 
-        memory_limit_exceeded = False
-        time_limit_exceeded = False
-
-        # Poll process memory usage
-        while process.poll() is None:  # While process is running
-            current_memory = get_process_tree_memory(process.pid)
-            current_time = time.perf_counter()
-            max_memory = max(max_memory, current_memory)
-            
-            if current_memory > maximum_memory_limit_in_megabytes:
-                out_of_memory_message = f'Memory limit of {maximum_memory_limit_in_megabytes}MB exceeded! (Current: {current_memory:.2f}MB). Killing process...'
-                print(out_of_memory_message)
-                kill_process_tree(process.pid)
-                memory_limit_exceeded  = True
-
-            if current_time - start_time > maximum_time_limit_in_seconds:
-                out_of_time_message = f'Execution time exceeded {maximum_time_limit_in_seconds} seconds. Killing process...'
-                print(out_of_time_message)
-                kill_process_tree(process.pid)
-                time_limit_exceeded = True
-
-            
-            time.sleep(0.1)  # Poll every 100ms
-                
-        # Get the output
-        stdout, stderr = process.communicate()
-        success = process.returncode == 0        
-        output = stdout + '\n' + stderr
-
-        if memory_limit_exceeded:
-            output += '\n' + out_of_memory_message
-
-        if time_limit_exceeded:
-            output += '\n' + out_of_time_message
+        success = supervision.returncode == 0
+        max_memory = supervision.max_memory
+        memory_limit_exceeded = supervision.memory_limit_exceeded
+        time_limit_exceeded = supervision.time_limit_exceeded
 
     except Exception as e:
         success = False
-        output = str(e)
+        with open(raw_log_file, 'a') as f:
+            f.write('\n' + str(e))
+
+    finally:
+        if elaborated_design is not None:
+            elaborated_design.release()
+        if live_observer is not None:
+            live_observer.finish()
 
     elapsed_time = time.perf_counter() - start_time
+    timeline_observer.finish()
 
     if success:
         print(f'SUCCESS: {sby_command} {config_name} in {elapsed_time:.3f} seconds using {max_memory:.2f} MB')
     else:
         print(f'ERROR: {sby_command} {config_name}' + (' (Memory limit exceeded)' if memory_limit_exceeded else ' (Time limit exceeded)' if time_limit_exceeded else ''))
 
-    date_time_str = time.strftime("%Y_%m_%d_%H.%M.%S")
-    
-    raw_log_dir = SCRIPT_DIR / 'benchmark_output' / 'raw_logs'
-    os.makedirs(raw_log_dir, exist_ok=True)
-    raw_log_file = raw_log_dir / f'{config_name}_{date_time_str}.txt'
-    raw_log_file.write_text(output)
+    winning_engine = engine_race_observer.winning_engine if engine_race_observer is not None else None
+    if winning_engine is not None:
+        print(f'WINNER: {sby_command} {config_name} settled by {winning_engine}')
+        record_winning_engine(config_label, sby_command, SA_SIZE, portfolio_parameters, design_hash, winning_engine, elapsed_time)
 
     benchmark_data = {
         'timestamp': datetime.now().isoformat(),
@@ -140,24 +303,83 @@ def run_single_benchmark(tag, interface_sby_filename_without_extension, sby_comm
         'time_units': 'seconds (s)',
         'memory': max_memory,
         'memory_units': 'megabyte (MB)',
+        'host': socket.gethostname(),
         'SA_SIZE': SA_SIZE,
+        'PROVE_DEPTH': PROVE_DEPTH,
+        'BMC_DEPTH': BMC_DEPTH,
+        'parameters': recorded_parameters,
         'cmd': sby_command,
         'tag': tag,
-        'interface_sby_filename': interface_sby_filename_without_extension,
-        'memory_limit_exceeded': memory_limit_exceeded
+        'interface_sby_filename': config_label,
+        'memory_limit_exceeded': memory_limit_exceeded,
+        'time_limit_exceeded': time_limit_exceeded,
+        'config_hash': config_hash,
+        'engines': get_task_engines(parse_sby_sections(res), sby_command),
+        'winning_engine': winning_engine,
+        'phase_times': timeline_observer.get_phase_durations(),
+        # pass, fail, unknown (e.g. induction failed at PROVE_DEPTH), error or timeout, or None if sby did not finish
+        'sby_status': timeline_observer.status,
+        # The front-end time is not part of execution_time when the job started from the elaborated design
+        'elaboration_time': elaborated_design.elaboration_time if elaborated_design is not None else None,
+        'elaboration_cache_hit': elaborated_design.cache_hit if elaborated_design is not None else None,
+        # Kernel accounting of the sby process tree; execution_time is wall time
+        'cpu_time': supervision.cpu_time if supervision is not None else None,
+        'user_time': supervision.user_time if supervision is not None else None,
+        'system_time': supervision.system_time if supervision is not None else None,
+        'voluntary_context_switches': supervision.voluntary_context_switches if supervision is not None else None,
+        'involuntary_context_switches': supervision.involuntary_context_switches if supervision is not None else None,
+        'max_process_memory': supervision.max_process_memory if supervision is not None else None,
+        'cpu_time_by_process': supervision.cpu_time_by_process if supervision is not None else None,
     }
     
     bench_file_dir = SCRIPT_DIR / 'benchmark_output' / 'bench_data'
     os.makedirs(bench_file_dir, exist_ok=True)
-    bench_file = bench_file_dir / f'{config_name}_{date_time_str}.txt'
-    
+    bench_file = bench_file_dir / raw_log_file.name
+    benchmark_data['bench_file'] = str(bench_file.relative_to(SCRIPT_DIR))
+
+    # The per-phase and per-step timeline is kept next to the bench data, as it grows with the solver depth
+    timeline_file = bench_file.with_suffix('.timeline.json')
+    with open(timeline_file, 'w') as f:
+        json.dump(timeline_observer.to_dict(), f, indent=4)
+    benchmark_data['timeline'] = str(timeline_file.relative_to(SCRIPT_DIR))
+
+    # So is the memory and CPU time series of the process tree, as compressed arrays
+    benchmark_data['resources'] = None
+    if supervision is not None:
+        resources_file = bench_file.with_suffix('.resources.npz')
+        supervision.time_series.save(resources_file)
+        benchmark_data['resources'] = str(resources_file.relative_to(SCRIPT_DIR))
+
+    # A failed assertion leaves a counterexample trace, which is replayed against the GEMM model before the work
+    #   directory is retired
+    benchmark_data['counterexample'] = None
+    if not success and not memory_limit_exceeded and not time_limit_exceeded:
+        try:
+            declared_parameters = get_declared_parameters(interface_sby_filename_without_extension)
+        except ValueError:
+            declared_parameters = {}
+        driver_parameters = {**declared_parameters, **design_parameters}
+        benchmark_data['counterexample'] = decode_counterexamples(work_dir, bench_file, SA_SIZE, driver_parameters.get('INPUT_SIZE'), driver_parameters.get('WEIGHT_ACTIVATION_SIZE') or 8)
+
+    # The size of the design after prep and of the models handed to the solvers, to relate the solver cost to the
+    #   structures in the design. Jobs that elaborated the design themselves take it from the sby model directory.
+    design_metrics = elaborated_design.metrics if elaborated_design is not None else get_work_dir_design_metrics(work_dir)
+    benchmark_data['design_metrics'] = {**(design_metrics or {}), **get_model_sizes(work_dir)} or None
+
     with open(bench_file, 'w') as f:
         json.dump(benchmark_data, f, indent=4, sort_keys=True)
 
-    with open(SCRIPT_DIR / 'benchmark_output' / f'all_run_benchmarks_{interface_sby_filename_without_extension}.csv', 'a') as f:
-        f.write(f'{interface_sby_filename_without_extension},{SA_SIZE},{sby_command},{tag},{elapsed_time},{max_memory},{1 if success else 0},{bench_file}\n')
+    record_result(benchmark_data, bench_file)
+
+    # Only runs that reached an sby verdict are cached. Runs killed because of a resource limit depend on the limits and
+    #   the machine, and runs where sby never got that far (e.g. sby not installed, or not supervised at all) say
+    #   nothing about the configuration.
+    if timeline_observer.status in SBY_VERDICTS and not memory_limit_exceeded and not time_limit_exceeded:
+        store_cached_result(config_hash, benchmark_data)
 
-    return success
+    retire_job_work_dir(work_dir, success, run_options.work_dir_retention)
+
+    return benchmark_data
 
 INTERFACES = [
     'FV_GEMM_Fixed_Weights_Each_Cycle_driver',
@@ -168,7 +390,8 @@ INTERFACES = [
 for f in sorted(os.listdir(os.path.dirname(os.path.realpath(__file__)))):
     if f.endswith('.sby.tpl'):
         interface_name = f.removesuffix('.sby.tpl')
-        if interface_name not in INTERFACES:
+        # The compositional checker is only run through its sub-problems (--compositional)
+        if interface_name not in INTERFACES and interface_name != COMPOSITIONAL_INTERFACE:
             INTERFACES.append(interface_name)
 
 
@@ -178,30 +401,593 @@ DEFAULT_TAG = 'default'
 MAXIMUM_MEMORY_LIMIT_MEGABYTES = 32 * 1024
 MAXIMUM_TIME_LIMIT_SECONDS = 120 * 60
 
+SCHEDULER_POLL_INTERVAL_SECONDS = 1.0
+
+# Final statuses of sby that are a verdict on the configuration, and not a failure to run it
+SBY_VERDICTS = ('pass', 'fail', 'unknown')
+
+# Numbers the runs of a process, so that reruns of a configuration within the same second get their own raw log
+_run_counter = itertools.count()
+
 command_choices = ['bmc', 'prove', 'live']
 
-parser = argparse.ArgumentParser(description='Run formal verification benchmarks.')
-parser.add_argument('--help-interfaces', action='store_true', help='Print the available interfaces for the benchmark.')
-parser.add_argument('--interface', '-i', type=int, help='Interface type for the benchmark.')
-parser.add_argument('--command', '-c', choices=command_choices, type=str, help='Command to run for the benchmark')
-parser.add_argument('--tag', '-t', type=str, help='Tag for the benchmark run')
+# What to do with a job work directory once the job finishes:
+#   keep:        keep every work directory
+#   keep-failed: only keep the work directories of failed jobs (e.g. to inspect counterexample traces)
+#   archive:     compress every work directory into benchmark_output/work_archive and delete it
+#   delete:      delete every work directory
+work_dir_retention_choices = ['keep', 'keep-failed', 'archive', 'delete']
+
+SA_SIZES = [2, 4, 8, 12, 16, 24, 32]
+
+@dataclass
+class BenchmarkJob:
+    interface: str
+    command: str
+    SA_SIZE: int
+    estimated_memory: float = DEFAULT_JOB_MEMORY_ESTIMATE_MEGABYTES
+    parameters: dict = field(default_factory=dict)
+    priority: int = 0       # of its sweep, lower first
+    config_label: str = None    # label the result is recorded under, None for the interface name
+
+    @property
+    def chain(self):
+        # Jobs of the same chain only differ in SA_SIZE, and are planned by the same sweep
+        return get_chain(self.interface, self.command, self.parameters)
+
+    def __str__(self):
+        return f'{self.command} {self.interface}{format_parameters(self.parameters)} SA_SIZE={self.SA_SIZE}'
+
+def get_available_cores():
+    """Number of cores this process is allowed to run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def run_sweep_sequentially(tag, sweep, manifest, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    """Run the sizes planned by a sweep one after another, smallest first, skipping the ones the manifest has a result of"""
+    queue = []
+    while True:
+        ready_sizes = sweep.pop_ready_sizes()
+        manifest.record_skipped_sizes(sweep)
+        for SA_SIZE in ready_sizes:
+            manifest.set_pending(sweep.chain, SA_SIZE)
+        queue = sorted(queue + ready_sizes)
+        if not queue:
+            break
+
+        SA_SIZE = queue.pop(0)
+        job = BenchmarkJob(sweep.interface, sweep.command, SA_SIZE, parameters=sweep.parameters, config_label=sweep.config_label)
+        benchmark_data = manifest.get_replayed_result(sweep.chain, SA_SIZE)
+        if benchmark_data is not None:
+            print(f'RESUMED: {job} ({"SUCCESS" if benchmark_data["success"] else "ERROR"} in an earlier run)')
+        else:
+            manifest.set_state(sweep.chain, SA_SIZE, 'running', pid=os.getpid())
+            benchmark_data = run_single_benchmark(tag, sweep.interface, sweep.command, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options, parameters=sweep.parameters, config_label=sweep.config_label)
+            manifest.set_finished(sweep.chain, SA_SIZE, benchmark_data)
+
+        cancelled_sizes = sweep.record(SA_SIZE, benchmark_data)
+        for size in [size for size in queue if size in cancelled_sizes]:
+            manifest.set_state(sweep.chain, size, 'skipped', f'SA_SIZE={SA_SIZE} failed')
+        queue = [size for size in queue if size not in cancelled_sizes]
+
+def _run_benchmark_job(tag, job, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options, result_queue):
+    benchmark_data = run_single_benchmark(tag, job.interface, job.command, job.SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options, parameters=job.parameters, config_label=job.config_label)
+    result_queue.put((job.chain, job.SA_SIZE, benchmark_data))
+
+def run_benchmarks_parallel(tag, sweeps, manifest, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    """
+    Run the jobs planned by several sweeps concurrently, each job in its own worker process.
+
+    Jobs are started smallest SA_SIZE first (after the priority of their sweep, e.g. the stage of a pipeline), so
+    that large runs never hold back small ones. A job is only started
+    if the memory of all running process trees (or their estimated peak, whichever is larger) plus its own estimate
+    fits in the memory budget. When a sweep decides that some sizes are no longer worth running (e.g. because a
+    smaller size failed), they are skipped, or killed if they are already running. Jobs that the manifest has a
+    result of (from an earlier run of the same sweep) are not run again, their results are replayed instead.
+
+    Any extra keyword arguments are forwarded to run_single_benchmark.
+    """
+    sweeps_by_chain = {sweep.chain: sweep for sweep in sweeps}
+    pending = []
+    running = {}
+    results = {}
+
+    result_queue = multiprocessing.Queue()
+
+    def finish_job(job, benchmark_data):
+        results[(job.chain, job.SA_SIZE)] = benchmark_data
+        cancelled_sizes = sweeps_by_chain[job.chain].record(job.SA_SIZE, benchmark_data)
+
+        for pending_job in [j for j in pending if j.chain == job.chain and j.SA_SIZE in cancelled_sizes]:
+            print(f'SKIPPED: {pending_job} (SA_SIZE={job.SA_SIZE} failed)')
+            manifest.set_state(pending_job.chain, pending_job.SA_SIZE, 'skipped', f'SA_SIZE={job.SA_SIZE} failed')
+            pending.remove(pending_job)
+
+        for key, (running_job, process) in list(running.items()):
+            if running_job.chain == job.chain and running_job.SA_SIZE in cancelled_sizes:
+                print(f'CANCELLED: {running_job} (SA_SIZE={job.SA_SIZE} failed)')
+                kill_process_tree(process.pid)
+                process.join()
+                manifest.set_state(running_job.chain, running_job.SA_SIZE, 'skipped', f'SA_SIZE={job.SA_SIZE} failed')
+                del running[key]
+
+    while True:
+        # Collect finished jobs
+        while not result_queue.empty():
+            chain, SA_SIZE, benchmark_data = result_queue.get()
+
+            # Jobs cancelled after reporting their result are no longer tracked
+            if (chain, SA_SIZE) not in running:
+                continue
+
+            job, process = running.pop((chain, SA_SIZE))
+            process.join()
+            manifest.set_finished(chain, SA_SIZE, benchmark_data)
+            finish_job(job, benchmark_data)
+
+        # Workers that died without reporting a result count as failures, whatever their exit code (e.g. killed by
+        #   the OOM killer, or exited cleanly after an exception in the result queue). A worker flushes its result
+        #   into the queue before it exits, so a dead worker with an empty queue never reports one.
+        for key, (job, process) in list(running.items()):
+            if not process.is_alive() and result_queue.empty():
+                process.join()
+                del running[key]
+                print(f'ERROR: {job} (worker exited with code {process.exitcode} without a result)')
+                benchmark_data = {'success': False, 'execution_time': None, 'memory': None}
+                manifest.set_finished(job.chain, job.SA_SIZE, benchmark_data)
+                finish_job(job, benchmark_data)
+
+        # Ask every sweep for the sizes it wants to run next
+        for sweep in sweeps:
+            for SA_SIZE in sweep.pop_ready_sizes():
+                pending.append(BenchmarkJob(sweep.interface, sweep.command, SA_SIZE, sweep.estimate_memory(SA_SIZE, maximum_memory_limit_in_megabytes), sweep.parameters, sweep.priority, sweep.config_label))
+                manifest.set_pending(sweep.chain, SA_SIZE)
+            manifest.record_skipped_sizes(sweep)
+        pending.sort(key=lambda job: (job.priority, job.SA_SIZE, job.estimated_memory))
+
+        # Replay the jobs that finished in an earlier run, once all the sizes handed out with them are pending, so
+        #   that the sizes they cancel are skipped
+        replayed = False
+        for job in list(pending):
+            benchmark_data = manifest.get_replayed_result(job.chain, job.SA_SIZE)
+            if job in pending and benchmark_data is not None:
+                print(f'RESUMED: {job} ({"SUCCESS" if benchmark_data["success"] else "ERROR"} in an earlier run)')
+                pending.remove(job)
+                finish_job(job, benchmark_data)
+                replayed = True
+        if replayed:
+            continue
+
+        if not pending and not running:
+            break
+
+        # Start as many jobs as the cores and the memory budget allow
+        committed_memory = sum(
+            max(job.estimated_memory, get_process_tree_memory(process.pid))
+            for job, process in running.values()
+        )
 
-args = parser.parse_args()
+        for job in list(pending):
+            if len(running) >= maximum_parallel_jobs:
+                break
 
-if args.help_interfaces:
-    print('Available interfaces:')
-    for i, interface in enumerate(INTERFACES):
-        print(f'\t{i}: {interface}')
-    exit()
-elif None in (args.interface, args.command, args.tag):
-    parser.error('the following arguments are required: --interface, --command, --tag')
+            # Always allow a single job to run, even if it is estimated to be larger than the budget
+            if running and committed_memory + job.estimated_memory > memory_budget_in_megabytes:
+                continue
 
-INTERFACES = ['FV_GEMM_FWEC_driver_verif1', 'FV_GEMM_FWEC_driver_verif2', 'FV_GEMM_FWEC_driver_verif3', 'FV_GEMM_FWEC_driver_verif4']
+            process = multiprocessing.Process(
+                target=_run_benchmark_job,
+                args=(tag, job, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options, result_queue)
+            )
+            process.start()
+            manifest.set_state(job.chain, job.SA_SIZE, 'running', pid=process.pid)
+
+            running[(job.chain, job.SA_SIZE)] = (job, process)
+            committed_memory += job.estimated_memory
+            pending.remove(job)
+
+        time.sleep(SCHEDULER_POLL_INTERVAL_SECONDS)
+
+    return results
+
+def run_aggregated_jobs(job_function, arguments, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes):
+    """
+    Run the jobs of a combined verdict in parallel, calling job_function(*job_arguments, memory limit), and return
+    their results in order. Every job may use the full memory limit, so only as many run at once as fit into the
+    memory budget.
+    """
+    maximum_memory_limit_in_megabytes = min(maximum_memory_limit_in_megabytes, memory_budget_in_megabytes)
+    parallel_jobs = max(1, min(maximum_parallel_jobs, len(arguments), memory_budget_in_megabytes // maximum_memory_limit_in_megabytes))
+    with multiprocessing.Pool(parallel_jobs) as pool:
+        return pool.starmap(job_function, [(*job_arguments, maximum_memory_limit_in_megabytes) for job_arguments in arguments])
+
+def record_aggregate_result(tag, label, sby_command, SA_SIZE, results, success, elapsed_time, failure_reason, extra):
+    """
+    Print, store and record the combined verdict of the jobs of one SA_SIZE ({name: benchmark_data}) as a result of
+    label, with the fields of extra added to it. Returns the combined benchmark data.
+    """
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    max_memory = max((benchmark_data['memory'] or 0 for benchmark_data in results.values()), default=0)
+    any_result = next(iter(results.values()))
+    parameters = any_result.get('parameters') or {}
+    parameter_suffix = ''.join(f'_{name.lower()}_{value}' for name, value in sorted(parameters.items()))
+    config_name = f'gen_{label}{parameter_suffix}_sa_size_{SA_SIZE}_prove_depth_{any_result["PROVE_DEPTH"]}_bmc_depth_{any_result["BMC_DEPTH"]}_tag_{tag}'
 
-INTERFACES = ['FV_GEMM_Fixed_Weights_driver', 'FV_GEMM_driver']
+    if success:
+        print(f'SUCCESS: {sby_command} {config_name} in {elapsed_time:.3f} seconds using {max_memory:.2f} MB')
+    else:
+        print(f'ERROR: {sby_command} {config_name} ({failure_reason})')
+
+    benchmark_data = {
+        'timestamp': datetime.now().isoformat(),
+        # Wall time of the parallel jobs
+        'execution_time': elapsed_time,
+        'cpu_time': sum(benchmark_data.get('cpu_time') or 0 for benchmark_data in results.values()),
+        'success': success,
+        'time_units': 'seconds (s)',
+        'memory': max_memory,
+        'memory_units': 'megabyte (MB)',
+        'host': socket.gethostname(),
+        'SA_SIZE': SA_SIZE,
+        'PROVE_DEPTH': any_result['PROVE_DEPTH'],
+        'BMC_DEPTH': any_result['BMC_DEPTH'],
+        'parameters': parameters,
+        'cmd': sby_command,
+        'tag': tag,
+        'interface_sby_filename': label,
+        'memory_limit_exceeded': any(benchmark_data.get('memory_limit_exceeded') for benchmark_data in results.values()),
+        'time_limit_exceeded': any(benchmark_data.get('time_limit_exceeded') for benchmark_data in results.values()),
+        'engines': any_result['engines'],
+        **extra,
+    }
+
+    bench_file_dir = SCRIPT_DIR / 'benchmark_output' / 'bench_data'
+    os.makedirs(bench_file_dir, exist_ok=True)
+    bench_file = bench_file_dir / f'{config_name}_{sby_command}_{time.strftime("%Y_%m_%d_%H.%M.%S")}_{os.getpid()}.json'
+    benchmark_data['bench_file'] = str(bench_file.relative_to(SCRIPT_DIR))
+
+    with open(bench_file, 'w') as f:
+        json.dump(benchmark_data, f, indent=4, sort_keys=True)
+
+    record_result(benchmark_data, bench_file)
+
+    return benchmark_data
+
+def _run_subproblem(tag, subproblem, SA_SIZE, maximum_time_limit_in_seconds, run_options, maximum_memory_limit_in_megabytes):
+    benchmark_data = run_single_benchmark(tag, COMPOSITIONAL_INTERFACE, 'prove', SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options,
+                                          template_parameters=subproblem.get_template_parameters(), config_label=f'{COMPOSITIONAL_INTERFACE}_{subproblem.name}')
+    return subproblem, benchmark_data
+
+def run_compositional_proof(tag, SA_SIZE, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    """
+    Prove the output property of FV_GEMM_driver.sv for one SA_SIZE by proving the contracts of compositional.py as
+    independent jobs, in parallel, and combining their verdicts. Every sub-problem is stored as its own result, and
+    the combined verdict as a prove result of COMPOSITIONAL_INTERFACE.
+    """
+    subproblems = get_subproblems(SA_SIZE)
+    print(f'COMPOSITIONAL: SA_SIZE={SA_SIZE} split into {len(subproblems)} sub-problems')
+
+    start_time = time.perf_counter()
+    arguments = [(tag, subproblem, SA_SIZE, maximum_time_limit_in_seconds, run_options) for subproblem in subproblems]
+    results = dict(run_aggregated_jobs(_run_subproblem, arguments, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes))
+    elapsed_time = time.perf_counter() - start_time
+
+    success, failed = combine_verdicts(SA_SIZE, results)
+    return record_aggregate_result(tag, COMPOSITIONAL_INTERFACE, 'prove', SA_SIZE, results, success, elapsed_time, f'{", ".join(failed)} failed', {
+        # What the same jobs take one after another
+        'subproblem_time': sum(benchmark_data['execution_time'] or 0 for benchmark_data in results.values()),
+        'engines': ['compositional'],
+        'failed_subproblems': failed,
+        'subproblems': {subproblem.name: benchmark_data.get('bench_file') for subproblem, benchmark_data in results.items()},
+    })
+
+def _run_split_assertion(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, assertion, source_overrides, maximum_time_limit_in_seconds, parameters, run_options, maximum_memory_limit_in_megabytes):
+    benchmark_data = run_single_benchmark(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options,
+                                          config_label=f'{interface_sby_filename_without_extension}_split_{assertion.name}', parameters=parameters, source_overrides=source_overrides)
+    return assertion, benchmark_data
+
+def run_split_assertions(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, split_mode='disable', parameters=None, run_options=None):
+    """
+    Check every assertion of an interface that sby_command checks as its own job, with the other assertions disabled
+    or assumed (see assertion_split.py), in parallel, and combine their verdicts. Every assertion is stored as its own
+    result, and the combined verdict as a result of <interface>_split.
+    """
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    sby_template = (SCRIPT_DIR / f'{interface_sby_filename_without_extension}.sby.tpl').read_text()
+    assertions = get_interface_assertions(sby_template, SCRIPT_DIR)
+    checked_assertions = get_checked_assertions(assertions, sby_command)
+    split_label = f'{interface_sby_filename_without_extension}_split'
+    if not checked_assertions:
+        print(f'SKIPPED: {sby_command} {split_label} SA_SIZE={SA_SIZE} (no assertion checked by {sby_command})')
+        return None
+    print(f'SPLIT: {sby_command} {interface_sby_filename_without_extension} SA_SIZE={SA_SIZE} split into {len(checked_assertions)} assertions '
+          f'({split_mode} the others): {", ".join(assertion.name for assertion in checked_assertions)}')
+
+    start_time = time.perf_counter()
+    arguments = [(tag, interface_sby_filename_without_extension, sby_command, SA_SIZE, assertion, write_split_sources(SCRIPT_DIR, assertions, assertion, split_mode),
+                  maximum_time_limit_in_seconds, parameters, run_options) for assertion in checked_assertions]
+    results = dict(run_aggregated_jobs(_run_split_assertion, arguments, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes))
+    elapsed_time = time.perf_counter() - start_time
+
+    success, failed = combine_split_verdicts(checked_assertions, results)
+    return record_aggregate_result(tag, split_label, sby_command, SA_SIZE, results, success, elapsed_time, f'{len(failed)} of {len(checked_assertions)} assertions failed: {", ".join(failed)}', {
+        # What the same jobs take one after another
+        'assertion_time': sum(benchmark_data['execution_time'] or 0 for benchmark_data in results.values()),
+        'split_mode': split_mode,
+        'failed_assertions': failed,
+        'assertions': {assertion.name: {
+            'source': assertion.source,
+            'line': assertion.line,
+            'success': benchmark_data['success'],
+            'execution_time': benchmark_data['execution_time'],
+            'memory': benchmark_data['memory'],
+            'bench_file': benchmark_data.get('bench_file'),
+        } for assertion, benchmark_data in results.items()},
+    })
+
+def _run_lemma_job(tag, config_label, source_overrides, SA_SIZE, maximum_time_limit_in_seconds, parameters, run_options, maximum_memory_limit_in_megabytes):
+    benchmark_data = run_single_benchmark(tag, LEMMA_INTERFACE, 'prove', SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options,
+                                          config_label=config_label, parameters=parameters, source_overrides=source_overrides)
+    return config_label, benchmark_data
+
+def run_lemma_proof(tag, SA_SIZE, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, lemma_mode='assert', parameters=None, run_options=None):
+    """
+    Prove FV_GEMM_driver for one SA_SIZE with generated lemmas (see lemmas.py): candidate invariants of every PE and
+    delay stage are filtered by simulating gemm_model on random matrices, and the survivors are added to the driver.
+    With them the assertions of the driver are inductive at a small depth, so prove runs at LEMMA_PROVE_DEPTH unless
+    parameters set PROVE_DEPTH. Every job is stored as its own result, and the verdict as a prove result of
+    <interface>_lemmas.
+    """
+    SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+    parameters = {'PROVE_DEPTH': LEMMA_PROVE_DEPTH, **(parameters or {})}
+    INPUT_SIZE = get_lemma_input_size(get_declared_parameters(LEMMA_INTERFACE), parameters)
+
+    start_time = time.perf_counter()
+    candidates = generate_candidates(SA_SIZE, INPUT_SIZE)
+    lemmas = filter_candidates(candidates, SA_SIZE, INPUT_SIZE)
+    jobs = write_lemma_sources(SCRIPT_DIR, lemmas, SA_SIZE, INPUT_SIZE, lemma_mode)
+    generation_time = time.perf_counter() - start_time
+    print(f'LEMMAS: SA_SIZE={SA_SIZE} {len(lemmas)} of {len(candidates)} candidate lemmas survived simulation in {generation_time:.3f} seconds ('
+          + ', '.join(f'{config_label}: {source}' for config_label, source_overrides in jobs.items() for source in source_overrides.values()) + ')')
+
+    if len(jobs) == 1:
+        (config_label, source_overrides), = jobs.items()
+        return _run_lemma_job(tag, config_label, source_overrides, SA_SIZE, maximum_time_limit_in_seconds, parameters, run_options,
+                              min(maximum_memory_limit_in_megabytes, memory_budget_in_megabytes))[1]
+
+    start_time = time.perf_counter()
+    arguments = [(tag, config_label, source_overrides, SA_SIZE, maximum_time_limit_in_seconds, parameters, run_options) for config_label, source_overrides in jobs.items()]
+    results = dict(run_aggregated_jobs(_run_lemma_job, arguments, maximum_parallel_jobs, memory_budget_in_megabytes, maximum_memory_limit_in_megabytes))
+    elapsed_time = time.perf_counter() - start_time
+
+    failed = [config_label for config_label, benchmark_data in results.items() if not benchmark_data['success']]
+    return record_aggregate_result(tag, f'{LEMMA_INTERFACE}_lemmas', 'prove', SA_SIZE, results, not failed, elapsed_time, f'{", ".join(failed)} failed', {
+        # Lemma generation and simulation take generation_time before the jobs
+        'generation_time': generation_time,
+        'lemma_mode': lemma_mode,
+        'candidate_lemmas': len(candidates),
+        'lemmas': [lemma.name for lemma in lemmas],
+        'failed_jobs': failed,
+        'jobs': {config_label: benchmark_data.get('bench_file') for config_label, benchmark_data in results.items()},
+    })
+
+def find_induction_depth(tag, interface_sby_filename_without_extension, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, parameters=None, run_options=None):
+    """
+    Search for the smallest PROVE_DEPTH at which the prove task of a configuration succeeds (see
+    induction_depth.py), and store it so that later prove runs use it. Every depth tried is a prove job, recorded
+    and cached under the probe label of the interface, so that the probes at other depths than the one prove runs use
+    are not mixed with them in the results.
+    """
+    def probe(depth):
+        benchmark_data = run_single_benchmark(tag, interface_sby_filename_without_extension, 'prove', SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options,
+                                              parameters={**(parameters or {}), 'PROVE_DEPTH': depth}, config_label=get_probe_label(interface_sby_filename_without_extension))
+        return get_probe_outcome(benchmark_data)
+
+    start_depth = get_starting_depth(interface_sby_filename_without_extension, SA_SIZE, parameters)
+    maximum_depth = get_maximum_depth(SA_SIZE)
+    description = f'{interface_sby_filename_without_extension} SA_SIZE={SA_SIZE}{format_parameters(get_recorded_parameters(interface_sby_filename_without_extension, parameters))}'
+
+    start_time = time.perf_counter()
+    depth, outcomes = search_minimal_depth(probe, start_depth, maximum_depth)
+    elapsed_time = time.perf_counter() - start_time
+
+    if depth is None:
+        last_depth, last_outcome = list(outcomes.items())[-1]
+        reason = f'not inductive up to depth {maximum_depth}' if last_outcome == 'unknown' else f'{last_outcome} at depth {last_depth}'
+        print(f'ERROR: induction depth of {description} not found ({reason}, {len(outcomes)} depths tried in {elapsed_time:.3f} seconds)')
+        return None
+
+    print(f'INDUCTION DEPTH: {description} is {depth}-inductive ({len(outcomes)} depths tried in {elapsed_time:.3f} seconds, starting from {start_depth})')
+    record_induction_depth(interface_sby_filename_without_extension, SA_SIZE, parameters, depth, outcomes, elapsed_time)
+    return depth
+
+def _find_chain_induction_depths(tag, interface_sby_filename_without_extension, parameters, sizes, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    # Sizes are searched in increasing order, so that each search starts from the depth of the previous size
+    for SA_SIZE in sorted(sizes):
+        find_induction_depth(tag, interface_sby_filename_without_extension, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, parameters, run_options)
+
+def run_regression_suite(tag, points, repetitions, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options):
+    """
+    Run every (interface, command, SA_SIZE) point repetitions times under tag, for regression.py to compare with
+    another tag. The jobs run one at a time, so that they do not compete for cores, memory bandwidth or caches, and
+    the repetitions are interleaved (every point once, then every point again...) so that a slow period of the host
+    spreads over all points instead of skewing one. Cached results are never used, as every repetition is a sample.
+    """
+    run_options = replace(run_options, use_cache=False)
+    for repetition in range(repetitions):
+        print(f'REGRESSION: repetition {repetition + 1} of {repetitions} of {len(points)} points')
+        for interface, command, SA_SIZE in points:
+            run_single_benchmark(tag, interface, command, SA_SIZE, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, run_options)
+
+def run_board_job(job, maximum_memory_limit_in_megabytes):
+    """Run a job pulled from the job board of a coordinator (see job_board.run_worker)"""
+    return run_single_benchmark(job['tag'], job['interface'], job['command'], job['SA_SIZE'], maximum_memory_limit_in_megabytes, job['maximum_time_limit_in_seconds'],
+                                RunOptions(**job['run_options']), parameters=job['parameters'], config_label=job.get('config_label'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Run formal verification benchmarks.')
+    parser.add_argument('--help-interfaces', action='store_true', help='Print the available interfaces for the benchmark.')
+    parser.add_argument('--interface', '-i', type=int, help='Interface type for the benchmark.')
+    parser.add_argument('--command', '-c', choices=command_choices, type=str, help='Command to run for the benchmark')
+    parser.add_argument('--tag', '-t', type=str, help='Tag for the benchmark run')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Maximum number of benchmarks to run in parallel (0 uses all available cores)')
+    parser.add_argument('--memory-budget', type=int, default=MAXIMUM_MEMORY_LIMIT_MEGABYTES, help='Total memory in MB that parallel benchmarks may use together')
+    parser.add_argument('--work-dir-retention', choices=work_dir_retention_choices, default='keep-failed', help='What to do with the work directory of a job once it finishes')
+    parser.add_argument('--memory-enforcement', choices=memory_enforcement_choices, default='auto', help='How the per-job memory limit is enforced (auto uses a cgroup v2 memory limit when possible and falls back to sampling)')
+    parser.add_argument('--adaptive', action='store_true', help='Skip sizes whose extrapolated time or memory exceeds the limits, and bisect for the largest feasible size')
+    parser.add_argument('--no-bisect', action='store_true', help='In adaptive mode, do not bisect for the largest feasible size')
+    parser.add_argument('--sa-sizes', type=int, nargs='+', default=SA_SIZES, help='Systolic array sizes to sweep')
+    parser.add_argument('--portfolio', type=str, nargs='+', metavar='ENGINE', help=f'Race several engines on each {"/".join(PORTFOLIO_COMMANDS)} task and keep the first conclusive result, e.g. --portfolio "smtbmc boolector" "smtbmc yices" "smtbmc bitwuzla" "abc pdr"')
+    parser.add_argument('--steer-portfolio', action='store_true', help='Only run the engine that previously won the portfolio for the same (or closest smaller) SA_SIZE, if any')
+    parser.add_argument('--force', action='store_true', help='Run every configuration even if an up-to-date result is cached')
+    parser.add_argument('--invalidate-cache', action='store_true', help='Delete all cached results and elaborated designs before running')
+    parser.add_argument('--no-elaboration-cache', action='store_true', help='Let every job read and elaborate the sources itself instead of starting from a cached elaborated design')
+    parser.add_argument('--memory-limit', type=int, default=MAXIMUM_MEMORY_LIMIT_MEGABYTES, help='Memory limit in MB of a single benchmark')
+    parser.add_argument('--coordinator', type=str, nargs='?', const=f':{DEFAULT_COORDINATOR_PORT}', metavar='HOST:PORT', help='Serve the jobs to workers on HOST:PORT instead of running them locally. The host defaults to the loopback interface; give the address of a trusted network interface (or 0.0.0.0) to let other hosts connect')
+    parser.add_argument('--worker', type=str, metavar='HOST:PORT', help='Run jobs pulled from the coordinator at HOST:PORT, using --jobs cores and --memory-budget MB of this host')
+    parser.add_argument('--authkey', type=str, default=DEFAULT_AUTHKEY, help='Shared secret between the coordinator and its workers (defaults to $FV_BENCHMARK_AUTHKEY). Required by workers; a coordinator without one generates a random key and prints it')
+    parser.add_argument('--spec', type=str, metavar='FILE', help='Run the jobs of a TOML/YAML sweep spec over SA_SIZE, the depths and the driver parameters (see sweep_spec.py), skipping configurations that already have a result unless --force is given')
+    parser.add_argument('--compositional', action='store_true', help='Prove the FV_GEMM_driver output property for each of --sa-sizes by proving per-PE, per-row and per-column contracts in parallel (see compositional.py)')
+    parser.add_argument('--split-assertions', type=str, nargs='?', const='disable', choices=split_mode_choices, metavar='MODE', help=f'Check every assertion of the -i/-c configuration as its own job, in parallel, with the other assertions disabled (default) or assumed ({"/".join(split_mode_choices)}), and combine the verdicts (see assertion_split.py)')
+    parser.add_argument('--lemmas', type=str, nargs='?', const='assert', choices=lemma_mode_choices, metavar='MODE', help=f'Prove {LEMMA_INTERFACE} for each of --sa-sizes with per-PE and per-delay-stage lemmas generated and filtered by simulation, asserted next to the driver assertions (default) or proven separately and assumed ({"/".join(lemma_mode_choices)}) (see lemmas.py)')
+    parser.add_argument('--find-induction-depth', action='store_true', help='Instead of running the sweep, search for the smallest PROVE_DEPTH at which each prove configuration succeeds; later prove runs use the depths found')
+    parser.add_argument('--default-prove-depth', action='store_true', help='Run prove tasks at the default PROVE_DEPTH even if a minimal induction depth was found for them')
+    parser.add_argument('--restart', action='store_true', help='Discard the job manifest of the tag and run the sweep from scratch instead of resuming it')
+    parser.add_argument('--pipeline', type=str, nargs='*', choices=[name for name, _, _ in PIPELINE_STAGES], metavar='STAGE', help=f'Instead of one command, run every configuration through escalating stages ({", ".join(DEFAULT_PIPELINE_STAGES)} by default, out of {", ".join(name for name, _, _ in PIPELINE_STAGES)}), each one only once the previous one passed')
+    parser.add_argument('--regression', type=int, metavar='N', help=f'Run the points of the regression suite (see regression.py, or the --sa-sizes of -i/-c if given) N times each under --tag; use N >= 4 for a slowdown to be significant')
+    parser.add_argument('--baseline', type=str, metavar='TAG', help='After --regression, compare the runs with the ones of TAG and exit with 1 on a significant slowdown')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help='Serve the live metrics of the running jobs in the Prometheus text format at http://HOST:PORT/metrics (0 picks a free port)')
+    parser.add_argument('--metrics-host', type=str, default=DEFAULT_METRICS_HOST, help='Address the metrics endpoint listens on')
+    parser.add_argument('--metrics-jsonl', type=str, metavar='FILE', help='Append a JSON line per running job to FILE every few seconds')
+    parser.add_argument('--elaboration-cache-budget', type=int, default=DEFAULT_ELABORATION_CACHE_BUDGET_MEGABYTES, help='Disk space in MB for cached elaborated designs; the least recently used ones are deleted beyond it')
+
+    args = parser.parse_args()
+
+    if args.help_interfaces:
+        print('Available interfaces:')
+        for i, interface in enumerate(INTERFACES):
+            print(f'\t{i}: {interface}')
+        exit()
+
+    live_metrics = args.metrics_port is not None or args.metrics_jsonl is not None
+    if live_metrics:
+        serve_live_metrics((args.metrics_host, args.metrics_port) if args.metrics_port is not None else None, args.metrics_jsonl)
+
+    if args.worker is not None and not args.authkey:
+        parser.error('--worker needs the --authkey of the coordinator (or $FV_BENCHMARK_AUTHKEY)')
+    if args.worker is not None:
+        # Workers get everything they need from the jobs of the coordinator
+        run_worker(parse_address(args.worker), args.authkey, args.jobs if args.jobs > 0 else get_available_cores(), args.memory_budget, run_board_job, live_metrics)
+        return
+    elif (args.compositional or args.lemmas is not None or args.regression is not None) and args.tag is None:
+        parser.error('the following arguments are required: --tag')
+    elif args.spec is None and args.pipeline is not None and None in (args.interface, args.tag):
+        parser.error('the following arguments are required: --interface, --tag')
+    elif args.spec is None and not args.compositional and args.lemmas is None and args.regression is None and args.pipeline is None and None in (args.interface, args.command, args.tag):
+        parser.error('the following arguments are required: --interface, --command, --tag')
+    elif args.interface is not None and not 0 <= args.interface < len(INTERFACES):
+        parser.error(f'--interface must be between 0 and {len(INTERFACES) - 1} (see --help-interfaces)')
+    elif args.baseline is not None and args.regression is None:
+        parser.error('--baseline is only used with --regression')
+
+    # An explicitly requested cgroup limit is never silently replaced with sampling
+    if args.memory_enforcement == 'cgroup' and (reason := get_cgroup_unavailable_reason()) is not None:
+        parser.error(f'--memory-enforcement cgroup is not available here: {reason}')
+
+    if args.invalidate_cache:
+        invalidate_result_cache()
+        invalidate_elaboration_cache()
+
+    run_options = RunOptions(
+        work_dir_retention=args.work_dir_retention,
+        use_cache=not args.force,
+        memory_enforcement=args.memory_enforcement,
+        portfolio_engines=args.portfolio,
+        steer_portfolio=args.steer_portfolio,
+        use_elaboration_cache=not args.no_elaboration_cache,
+        elaboration_cache_budget_in_megabytes=args.elaboration_cache_budget,
+        use_stored_induction_depth=not args.default_prove_depth,
+        live_metrics=live_metrics,
+    )
+
+    maximum_parallel_jobs = args.jobs if args.jobs > 0 else get_available_cores()
+
+    if args.compositional:
+        for SA_SIZE in args.sa_sizes:
+            run_compositional_proof(args.tag, SA_SIZE, maximum_parallel_jobs, args.memory_budget, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, run_options)
+        return
+
+    if args.lemmas is not None:
+        for SA_SIZE in args.sa_sizes:
+            run_lemma_proof(args.tag, SA_SIZE, maximum_parallel_jobs, args.memory_budget, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, args.lemmas, run_options=run_options)
+        return
+
+    if args.split_assertions is not None:
+        for SA_SIZE in args.sa_sizes:
+            run_split_assertions(args.tag, INTERFACES[args.interface], args.command, SA_SIZE, maximum_parallel_jobs, args.memory_budget, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, args.split_assertions, run_options=run_options)
+        return
+
+    if args.regression is not None:
+        if args.interface is not None and args.command is not None:
+            points = [(INTERFACES[args.interface], args.command, SA_SIZE) for SA_SIZE in args.sa_sizes]
+        else:
+            points = REGRESSION_POINTS
+        run_regression_suite(args.tag, points, args.regression, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, run_options)
+        print_summary(args.tag, summarize_tag(args.tag))
+        if args.baseline is not None and report_regressions(args.baseline, args.tag):
+            exit(1)
+        return
+
+    tag = args.tag
+    if args.spec is not None:
+        spec = load_sweep_spec(args.spec)
+        tag = args.tag or spec.get('tag')
+        if tag is None:
+            parser.error('the sweep spec has no tag, give one with --tag')
+        chains = plan_sweep_spec(spec, commands=command_choices, skip_recorded=not args.force)
+    elif args.pipeline is not None:
+        chains = [(INTERFACES[args.interface], None, {}, args.sa_sizes)]
+    else:
+        chains = [(INTERFACES[args.interface], args.command, {}, args.sa_sizes)]
+
+    if args.find_induction_depth:
+        # Searches of different configurations are independent, the depths of one configuration are tried in order
+        prove_chains = [(tag, interface, parameters, sizes, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, run_options) for interface, command, parameters, sizes in chains if command == 'prove']
+        with multiprocessing.Pool(maximum_parallel_jobs) as pool:
+            pool.starmap(_find_chain_induction_depths, prove_chains)
+        return
+
+    sweeps = []
+    if args.pipeline is not None:
+        # The commands of the chains are replaced by the stages of the pipeline
+        configurations = {}
+        for interface, _, parameters, sizes in chains:
+            configurations.setdefault((interface, json.dumps(parameters, sort_keys=True)), (interface, parameters, set()))[2].update(sizes)
+        for interface, parameters, sizes in configurations.values():
+            sweeps += plan_pipeline(interface, sorted(sizes), parameters, args.pipeline or DEFAULT_PIPELINE_STAGES)
+        chains = []
+
+    for interface, command, parameters, sizes in chains:
+        if args.adaptive:
+            sweeps.append(AdaptiveSweep(interface, command, sizes, MAXIMUM_TIME_LIMIT_SECONDS, args.memory_limit, bisect=not args.no_bisect, parameters=parameters))
+        else:
+            sweeps.append(FixedSweep(interface, command, sizes, parameters))
+
+    # The state of every job is kept in the manifest of the tag, so that an interrupted sweep resumes where it stopped
+    try:
+        manifest = JobManifest.open(tag, restart=args.restart)
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    if args.coordinator is not None:
+        run_coordinator(tag, sweeps, manifest, parse_address(args.coordinator), args.authkey, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, asdict(run_options))
+    elif maximum_parallel_jobs == 1 and args.pipeline is None:
+        for sweep in sweeps:
+            run_sweep_sequentially(tag, sweep, manifest, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, run_options)
+    else:
+        run_benchmarks_parallel(tag, sweeps, manifest, maximum_parallel_jobs, args.memory_budget, args.memory_limit, MAXIMUM_TIME_LIMIT_SECONDS, run_options)
 
-for interface in INTERFACES:
-    for command in command_choices:
-        for size in [2, 4, 8, 12, 16, 24, 32]:
-            if run_single_benchmark(args.tag, interface, command, size, MAXIMUM_MEMORY_LIMIT_MEGABYTES, MAXIMUM_TIME_LIMIT_SECONDS) == False:
-                break
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import os
+import re
+
+def make_sby_files_absolute(sby_text, base_dir):
+    """Resolve the relative paths in the [files] section of an .sby file against base_dir"""
+    lines = []
+    in_files_section = False
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            in_files_section = stripped == '[files]'
+        elif in_files_section and stripped and not stripped.startswith('#'):
+            # Entries are either "source" or "destination source"
+            *destination, source = stripped.split()
+            if not os.path.isabs(source):
+                source = str((base_dir / source).resolve())
+            line = ' '.join(destination + [source])
+        lines.append(line)
+
+    return '\n'.join(lines) + '\n'
+
+def parse_sby_sections(sby_text):
+    """Return a dict from each [section] of an .sby file to its non-empty, non-comment lines"""
+    sections = {}
+    current_section = None
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            current_section = stripped[1:-1]
+            sections.setdefault(current_section, [])
+        elif current_section is not None and stripped and not stripped.startswith('#'):
+            sections[current_section].append(stripped)
+
+    return sections
+
+def get_task_engines(sby_sections, task):
+    """Return the [engines] lines that apply to a task, e.g. ['smtbmc boolector']"""
+    engines = []
+    for line in sby_sections.get('engines', []):
+        task_prefix, separator, engine = line.partition(':')
+        if not separator or ' ' in task_prefix.strip():
+            # Engine line without a task prefix applies to every task
+            engines.append(line)
+        elif task_prefix.strip() == task:
+            engines.append(engine.strip())
+    return engines
+
+def replace_task_engines(sby_text, task, engines):
+    """
+    Replace the engines used by a task in an .sby file with the given list, e.g. ['smtbmc boolector', 'abc pdr'].
+
+    When a task lists several engines, sby runs all of them at once and stops as soon as one of them returns a
+    conclusive result, killing the others.
+    """
+    tasks = [line.split()[0] for line in parse_sby_sections(sby_text).get('tasks', [])]
+    lines = []
+    in_engines_section = False
+
+    def add_task_engines():
+        # Insert the new engines right after the last line of the section, before any blank lines
+        insert_at = len(lines)
+        while insert_at > 0 and not lines[insert_at - 1].strip():
+            insert_at -= 1
+        lines[insert_at:insert_at] = [f'{task}: {engine}' for engine in engines]
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            if in_engines_section:
+                add_task_engines()
+            in_engines_section = stripped == '[engines]'
+        elif in_engines_section and stripped and not stripped.startswith('#'):
+            task_prefix, separator, _ = stripped.partition(':')
+            if not separator or ' ' in task_prefix.strip():
+                # Engine lines without a task prefix apply to every task, so only keep them for the other tasks
+                lines.extend(f'{other_task}: {stripped}' for other_task in tasks if other_task != task)
+                continue
+            if task_prefix.strip() == task:
+                continue
+        lines.append(line)
+
+    if in_engines_section:
+        add_task_engines()
+
+    return '\n'.join(lines) + '\n'
+
+def replace_sby_section(sby_text, section, section_lines):
+    """Replace the contents of a [section] of an .sby file with the given lines"""
+    lines = []
+    in_section = False
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            if in_section:
+                lines.extend(section_lines + [''])
+            in_section = stripped == f'[{section}]'
+        elif in_section:
+            continue
+        lines.append(line)
+
+    if in_section:
+        lines.extend(section_lines)
+
+    return '\n'.join(lines) + '\n'
+
+def set_hierarchy_parameters(sby_text, parameters):
+    """
+    Set design parameters of the top module in the [script] section of an .sby file, by adding (or replacing)
+    -chparam NAME VALUE on its hierarchy command, e.g. {'WEIGHT_ACTIVATION_SIZE': 4, 'INPUT_SIZE': 8}
+    """
+    lines = []
+    in_script_section = False
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            in_script_section = stripped == '[script]'
+        elif in_script_section and stripped.split()[:1] == ['hierarchy']:
+            for name, value in parameters.items():
+                line, count = re.subn(rf'-chparam\s+{re.escape(name)}\s+\S+', f'-chparam {name} {value}', line)
+                if count == 0:
+                    line += f' -chparam {name} {value}'
+        lines.append(line)
+
+    return '\n'.join(lines) + '\n'
+
+def replace_sby_sources(sby_text, sources):
+    """
+    Make the [files] section of an .sby file copy other files under the names of some of its sources, given as a
+    dict from the source entries to the files that replace them. The [script] section then reads the replacements.
+    """
+    lines = []
+    in_files_section = False
+
+    for line in sby_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            in_files_section = stripped == '[files]'
+        elif in_files_section and stripped and not stripped.startswith('#'):
+            *destination, source = stripped.split()
+            if source in sources:
+                line = f'{destination[0] if destination else os.path.basename(source)} {sources[source]}'
+        lines.append(line)
+
+    return '\n'.join(lines) + '\n'
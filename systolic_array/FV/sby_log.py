@@ -0,0 +1,130 @@
+import os
+import re
+import time
+
+import psutil
+
+from supervisor import get_process_tree_memory
+
+# Every sby log line has the form "SBY HH:MM:SS [workdir] message"
+SBY_LINE_PATTERN = re.compile(r'^SBY\s+\S+\s+\[[^\]]*\]\s+(.*)$')
+
+# Phases (Yosys front-end, prep, SMT2/AIGER generation, engines) are sby sub-processes:
+#   base: starting process "cd ...; yosys -ql ../model/design.log ../model/design.ys"
+#   base: finished (returncode=0)
+PHASE_START_PATTERN = re.compile(r'^([\w.]+): starting process "(.*)"$')
+PHASE_END_PATTERN = re.compile(r'^([\w.]+): finished \(returncode=(-?\d+)\)$')
+
+# Solver steps reported by smtbmc, e.g.
+#   engine_0.basecase: ##   0:00:00  Checking assertions in step 4..
+#   engine_0.induction: ##   0:00:01  Trying induction in step 20..
+STEP_PATTERN = re.compile(r'^([\w.]+): ##\s+[\d:]+\s+(Checking assumptions|Checking assertions|Trying induction|Checking cover reachability) in step (\d+)\.\.')
+
+# Final status of the task, e.g. "DONE (UNKNOWN, rc=4)". UNKNOWN means that no engine was conclusive, e.g. because
+#   the induction step of a prove task failed at its depth.
+DONE_PATTERN = re.compile(r'DONE \((\w+), rc=(-?\d+)\)')
+
+STEP_KINDS = {
+    'Checking assumptions': 'assumptions',
+    'Checking assertions': 'assertions',
+    'Trying induction': 'induction',
+    'Checking cover reachability': 'cover',
+}
+
+def get_children_memory():
+    """Memory in MB of all processes started by this process (i.e. the sby process tree of the running job)"""
+    own_memory = psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    return max(get_process_tree_memory(os.getpid()) - own_memory, 0.0)
+
+class SbyTimelineObserver:
+    """
+    Follows the sby output of a job as it is streamed and records a timeline of the job: when each phase (Yosys
+    front-end, prep, SMT2/AIGER generation, every engine) started and finished, and how long each solver step took
+    together with the memory of the process tree when it started and finished.
+
+    Times are measured by the harness when each line arrives, in seconds since the observer was created, as the
+    timestamps printed by sby only have a resolution of one second.
+    """
+
+    def __init__(self, measure_memory=get_children_memory):
+        self.start_time = time.perf_counter()
+        self.measure_memory = measure_memory
+        self.phases = []
+        self.steps = []
+        self._open_phases = {}
+        self._open_steps = {}
+        self.status = None
+
+    def _now(self):
+        return time.perf_counter() - self.start_time
+
+    def _close_step(self, engine, now):
+        step = self._open_steps.pop(engine, None)
+        if step is not None:
+            step['duration'] = now - step['start']
+            step['memory_end'] = self.measure_memory()
+            self.steps.append(step)
+
+    def on_output_line(self, line):
+        if (done_match := DONE_PATTERN.search(line)) is not None:
+            self.status = done_match.group(1).lower()
+
+        match = SBY_LINE_PATTERN.match(line)
+        if match is None:
+            return
+        message = match.group(1)
+        now = self._now()
+
+        if (step_match := STEP_PATTERN.match(message)) is not None:
+            engine = step_match.group(1)
+            self._close_step(engine, now)
+            self._open_steps[engine] = {
+                'engine': engine,
+                'kind': STEP_KINDS[step_match.group(2)],
+                'step': int(step_match.group(3)),
+                'start': now,
+                'memory_start': self.measure_memory(),
+            }
+        elif (start_match := PHASE_START_PATTERN.match(message)) is not None:
+            self._open_phases[start_match.group(1)] = {
+                'name': start_match.group(1),
+                'command': start_match.group(2),
+                'start': now,
+            }
+        elif (end_match := PHASE_END_PATTERN.match(message)) is not None:
+            name = end_match.group(1)
+            self._close_step(name, now)
+            phase = self._open_phases.pop(name, {'name': name, 'start': None})
+            phase['end'] = now
+            phase['duration'] = now - phase['start'] if phase['start'] is not None else None
+            phase['returncode'] = int(end_match.group(2))
+            self.phases.append(phase)
+
+    def finish(self):
+        """Close the phases and steps that were still running when the job ended (e.g. because it was killed)"""
+        now = self._now()
+        for engine in list(self._open_steps):
+            self._close_step(engine, now)
+        for name, phase in self._open_phases.items():
+            phase['end'] = now
+            phase['duration'] = now - phase['start']
+            phase['returncode'] = None
+            self.phases.append(phase)
+        self._open_phases = {}
+
+    def get_open_steps(self):
+        """The steps that are running, at most one per engine"""
+        return list(self._open_steps.values())
+
+    def get_phase_durations(self):
+        """Return a dict from phase name to its duration in seconds"""
+        return {phase['name']: phase['duration'] for phase in self.phases if phase['duration'] is not None}
+
+    def to_dict(self):
+        return {
+            'time_units': 'seconds (s)',
+            'memory_units': 'megabyte (MB)',
+            'status': self.status,
+            'phases': sorted(self.phases, key=lambda phase: phase['start'] if phase['start'] is not None else 0.0),
+            'steps': sorted(self.steps, key=lambda step: step['start']),
+        }
@@ -0,0 +1,381 @@
+import array
+import asyncio
+import itertools
+import os
+import re
+import resource
+import signal
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+# Root of the cgroup v2 hierarchy
+CGROUP_V2_ROOT = Path('/sys/fs/cgroup')
+
+# Bounds of the adaptive memory sampling interval. Memory is sampled fast while it grows or is close to the limit,
+#   and the interval backs off while memory is stable.
+MIN_SAMPLING_INTERVAL_SECONDS = 0.1
+MAX_SAMPLING_INTERVAL_SECONDS = 2.0
+# When the kernel already enforces the memory limit, sampling is only used to track the peak
+MAX_SAMPLING_INTERVAL_WITH_KERNEL_LIMIT_SECONDS = 5.0
+SAMPLING_BACKOFF_FACTOR = 1.5
+# Relative memory growth between two samples that is considered "fast"
+FAST_MEMORY_GROWTH_RATIO = 0.05
+# Fraction of the memory limit from which memory is always sampled at the fastest rate
+MEMORY_LIMIT_DANGER_ZONE = 0.8
+
+OUTPUT_CHUNK_SIZE_BYTES = 64 * 1024
+
+# Largest number of points of the resource time series of a job. Once it is full, neighbouring points are merged in
+#   pairs, so that a job of any length keeps a series of bounded size with an even resolution.
+MAX_RESOURCE_SAMPLES = 512
+
+memory_enforcement_choices = ['auto', 'cgroup', 'rlimit', 'sampling']
+
+# Output of a process that failed to allocate memory. Under RLIMIT_AS the kernel does not kill the tree, an allocation
+#   fails instead and the solver aborts with one of these messages.
+ALLOCATION_FAILURE_PATTERN = re.compile(r'std::bad_alloc|MemoryError|Cannot allocate memory|[Oo]ut of memory')
+
+_cgroup_counter = itertools.count()
+
+def get_process_tree_memory(pid):
+    """Get total memory usage of a process and all its children in MB"""
+    try:
+        parent = psutil.Process(pid)
+        children = parent.children(recursive=True)  # Get all child processes recursively
+        total_memory = parent.memory_info().rss  # Memory of parent process
+
+        # Add memory of all child processes
+        for child in children:
+            try:
+                total_memory += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        return total_memory / (1024 * 1024)  # Convert to MB
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0.0
+
+def sample_process_tree(pid):
+    """
+    Return (memory in MB, CPU time in seconds, {(pid, create time): (name, CPU time)}) of a process and all its
+    children. The CPU time includes the children that were already reaped by a process of the tree.
+    """
+    try:
+        parent = psutil.Process(pid)
+        processes = [parent] + parent.children(recursive=True)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0.0, 0.0, {}
+
+    total_memory = 0
+    total_cpu_time = 0.0
+    cpu_by_process = {}
+    for process in processes:
+        try:
+            with process.oneshot():
+                total_memory += process.memory_info().rss
+                cpu_times = process.cpu_times()
+                cpu_time = cpu_times.user + cpu_times.system
+                total_cpu_time += cpu_time + cpu_times.children_user + cpu_times.children_system
+                cpu_by_process[(process.pid, process.create_time())] = (process.name(), cpu_time)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    return total_memory / (1024 * 1024), total_cpu_time, cpu_by_process
+
+def kill_process_tree(pid):
+    """Kill a process and all its children"""
+    try:
+        parent = psutil.Process(pid)
+        children = parent.children(recursive=True)
+
+        # Kill children first
+        for child in children:
+            try:
+                os.kill(child.pid, signal.SIGTERM)
+            except (psutil.NoSuchProcess, ProcessLookupError):
+                pass
+
+        # Kill parent
+        os.kill(pid, signal.SIGTERM)
+    except (psutil.NoSuchProcess, ProcessLookupError):
+        pass
+
+class ResourceTimeSeries:
+    """
+    Memory and CPU time of the process tree of a job over time, in array-backed columns of at most
+    MAX_RESOURCE_SAMPLES points. A merged point keeps the time and CPU time of the later sample and the largest memory.
+    """
+
+    def __init__(self):
+        self.elapsed = array.array('d')     # seconds since the job started
+        self.memory = array.array('f')      # MB
+        self.cpu_time = array.array('f')    # seconds, cumulative
+
+    def append(self, elapsed, memory, cpu_time):
+        if len(self.elapsed) == MAX_RESOURCE_SAMPLES:
+            self._merge_pairs()
+        self.elapsed.append(elapsed)
+        self.memory.append(memory)
+        self.cpu_time.append(cpu_time)
+
+    def _merge_pairs(self):
+        self.elapsed = array.array('d', self.elapsed[1::2])
+        self.memory = array.array('f', map(max, self.memory[0::2], self.memory[1::2]))
+        self.cpu_time = array.array('f', self.cpu_time[1::2])
+
+    def save(self, path):
+        """Store the series as compressed numpy arrays (load them back with numpy.load)"""
+        np.savez_compressed(path, elapsed=np.frombuffer(self.elapsed, dtype=np.float64),
+                            memory=np.frombuffer(self.memory, dtype=np.float32), cpu_time=np.frombuffer(self.cpu_time, dtype=np.float32))
+
+@dataclass
+class SupervisionResult:
+    returncode: int
+    max_memory: float                   # in MB
+    memory_limit_exceeded: bool = False
+    time_limit_exceeded: bool = False
+    memory_enforcement: str = 'sampling'
+    messages: list = field(default_factory=list)
+    # Kernel accounting (getrusage) of the whole process tree, including the children it reaped
+    user_time: float = 0.0              # in seconds
+    system_time: float = 0.0            # in seconds
+    voluntary_context_switches: int = 0
+    involuntary_context_switches: int = 0
+    max_process_memory: float = None    # in MB, peak RSS of the largest single process, None if not known
+    # CPU time of every process of the tree that was sampled, summed per executable (a lower bound, up to the last sample)
+    cpu_time_by_process: dict = field(default_factory=dict)
+    time_series: ResourceTimeSeries = field(default_factory=ResourceTimeSeries)
+
+    @property
+    def cpu_time(self):
+        return self.user_time + self.system_time
+
+def _get_own_cgroup_v2_dir():
+    """Return the cgroup v2 directory of this process, or None if cgroup v2 is not mounted"""
+    if not (CGROUP_V2_ROOT / 'cgroup.controllers').exists():
+        return None
+    try:
+        for line in Path('/proc/self/cgroup').read_text().splitlines():
+            # cgroup v2 entries have the form "0::/path"
+            if line.startswith('0::'):
+                return CGROUP_V2_ROOT / line[3:].lstrip('/')
+    except OSError:
+        pass
+    return None
+
+def _create_job_cgroup(maximum_memory_limit_in_megabytes):
+    """
+    Create a child cgroup with memory.max set to the limit. Returns (cgroup, None), or (None, the reason) if this
+    is not permitted here.
+    """
+    parent = _get_own_cgroup_v2_dir()
+    if parent is None:
+        return None, 'cgroup v2 is not mounted'
+    try:
+        # cgroup v2 only delegates a controller to the children of a cgroup without processes of its own, so the
+        #   memory controller is usually only enabled here if the benchmarks run in a dedicated (e.g. systemd-run) scope
+        if 'memory' not in (parent / 'cgroup.subtree_control').read_text().split():
+            return None, f'the memory controller is not enabled in {parent / "cgroup.subtree_control"}'
+        cgroup = parent / f'sby_job_{os.getpid()}_{next(_cgroup_counter)}'
+        cgroup.mkdir()
+        (cgroup / 'memory.max').write_text(str(int(maximum_memory_limit_in_megabytes * 1024 * 1024)))
+        # Do not let the job fall back to swap when it hits the limit
+        if (cgroup / 'memory.swap.max').exists():
+            (cgroup / 'memory.swap.max').write_text('0')
+        return cgroup, None
+    except OSError as e:
+        return None, str(e)
+
+def get_cgroup_unavailable_reason():
+    """Why a job cgroup with a memory limit cannot be created here, or None if it can"""
+    cgroup, reason = _create_job_cgroup(1024)
+    if cgroup is not None:
+        _remove_cgroup(cgroup)
+    return reason
+
+def _read_cgroup_peak_memory(cgroup):
+    """Peak memory in MB of a cgroup, or None if the kernel does not report it"""
+    try:
+        return int((cgroup / 'memory.peak').read_text()) / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+def _cgroup_oom_killed(cgroup):
+    try:
+        for line in (cgroup / 'memory.events').read_text().splitlines():
+            key, value = line.split()
+            if key == 'oom_kill':
+                return int(value) > 0
+    except (OSError, ValueError):
+        pass
+    return False
+
+def _remove_cgroup(cgroup):
+    try:
+        cgroup.rmdir()
+    except OSError:
+        pass
+
+def _make_preexec_fn(memory_enforcement, cgroup, maximum_memory_limit_in_megabytes):
+    def preexec_fn():
+        if cgroup is not None:
+            (cgroup / 'cgroup.procs').write_text(str(os.getpid()))
+        if memory_enforcement == 'rlimit':
+            # RLIMIT_AS applies to each process of the tree individually and is inherited by every child
+            limit = int(maximum_memory_limit_in_megabytes * 1024 * 1024)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return preexec_fn
+
+async def supervise_command_async(command, log_file, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement='auto', on_output_line=None, on_memory_sample=None):
+    """
+    Run a shell command, streaming its combined stdout/stderr to log_file line by line, and kill its process tree
+    if it exceeds the time or memory limit.
+
+    The time limit is enforced with a timer. The memory limit is enforced by the kernel through a cgroup v2 memory.max
+    or RLIMIT_AS when requested and available, and otherwise by sampling the memory of the process tree at an adaptive
+    rate. auto falls back to sampling when no cgroup can be created, while an explicit cgroup raises a RuntimeError.
+    Under RLIMIT_AS a run that fails after an allocation failure counts as exceeding the limit.
+
+    on_output_line, if given, is called with every line of output as it is produced, and on_memory_sample with the
+    memory in MB of the process tree every time it is sampled.
+    """
+    assert memory_enforcement in memory_enforcement_choices
+
+    cgroup = None
+    if memory_enforcement in ('auto', 'cgroup'):
+        cgroup, reason = _create_job_cgroup(maximum_memory_limit_in_megabytes)
+        if cgroup is None and memory_enforcement == 'cgroup':
+            raise RuntimeError(f'cannot enforce the memory limit with a cgroup: {reason}')
+        memory_enforcement = 'cgroup' if cgroup is not None else 'sampling'
+
+    result = SupervisionResult(returncode=-1, max_memory=0.0, memory_enforcement=memory_enforcement)
+    loop = asyncio.get_running_loop()
+
+    # The kernel accounts the CPU time of a process to its parent when it is reaped, so the difference of the usage
+    #   of the children of this process over the job is the usage of the whole tree
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = loop.time()
+    sampled_processes = {}
+    allocation_failed = False
+
+    with open(log_file, 'w') as log:
+        def log_message(message):
+            print(message)
+            result.messages.append(message)
+            log.write(message + '\n')
+            log.flush()
+
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            preexec_fn=_make_preexec_fn(memory_enforcement, cgroup, maximum_memory_limit_in_megabytes)
+        )
+
+        def on_time_limit():
+            if process.returncode is None:
+                log_message(f'Execution time exceeded {maximum_time_limit_in_seconds} seconds. Killing process...')
+                result.time_limit_exceeded = True
+                kill_process_tree(process.pid)
+
+        time_limit_timer = loop.call_later(maximum_time_limit_in_seconds, on_time_limit)
+
+        async def stream_output():
+            nonlocal allocation_failed
+            # Read in chunks rather than lines, so that arbitrarily long solver output lines never overrun the reader
+            partial_line = ''
+            previous_tail = ''
+            while True:
+                chunk = await process.stdout.read(OUTPUT_CHUNK_SIZE_BYTES)
+                if not chunk:
+                    break
+                text = chunk.decode(errors='replace')
+                log.write(text)
+                if memory_enforcement == 'rlimit' and not allocation_failed:
+                    # The tail of the previous chunk catches a message split between two chunks
+                    allocation_failed = ALLOCATION_FAILURE_PATTERN.search(previous_tail + text) is not None
+                    previous_tail = text[-64:]
+                if on_output_line is not None:
+                    *lines, partial_line = (partial_line + text).split('\n')
+                    for line in lines:
+                        on_output_line(line)
+            if on_output_line is not None and partial_line:
+                on_output_line(partial_line)
+
+        async def sample_memory():
+            interval = MIN_SAMPLING_INTERVAL_SECONDS
+            max_interval = MAX_SAMPLING_INTERVAL_SECONDS if memory_enforcement == 'sampling' else MAX_SAMPLING_INTERVAL_WITH_KERNEL_LIMIT_SECONDS
+            previous_memory = 0.0
+
+            while process.returncode is None:
+                current_memory, cpu_time, cpu_by_process = sample_process_tree(process.pid)
+                result.max_memory = max(result.max_memory, current_memory)
+                result.time_series.append(loop.time() - start_time, current_memory, cpu_time)
+                sampled_processes.update(cpu_by_process)
+                if on_memory_sample is not None:
+                    on_memory_sample(current_memory)
+
+                if current_memory > maximum_memory_limit_in_megabytes and not result.memory_limit_exceeded:
+                    log_message(f'Memory limit of {maximum_memory_limit_in_megabytes}MB exceeded! (Current: {current_memory:.2f}MB). Killing process...')
+                    result.memory_limit_exceeded = True
+                    kill_process_tree(process.pid)
+
+                growing_fast = current_memory > previous_memory * (1 + FAST_MEMORY_GROWTH_RATIO)
+                close_to_limit = current_memory > MEMORY_LIMIT_DANGER_ZONE * maximum_memory_limit_in_megabytes
+                if growing_fast or close_to_limit:
+                    interval = MIN_SAMPLING_INTERVAL_SECONDS
+                else:
+                    interval = min(interval * SAMPLING_BACKOFF_FACTOR, max_interval)
+                previous_memory = current_memory
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(process_exited), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        process_exited = asyncio.ensure_future(process.wait())
+        sampler = asyncio.ensure_future(sample_memory())
+
+        try:
+            await stream_output()
+            result.returncode = await process_exited
+            await sampler
+            if allocation_failed and result.returncode != 0 and not result.memory_limit_exceeded:
+                log_message(f'Memory limit of {maximum_memory_limit_in_megabytes}MB exceeded! (An allocation failed under RLIMIT_AS)')
+                result.memory_limit_exceeded = True
+        finally:
+            time_limit_timer.cancel()
+            if process.returncode is None:
+                kill_process_tree(process.pid)
+            sampler.cancel()
+
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            result.user_time = usage.ru_utime - usage_before.ru_utime
+            result.system_time = usage.ru_stime - usage_before.ru_stime
+            result.voluntary_context_switches = usage.ru_nvcsw - usage_before.ru_nvcsw
+            result.involuntary_context_switches = usage.ru_nivcsw - usage_before.ru_nivcsw
+            # ru_maxrss (in KB) is the peak of every child ever reaped, so it only tells about this job if it grew.
+            #   Unlike the sampled memory, it does not miss short peaks.
+            if usage.ru_maxrss > usage_before.ru_maxrss:
+                result.max_process_memory = usage.ru_maxrss / 1024
+                result.max_memory = max(result.max_memory, result.max_process_memory)
+            result.time_series.append(loop.time() - start_time, 0.0, result.cpu_time)
+            for name, cpu_time in sampled_processes.values():
+                result.cpu_time_by_process[name] = result.cpu_time_by_process.get(name, 0.0) + cpu_time
+
+            if cgroup is not None:
+                peak_memory = _read_cgroup_peak_memory(cgroup)
+                if peak_memory is not None:
+                    result.max_memory = max(result.max_memory, peak_memory)
+                if _cgroup_oom_killed(cgroup) and not result.memory_limit_exceeded:
+                    log_message(f'Memory limit of {maximum_memory_limit_in_megabytes}MB exceeded! (Killed by the kernel)')
+                    result.memory_limit_exceeded = True
+                _remove_cgroup(cgroup)
+
+    return result
+
+def supervise_command(command, log_file, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement='auto', on_output_line=None, on_memory_sample=None):
+    """Blocking wrapper around supervise_command_async"""
+    return asyncio.run(supervise_command_async(command, log_file, maximum_memory_limit_in_megabytes, maximum_time_limit_in_seconds, memory_enforcement, on_output_line, on_memory_sample))
@@ -0,0 +1,216 @@
+import functools
+import itertools
+import json
+import os
+import random
+import re
+import tomllib
+from pathlib import Path
+
+from sby_files import parse_sby_sections
+from results_db import query_results
+
+SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+
+# Sweep specs are TOML (or YAML, if PyYAML is installed) files such as sweep_example.toml:
+#
+#   tag = "width_sweep"                     # optional, --tag overrides it
+#   interfaces = ["FV_GEMM_driver"]
+#   commands = ["bmc", "prove"]             # optional, every command by default
+#   sampling = "grid"                       # grid, random or latin_hypercube
+#   samples = 16                            # number of points of random and latin_hypercube
+#   seed = 0
+#
+#   [parameters]
+#   SA_SIZE = [2, 4, 8]                     # a list of values
+#   INPUT_SIZE = { min = 2, max = 8 }       # every integer of a range (optionally with step)
+#   WEIGHT_ACTIVATION_SIZE = 4              # a single value
+#   BMC_DEPTH = "2*SA_SIZE + INPUT_SIZE"    # an expression of the other parameters
+#
+# SA_SIZE is required. PROVE_DEPTH and BMC_DEPTH are the depths of the sby tasks; every other parameter is passed to
+#   the top module of the driver with -chparam, so it must be one of its parameters.
+
+SAMPLING_METHODS = ['grid', 'random', 'latin_hypercube']
+
+DEPTH_PARAMETERS = ['PROVE_DEPTH', 'BMC_DEPTH']
+
+# Depths used when a sweep does not set them
+DEFAULT_DEPTH_EXPRESSIONS = {
+    'PROVE_DEPTH': '2*(SA_SIZE + 1)',
+    'BMC_DEPTH': '2*SA_SIZE + 10',
+}
+
+# Functions that parameter expressions may use besides the other parameters
+EXPRESSION_FUNCTIONS = {'min': min, 'max': max, 'abs': abs}
+
+PARAMETER_DECLARATION_PATTERN = re.compile(r'parameter\s+(?:int\s+)?(\w+)\s*=\s*([^,;)\n]+)')
+
+def evaluate_expression(expression, values):
+    """Evaluate an integer expression of parameters, e.g. '2*SA_SIZE + INPUT_SIZE'"""
+    try:
+        return int(eval(expression, {'__builtins__': {}}, {**EXPRESSION_FUNCTIONS, **values}))
+    except Exception as e:
+        raise ValueError(f'cannot evaluate parameter expression "{expression}" with {values}: {e}') from None
+
+def get_design_parameters(parameters):
+    """The parameters of a job that are passed to the design with -chparam (all but SA_SIZE and the depths)"""
+    return {name: value for name, value in (parameters or {}).items() if name != 'SA_SIZE' and name not in DEPTH_PARAMETERS}
+
+def resolve_depths(SA_SIZE, parameters=None):
+    """Return the (PROVE_DEPTH, BMC_DEPTH) of a job, evaluating expressions against its other parameters"""
+    values = {**get_design_parameters(parameters), 'SA_SIZE': SA_SIZE}
+    depths = []
+    for name in DEPTH_PARAMETERS:
+        depth = (parameters or {}).get(name, DEFAULT_DEPTH_EXPRESSIONS[name])
+        depths.append(evaluate_expression(depth, values) if isinstance(depth, str) else int(depth))
+    return tuple(depths)
+
+def format_parameters(parameters):
+    """Short description of the parameters of a job for messages, empty for the defaults of the driver"""
+    if not parameters:
+        return ''
+    return ' [' + ', '.join(f'{name}={value}' for name, value in sorted(parameters.items())) + ']'
+
+@functools.lru_cache
+def get_declared_parameters(interface):
+    """Return a dict from every parameter of the top module of an interface to its default value (None if not an int)"""
+    sby_text = (SCRIPT_DIR / f'{interface}.sby.tpl').read_text()
+    sections = parse_sby_sections(sby_text)
+
+    top = None
+    for line in sections.get('script', []):
+        match = re.search(r'-top\s+(\w+)', line)
+        if match is not None:
+            top = match.group(1)
+
+    for entry in sections.get('files', []):
+        source = SCRIPT_DIR / entry.split()[-1]
+        text = source.read_text()
+        match = re.search(rf'\bmodule\s+{top}\b(.*?)\)\s*;', text, re.DOTALL)
+        if match is None:
+            continue
+        declared = {}
+        for name, default in PARAMETER_DECLARATION_PATTERN.findall(match.group(1)):
+            declared[name] = int(default) if default.strip().isdigit() else None
+        return declared
+
+    raise ValueError(f'top module {top} of {interface} not found in its [files]')
+
+def get_recorded_parameters(interface, parameters):
+    """
+    The design parameters under which a job is recorded: parameters left at the default of the driver are dropped,
+    as those jobs are the same configuration as the runs that did not set them
+    """
+    design_parameters = get_design_parameters(parameters)
+    if not design_parameters:
+        return {}
+    declared = get_declared_parameters(interface)
+    return {name: value for name, value in design_parameters.items() if declared.get(name) != value}
+
+def load_sweep_spec(spec_path):
+    spec_path = Path(spec_path)
+    if spec_path.suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f'{spec_path} is a YAML sweep spec, which needs PyYAML (pip install pyyaml); TOML specs work without it') from None
+        with open(spec_path, 'r') as f:
+            return yaml.safe_load(f)
+
+    with open(spec_path, 'rb') as f:
+        return tomllib.load(f)
+
+def _get_choices(name, value):
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return list(range(value['min'], value['max'] + 1, value.get('step', 1)))
+    if isinstance(value, int):
+        return [value]
+    raise ValueError(f'parameter {name} must be a list, a {{min, max}} range, an int or an expression string')
+
+def sample_parameters(parameters, sampling='grid', samples=None, seed=0):
+    """
+    Expand the [parameters] of a spec into a list of dicts of parameter values.
+
+    grid takes every combination. random draws each parameter uniformly and independently. latin_hypercube splits
+    the values of each parameter into as many strata as samples and uses every stratum once, so that few samples
+    still cover the whole range of every parameter. Expressions are evaluated once the other parameters are known,
+    except depths, which are kept as expressions and resolved per job.
+    """
+    axes = {name: _get_choices(name, value) for name, value in parameters.items() if not isinstance(value, str)}
+    expressions = {name: value for name, value in parameters.items() if isinstance(value, str)}
+    if 'SA_SIZE' not in axes:
+        raise ValueError('a sweep spec must give the values of SA_SIZE')
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f'unknown sampling method {sampling}, use one of {", ".join(SAMPLING_METHODS)}')
+    if sampling != 'grid' and (not isinstance(samples, int) or samples < 1):
+        raise ValueError(f'{sampling} sampling needs the number of samples to draw, a positive integer')
+
+    rng = random.Random(seed)
+    if sampling == 'grid':
+        points = [dict(zip(axes, combination)) for combination in itertools.product(*axes.values())]
+    elif sampling == 'random':
+        points = [{name: rng.choice(choices) for name, choices in axes.items()} for _ in range(samples)]
+    else:
+        strata = {name: rng.sample(range(samples), samples) for name in axes}
+        points = []
+        for i in range(samples):
+            point = {}
+            for name, choices in axes.items():
+                position = (strata[name][i] + rng.random()) / samples
+                point[name] = choices[int(position * len(choices))]
+            points.append(point)
+
+    for point in points:
+        for name, expression in expressions.items():
+            if name in DEPTH_PARAMETERS:
+                point[name] = expression
+            else:
+                point[name] = evaluate_expression(expression, point)
+        # Catch mistakes in depth expressions before any job runs
+        resolve_depths(point['SA_SIZE'], point)
+
+    return points
+
+def _is_recorded(interface, command, point):
+    PROVE_DEPTH, BMC_DEPTH = resolve_depths(point['SA_SIZE'], point)
+    for result in query_results(interface=interface, command=command, SA_SIZE=point['SA_SIZE'], parameters=get_recorded_parameters(interface, point)):
+        # Runs imported from older results may not know their depths
+        if result['prove_depth'] in (None, PROVE_DEPTH) and result['bmc_depth'] in (None, BMC_DEPTH):
+            return True
+    return False
+
+def plan_sweep_spec(spec, interfaces=None, commands=None, skip_recorded=True):
+    """
+    Expand a sweep spec into chains of jobs: a list of (interface, command, parameters, SA sizes), where the jobs of
+    a chain only differ in SA_SIZE. Points repeated by the sampling, and points that already have a result in the
+    results database (if skip_recorded), are dropped.
+    """
+    interfaces = spec.get('interfaces', interfaces)
+    commands = spec.get('commands', commands)
+    if not interfaces or not commands:
+        raise ValueError('a sweep spec must list its interfaces (and commands, unless they are given otherwise)')
+
+    points = sample_parameters(spec['parameters'], spec.get('sampling', 'grid'), spec.get('samples'), spec.get('seed', 0))
+
+    chains = {}
+    skipped = 0
+    for interface in interfaces:
+        declared = get_declared_parameters(interface)
+        for point in points:
+            for name in get_design_parameters(point):
+                if name not in declared:
+                    raise ValueError(f'{name} is not a parameter of the top module of {interface}')
+            parameters = {name: value for name, value in point.items() if name != 'SA_SIZE'}
+
+            for command in commands:
+                if skip_recorded and _is_recorded(interface, command, point):
+                    skipped += 1
+                    continue
+                chain = chains.setdefault((interface, command, json.dumps(parameters, sort_keys=True)), (interface, command, parameters, set()))
+                chain[3].add(point['SA_SIZE'])
+
+    jobs = sum(len(sizes) for _, _, _, sizes in chains.values())
+    print(f'SWEEP: {len(points)} points, {jobs} jobs in {len(chains)} chains' + (f' ({skipped} already recorded)' if skipped else ''))
+    return [(interface, command, parameters, sorted(sizes)) for interface, command, parameters, sizes in chains.values()]
@@ -0,0 +1,312 @@
+import json
+import math
+from dataclasses import dataclass
+
+from results_db import import_legacy_results, query_results
+from sweep_spec import get_recorded_parameters, format_parameters
+
+# Memory assumed for a job that has never been run before and has no smaller run to extrapolate from
+DEFAULT_JOB_MEMORY_ESTIMATE_MEGABYTES = 512
+
+# Stages of a verification pipeline (--pipeline of run_benchmarks.py): name, sby command and parameters overriding
+#   the ones of the configuration. Each stage of a configuration only runs once the stage before passed, so that a
+#   broken driver is caught by a cover or a shallow BMC run in minutes instead of by a prove run hours later. Stages
+#   named other than their command (shallow_bmc) are recorded under the label <interface>_<stage>, so that their
+#   results are not mixed with the ones of the command at its default depths.
+PIPELINE_STAGES = [
+    ('cover', 'cover', {}),
+    ('shallow_bmc', 'bmc', {'BMC_DEPTH': 'SA_SIZE + 2'}),
+    ('bmc', 'bmc', {}),
+    ('prove', 'prove', {}),
+    ('live', 'live', {}),
+]
+
+# Stages run by --pipeline when none are given. live is left out, as no interface fits its memory limit.
+DEFAULT_PIPELINE_STAGES = ['cover', 'shallow_bmc', 'bmc', 'prove']
+
+@dataclass
+class PreviousResult:
+    SA_SIZE: int
+    execution_time: float   # in seconds
+    memory: float           # in MB
+    success: bool
+
+def load_previous_results(interface_sby_filename_without_extension, sby_command, parameters=None, config_label=None):
+    """
+    Load every recorded run of an interface and command with the given design parameters from the results database,
+    or of the runs recorded under config_label instead of the interface name
+    """
+    import_legacy_results()
+
+    results = []
+    for result in query_results(interface=config_label or interface_sby_filename_without_extension, command=sby_command, parameters=get_recorded_parameters(interface_sby_filename_without_extension, parameters)):
+        # Failed runs copied from results.txt have no time or memory
+        if result['execution_time'] is None or result['memory'] is None:
+            continue
+        results.append(PreviousResult(
+            SA_SIZE=result['SA_SIZE'],
+            execution_time=result['execution_time'],
+            memory=result['memory'],
+            success=bool(result['success'])
+        ))
+
+    return results
+
+def fit_power_law(points):
+    """
+    Least-squares fit of y = a * x^b in log-log space.
+
+    points is a list of (x, y) pairs. Returns (a, b), or None if there are fewer than two distinct positive x values.
+    """
+    log_points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len({x for x, _ in log_points}) < 2:
+        return None
+
+    n = len(log_points)
+    mean_x = sum(x for x, _ in log_points) / n
+    mean_y = sum(y for _, y in log_points) / n
+    b = sum((x - mean_x) * (y - mean_y) for x, y in log_points) / sum((x - mean_x) ** 2 for x, _ in log_points)
+    a = math.exp(mean_y - b * mean_x)
+    return a, b
+
+def predict_power_law(fit, x):
+    a, b = fit
+    return a * x ** b
+
+def estimate_memory(successful_points, SA_SIZE, maximum_memory_limit_in_megabytes):
+    """
+    Estimate the peak memory in MB of a job from a dict of SA_SIZE -> (time, memory) of successful runs.
+
+    A measured run of the same size is used directly. Otherwise memory is extrapolated with a power law fitted to
+    all runs, or, with a single run, scaled quadratically from the closest smaller size (the number of PEs grows
+    quadratically with SA_SIZE).
+    """
+    if SA_SIZE in successful_points:
+        estimate = successful_points[SA_SIZE][1]
+    else:
+        fit = fit_power_law([(size, memory) for size, (_, memory) in successful_points.items()])
+        smaller_sizes = [size for size in successful_points if size < SA_SIZE]
+        if fit is not None:
+            estimate = predict_power_law(fit, SA_SIZE)
+        elif smaller_sizes:
+            closest_size = max(smaller_sizes)
+            estimate = successful_points[closest_size][1] * (SA_SIZE / closest_size) ** 2
+        else:
+            estimate = DEFAULT_JOB_MEMORY_ESTIMATE_MEGABYTES
+
+    return min(max(estimate, DEFAULT_JOB_MEMORY_ESTIMATE_MEGABYTES), maximum_memory_limit_in_megabytes)
+
+def _load_successful_points(interface_sby_filename_without_extension, sby_command, parameters=None, config_label=None):
+    # The most recent successful run of each size wins
+    points = {}
+    for result in load_previous_results(interface_sby_filename_without_extension, sby_command, parameters, config_label):
+        if result.success:
+            points[result.SA_SIZE] = (result.execution_time, result.memory)
+    return points
+
+def get_chain(interface, command, parameters):
+    """Key of the jobs that only differ in SA_SIZE, and are planned by the same sweep"""
+    return (interface, command, json.dumps(parameters or {}, sort_keys=True))
+
+class FixedSweep:
+    """
+    Runs a fixed list of SA sizes of one interface and command, and gives up on the larger sizes as soon as a size
+    fails. All sizes are handed out at once, so they may run concurrently.
+
+    parameters holds the other parameters of every job of the sweep (see sweep_spec.py), empty for the defaults.
+    """
+
+    # Jobs of sweeps of a lower priority are started first, then smaller sizes first
+    priority = 0
+
+    def __init__(self, interface, command, sizes, parameters=None, config_label=None):
+        self.interface = interface
+        self.command = command
+        self.parameters = dict(parameters or {})
+        # Label the results are recorded under, None for the interface name
+        self.config_label = config_label
+        self.sizes = sorted(sizes)
+        self.pending_sizes = list(self.sizes)
+        self.successful_points = _load_successful_points(interface, command, self.parameters, config_label)
+
+    @property
+    def chain(self):
+        return get_chain(self.interface, self.command, self.parameters)
+
+    def pop_ready_sizes(self):
+        """Return the sizes that may be started now"""
+        sizes, self.pending_sizes = self.pending_sizes, []
+        return sizes
+
+    def pop_skipped_sizes(self):
+        """Return the (size, reason) of the sizes skipped without running them since the last call"""
+        return []
+
+    def record(self, SA_SIZE, benchmark_data):
+        """Record a finished size. Returns the sizes that were handed out but are no longer worth running."""
+        if benchmark_data['success']:
+            self.successful_points[SA_SIZE] = (benchmark_data['execution_time'], benchmark_data['memory'])
+            return []
+        return [size for size in self.sizes if size > SA_SIZE]
+
+    def estimate_memory(self, SA_SIZE, maximum_memory_limit_in_megabytes):
+        return estimate_memory(self.successful_points, SA_SIZE, maximum_memory_limit_in_megabytes)
+
+class AdaptiveSweep:
+    """
+    Runs the SA sizes of one interface and command one at a time, fitting a power law of time and memory against
+    SA_SIZE to all successful runs (previous ones from the CSV and the ones of this sweep).
+
+    A size whose predicted time or memory exceeds the limits is skipped without running it, and so are all larger
+    sizes. Once the largest feasible size of the list is known, the sweep bisects between it and the smallest
+    failed or skipped size to find the largest size that still fits.
+    """
+
+    priority = 0
+    config_label = None
+
+    def __init__(self, interface, command, sizes, maximum_time_limit_in_seconds, maximum_memory_limit_in_megabytes, bisect=True, parameters=None):
+        self.interface = interface
+        self.command = command
+        self.parameters = dict(parameters or {})
+        self.sizes = sorted(sizes)
+        self.maximum_time_limit_in_seconds = maximum_time_limit_in_seconds
+        self.maximum_memory_limit_in_megabytes = maximum_memory_limit_in_megabytes
+        self.bisect = bisect
+
+        self.successful_points = _load_successful_points(interface, command, self.parameters)
+        self.largest_success = None
+        self.smallest_failure = None
+        self.tried_sizes = set()
+        self.running_size = None
+        self.skipped_sizes = []
+
+    @property
+    def chain(self):
+        return get_chain(self.interface, self.command, self.parameters)
+
+    def predict(self, SA_SIZE):
+        """Return the predicted (time in seconds, memory in MB) of a size, or None if there is not enough data"""
+        time_fit = fit_power_law([(size, time) for size, (time, _) in self.successful_points.items()])
+        memory_fit = fit_power_law([(size, memory) for size, (_, memory) in self.successful_points.items()])
+        if time_fit is None or memory_fit is None:
+            return None
+        return predict_power_law(time_fit, SA_SIZE), predict_power_law(memory_fit, SA_SIZE)
+
+    def _next_candidate(self):
+        lower = self.largest_success or 0
+        upper = self.smallest_failure if self.smallest_failure is not None else math.inf
+
+        for size in self.sizes:
+            if size not in self.tried_sizes and lower < size < upper:
+                return size
+
+        # Bisection needs a known feasible size as its lower end
+        if self.bisect and self.largest_success is not None and self.smallest_failure is not None:
+            middle = (self.largest_success + self.smallest_failure) // 2
+            if middle > self.largest_success and middle not in self.tried_sizes:
+                return middle
+
+        return None
+
+    def pop_ready_sizes(self):
+        """Return the next size to run (at most one at a time), or an empty list if it is not time yet or finished"""
+        if self.running_size is not None:
+            return []
+
+        while (size := self._next_candidate()) is not None:
+            self.tried_sizes.add(size)
+
+            prediction = self.predict(size)
+            if prediction is not None:
+                predicted_time, predicted_memory = prediction
+                if predicted_time > self.maximum_time_limit_in_seconds or predicted_memory > self.maximum_memory_limit_in_megabytes:
+                    reason = f'predicted {predicted_time:.0f} seconds using {predicted_memory:.0f} MB exceeds the limits'
+                    print(f'SKIPPED: {self.command} {self.interface}{format_parameters(self.parameters)} SA_SIZE={size} ({reason})')
+                    self.skipped_sizes.append((size, reason))
+                    self.smallest_failure = size if self.smallest_failure is None else min(self.smallest_failure, size)
+                    continue
+
+            self.running_size = size
+            return [size]
+
+        return []
+
+    def pop_skipped_sizes(self):
+        """Return the (size, reason) of the sizes skipped without running them since the last call"""
+        skipped_sizes, self.skipped_sizes = self.skipped_sizes, []
+        return skipped_sizes
+
+    def record(self, SA_SIZE, benchmark_data):
+        """Record a finished size. Returns the sizes that were handed out but are no longer worth running."""
+        self.running_size = None
+
+        if benchmark_data['success']:
+            self.successful_points[SA_SIZE] = (benchmark_data['execution_time'], benchmark_data['memory'])
+            self.largest_success = SA_SIZE if self.largest_success is None else max(self.largest_success, SA_SIZE)
+        else:
+            self.smallest_failure = SA_SIZE if self.smallest_failure is None else min(self.smallest_failure, SA_SIZE)
+
+        return []
+
+    def estimate_memory(self, SA_SIZE, maximum_memory_limit_in_megabytes):
+        return estimate_memory(self.successful_points, SA_SIZE, maximum_memory_limit_in_megabytes)
+
+class PipelineStage(FixedSweep):
+    """
+    One stage of the verification pipeline of an interface (see PIPELINE_STAGES). A size is handed out once it passed
+    the previous stage, so that the stages of different sizes (and interfaces) overlap. A size that fails, or that
+    is cancelled because a smaller size failed, is never run by the later stages.
+
+    Earlier stages get a lower priority, so that the cheap stages of every configuration run before the expensive ones.
+    """
+
+    def __init__(self, name, interface, command, sizes, parameters=None, previous_stage=None, priority=0):
+        super().__init__(interface, command, sizes, parameters, config_label=f'{interface}_{name}' if name != command else None)
+        self.name = name
+        self.previous_stage = previous_stage
+        self.priority = priority
+        self.passed_sizes = set()
+        self.stopped_sizes = set()
+        self.skipped_sizes = []
+
+    def _stop(self, sizes, reason):
+        for size in sizes:
+            if size in self.pending_sizes:
+                print(f'SKIPPED: {self.command} {self.interface}{format_parameters(self.parameters)} SA_SIZE={size} ({reason})')
+                self.skipped_sizes.append((size, reason))
+                self.pending_sizes.remove(size)
+        self.stopped_sizes.update(sizes)
+
+    def pop_ready_sizes(self):
+        """Return the sizes that passed the previous stage and were not handed out yet"""
+        if self.previous_stage is None:
+            return super().pop_ready_sizes()
+
+        self._stop([size for size in self.pending_sizes if size in self.previous_stage.stopped_sizes], f'stopped at the {self.previous_stage.name} stage')
+        ready_sizes = [size for size in self.pending_sizes if size in self.previous_stage.passed_sizes]
+        self.pending_sizes = [size for size in self.pending_sizes if size not in ready_sizes]
+        return ready_sizes
+
+    def pop_skipped_sizes(self):
+        skipped_sizes, self.skipped_sizes = self.skipped_sizes, []
+        return skipped_sizes
+
+    def record(self, SA_SIZE, benchmark_data):
+        cancelled_sizes = super().record(SA_SIZE, benchmark_data)
+        if benchmark_data['success'] and SA_SIZE not in self.stopped_sizes:
+            self.passed_sizes.add(SA_SIZE)
+        elif not benchmark_data['success']:
+            self.stopped_sizes.add(SA_SIZE)
+            self._stop(cancelled_sizes, f'SA_SIZE={SA_SIZE} failed the {self.name} stage')
+        return cancelled_sizes
+
+def plan_pipeline(interface, sizes, parameters=None, stages=DEFAULT_PIPELINE_STAGES):
+    """The stages of the pipeline of a configuration, in order, each one waiting for the one before"""
+    stage_definitions = {name: (command, overrides) for name, command, overrides in PIPELINE_STAGES}
+    pipeline = []
+    for name in stages:
+        command, overrides = stage_definitions[name]
+        pipeline.append(PipelineStage(name, interface, command, sizes, {**(parameters or {}), **overrides},
+                                      previous_stage=pipeline[-1] if pipeline else None, priority=len(pipeline)))
+    return pipeline
@@ -0,0 +1,340 @@
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from gemm_model import GEMMModel, CMD_WRITE_WEIGHTS, CMD_STREAM, CMD_NONE
+
+# States of state_t in the GEMM drivers
+DRIVER_STATES = ['S_INITIAL', 'S_LOAD_WEIGHTS', 'S_STREAM_INPUTS', 'S_STREAM_UNTIL_ALL_OUTPUTS_RECEIVED', 'S_DONE']
+
+# Signals extracted from the trace. Registers of the SA are compared against the model to locate the first
+#   diverging PE, when the trace contains them.
+TRACKED_SIGNALS = [
+    'resetn', 'clk', 'state', 'cmd', 'output_valid', 'output_row_idx', 'input_row_idx', 'should_advance_computation',
+    'weights', 'inputs', 'activation_inputs', 'activation_outputs', 'out',
+    'weights_reg', 'pe_inputs_reg', 'accs_reg',
+]
+
+# smtbmc names the words of memories name<hex address>, and Verific names array elements name[index]
+VCD_REFERENCE_PATTERN = re.compile(r'^([A-Za-z_]\w*)((?:<[0-9a-fA-F]+>|\[\d+\])*)$')
+VCD_INDEX_PATTERN = re.compile(r'<([0-9a-fA-F]+)>|\[(\d+)\]')
+
+class VcdSignal:
+    """All the VCD variables that make up one (possibly multi-dimensional array) signal of one scope"""
+
+    def __init__(self, name, scope):
+        self.name = name
+        self.scope = scope
+        self.elements = []      # (indices, width, identifier code)
+
+    def get_values(self, values, shape=None, element_width=8):
+        """Return the value of the signal as an int (scalar) or an array with the given shape"""
+        if shape is None:
+            (_, _, code), = self.elements
+            return values.get(code, 0)
+
+        count = int(np.prod(shape))
+        if len(self.elements) == 1 and not self.elements[0][0]:
+            # A single flattened vector, with element 0 in the most significant bits
+            _, width, code = self.elements[0]
+            vector = values.get(code, 0)
+            flat = [(vector >> (width - (i + 1) * element_width)) & ((1 << element_width) - 1) for i in range(count)]
+        else:
+            flat = [0] * count
+            for indices, _, code in self.elements:
+                # A single index of a multi-dimensional array is the row-major address of the memory word
+                flat_index = indices[0] if len(indices) == 1 else int(np.ravel_multi_index(indices, shape))
+                if flat_index < count:
+                    flat[flat_index] = values.get(code, 0)
+        return np.array(flat, np.int64).reshape(shape)
+
+class VcdReader:
+    """
+    Streaming reader of the VCD traces written by sby (yosys-smtbmc). Only the value changes of the tracked
+    signals are kept, so the memory used does not depend on the length of the trace.
+    """
+
+    def __init__(self, vcd_path, tracked_signals=TRACKED_SIGNALS):
+        self.vcd_path = Path(vcd_path)
+        self.tracked_signals = set(tracked_signals)
+        self.signals = {}           # name -> VcdSignal of the shallowest scope declaring it
+        self.step_code = None       # smt_step, the solver step of each sample
+        self.clock_code = None
+        self._file = open(self.vcd_path, 'r')
+        self._read_header()
+
+    def _read_header(self):
+        scope = []
+        candidates = {}
+        tokens = []
+
+        for line in self._file:
+            tokens += line.split()
+            if not tokens or tokens[-1] != '$end':
+                continue
+
+            keyword = tokens[0]
+            if keyword == '$scope':
+                scope.append(tokens[2])
+            elif keyword == '$upscope':
+                scope.pop()
+            elif keyword == '$var':
+                _, _, width, code, reference, *_ = tokens
+                if reference == 'smt_step':
+                    self.step_code = code
+                elif reference == 'smt_clock' and self.clock_code is None:
+                    self.clock_code = code
+                else:
+                    match = VCD_REFERENCE_PATTERN.match(reference)
+                    if match is not None and match.group(1) in self.tracked_signals:
+                        name = match.group(1)
+                        indices = tuple(int(hex_index, 16) if hex_index else int(decimal_index) for hex_index, decimal_index in VCD_INDEX_PATTERN.findall(match.group(2)))
+                        signal = candidates.setdefault((name, tuple(scope)), VcdSignal(name, '.'.join(scope)))
+                        signal.elements.append((indices, int(width), code))
+            elif keyword == '$enddefinitions':
+                break
+            tokens = []
+
+        # Signals such as activation_outputs exist in several scopes; the driver (outermost) one is used
+        for (name, scope), signal in sorted(candidates.items(), key=lambda item: len(item[0][1])):
+            self.signals.setdefault(name, signal)
+
+        if self.clock_code is None and 'clk' in self.signals:
+            (_, _, self.clock_code), = self.signals['clk'].elements
+
+        self._codes = {code for signal in self.signals.values() for _, _, code in signal.elements}
+        self._codes.update(code for code in (self.step_code, self.clock_code) if code is not None)
+
+    def iter_samples(self):
+        """
+        Yield the values of the tracked variables (a dict from identifier code to int) once per solver step, i.e.
+        per value of smt_step, or else per rising clock edge, or else per timestamp.
+        """
+        values = {}
+        previous_snapshot = None
+        previous_key = None
+        clock_edges = 0
+        previous_clock = 0
+        timestamp = None
+
+        def commit():
+            nonlocal previous_snapshot, previous_key, clock_edges, previous_clock
+            if self.step_code is not None:
+                key = values.get(self.step_code, 0)
+            elif self.clock_code is not None:
+                clock = values.get(self.clock_code, 0)
+                clock_edges += 1 if clock and not previous_clock else 0
+                previous_clock = clock
+                key = clock_edges
+            else:
+                key = timestamp
+
+            sample = None
+            if previous_snapshot is not None and key != previous_key:
+                sample = previous_snapshot
+            previous_snapshot, previous_key = dict(values), key
+            return sample
+
+        for line in self._file:
+            if not line:
+                continue
+            first = line[0]
+            if first == '#':
+                if timestamp is not None and (sample := commit()) is not None:
+                    yield sample
+                timestamp = int(line[1:])
+            elif first in 'bB':
+                vector, code = line[1:].split()
+                if code in self._codes:
+                    values[code] = int(vector.translate(_UNKNOWN_BITS), 2)
+            elif first in '01xXzZ':
+                code = line[1:].strip()
+                if code in self._codes:
+                    values[code] = 1 if first == '1' else 0
+
+        if timestamp is not None:
+            commit()
+        if previous_snapshot is not None:
+            yield previous_snapshot
+
+    def close(self):
+        self._file.close()
+
+# Unknown and high-impedance bits are read as 0
+_UNKNOWN_BITS = str.maketrans('xXzZ', '0000')
+
+def _get_width(signal):
+    return sum(width for _, width, _ in signal.elements)
+
+def replay_trace(vcd_path, SA_SIZE=None, input_size=None, element_width=8):
+    """
+    Replay an sby counterexample of a GEMM driver against the cycle-accurate model and the reference result.
+
+    The model is driven with the commands and activation inputs of the trace, and its registers and outputs are
+    compared cycle by cycle with those of the trace. Independently, every output row captured by the driver (on
+    CMD_STREAM cycles with output_valid) is compared with the streamed input row times the weights.
+
+    Returns a dict that can be stored as JSON, with the rebuilt matrices, the first diverging cycle (and PE, when
+    the trace contains the SA registers) and the first output that differs from the reference.
+    """
+    reader = VcdReader(vcd_path)
+    signals = reader.signals
+
+    # Drivers of GEMM_Fixed_Weights advance with should_advance_computation and name their ports inputs/out
+    fixed_weights = 'cmd' not in signals and 'should_advance_computation' in signals
+    outputs_signal = signals.get('activation_outputs') if not fixed_weights else signals.get('out')
+    activation_inputs_signal = signals.get('inputs') if fixed_weights else signals.get('activation_inputs')
+    if outputs_signal is None or 'weights' not in signals:
+        reader.close()
+        raise ValueError(f'{vcd_path} is not a trace of a GEMM driver (no weights or outputs)')
+
+    SA_SIZE = SA_SIZE or _get_width(outputs_signal) // element_width
+    if _get_width(outputs_signal) != SA_SIZE * element_width:
+        reader.close()
+        raise ValueError(f'the outputs of {vcd_path} are {_get_width(outputs_signal)} bits wide, not SA_SIZE * {element_width} = {SA_SIZE * element_width}')
+    if not fixed_weights and 'inputs' in signals:
+        input_size = input_size or _get_width(signals['inputs']) // (element_width * SA_SIZE)
+
+    def get_array(name, shape, values):
+        return signals[name].get_values(values, shape, element_width) if name in signals else None
+
+    def get_scalar(name, values, default=None):
+        return signals[name].get_values(values) if name in signals else default
+
+    model = GEMMModel(SA_SIZE)
+    synchronized = False
+    streamed_rows = []
+    captured_rows = 0
+
+    weights = None
+    inputs = None
+    first_divergence = None
+    first_reference_mismatch = None
+    cycles = 0
+
+    for cycle, values in enumerate(reader.iter_samples()):
+        cycles = cycle + 1
+        resetn = get_scalar('resetn', values, 1)
+        state = get_scalar('state', values)
+        state_name = DRIVER_STATES[state] if state is not None and state < len(DRIVER_STATES) else state
+
+        trace_weights = get_array('weights', (SA_SIZE, SA_SIZE), values)
+        if weights is None and resetn:
+            # weights and inputs are anyconst, so any cycle out of reset has their final value
+            weights = trace_weights
+            inputs = get_array('inputs', (input_size, SA_SIZE), values) if not fixed_weights and input_size else None
+
+        if fixed_weights:
+            cmd = CMD_STREAM if get_scalar('should_advance_computation', values, 0) else CMD_NONE
+        else:
+            cmd = get_scalar('cmd', values, CMD_NONE)
+        activation_inputs = activation_inputs_signal.get_values(values, (SA_SIZE,), element_width) if activation_inputs_signal is not None else np.zeros(SA_SIZE, np.int64)
+        actual_outputs = outputs_signal.get_values(values, (SA_SIZE,), element_width)
+
+        def report(signal, actual, expected, **location):
+            return {
+                'cycle': cycle,
+                'state': state_name,
+                'signal': signal,
+                **location,
+                'expected': int(expected),
+                'actual': int(actual),
+            }
+
+        # Cycle-accurate comparison, starting from the first reset (registers are unconstrained before it)
+        if synchronized and first_divergence is None:
+            for name, shape in [('weights_reg', (SA_SIZE, SA_SIZE)), ('pe_inputs_reg', (SA_SIZE, SA_SIZE - 1)), ('accs_reg', (SA_SIZE - 1, SA_SIZE))]:
+                trace_registers = get_array(name, shape, values)
+                if trace_registers is None or 0 in shape:
+                    continue
+                model_registers = getattr(model, name)[0]
+                differences = np.argwhere(trace_registers != model_registers)
+                if len(differences):
+                    r, c = differences[0]
+                    first_divergence = report(name, trace_registers[r, c], model_registers[r, c], pe=[int(r), int(c)])
+                    break
+
+            if first_divergence is None:
+                model_outputs = model.activation_outputs[0]
+                differences = np.flatnonzero(actual_outputs != model_outputs)
+                if len(differences):
+                    c = differences[0]
+                    # Output column c comes out of the last row of PEs, through the output skew registers
+                    first_divergence = report('activation_outputs', actual_outputs[c], model_outputs[c], column=int(c), pe=[SA_SIZE - 1, int(c)])
+                elif 'output_valid' in signals and bool(get_scalar('output_valid', values)) != bool(model.output_valid[0]):
+                    first_divergence = report('output_valid', get_scalar('output_valid', values), model.output_valid[0])
+
+        # Reference comparison of every captured output row
+        if resetn and cmd == CMD_STREAM:
+            if weights is not None and 'output_valid' in signals and get_scalar('output_valid', values) and captured_rows < len(streamed_rows):
+                expected_outputs = (streamed_rows[captured_rows] @ weights) & ((1 << element_width) - 1)
+                differences = np.flatnonzero(actual_outputs != expected_outputs)
+                if len(differences) and first_reference_mismatch is None:
+                    c = differences[0]
+                    first_reference_mismatch = report('activation_outputs', actual_outputs[c], expected_outputs[c],
+                                                      output_row=captured_rows, column=int(c),
+                                                      output_row_idx=get_scalar('output_row_idx', values))
+                captured_rows += 1
+            streamed_rows.append(activation_inputs)
+        elif resetn and cmd == CMD_WRITE_WEIGHTS:
+            # Writing the weights clears the output counter, so rows streamed before no longer produce outputs
+            streamed_rows = []
+            captured_rows = 0
+
+        # Clock edge
+        if not resetn:
+            model.reset()
+            if fixed_weights and trace_weights is not None:
+                # The weights of GEMM_Fixed_Weights are anyconst registers that are not reset
+                model.weights_reg = trace_weights.astype(np.uint8)[None]
+            synchronized = True
+            streamed_rows = []
+            captured_rows = 0
+        else:
+            model.step(cmd, weight_inputs=trace_weights[None] if trace_weights is not None else None,
+                       activation_inputs=np.asarray(activation_inputs, np.uint8)[None])
+
+    reader.close()
+
+    return {
+        'vcd': str(vcd_path),
+        'SA_SIZE': SA_SIZE,
+        'INPUT_SIZE': input_size,
+        'cycles': cycles,
+        'weights': weights.tolist() if weights is not None else None,
+        'inputs': inputs.tolist() if inputs is not None else None,
+        'first_divergence': first_divergence,
+        'first_reference_mismatch': first_reference_mismatch,
+    }
+
+def find_traces(work_dir):
+    """Return the counterexample traces written by sby below a work directory"""
+    return sorted(Path(work_dir).glob('**/engine_*/trace*.vcd'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay sby counterexample traces of the GEMM drivers against the NumPy model and report the first divergence as JSON.')
+    parser.add_argument('vcd', type=str, nargs='+', help='VCD traces (or sby work directories containing them)')
+    parser.add_argument('--sa-size', type=int, help='SA_SIZE of the design (inferred from the outputs by default)')
+    parser.add_argument('--input-size', type=int, help='INPUT_SIZE of the driver (inferred from inputs by default)')
+    parser.add_argument('--output', '-o', type=str, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    vcd_paths = []
+    for path in map(Path, args.vcd):
+        vcd_paths += find_traces(path) if path.is_dir() else [path]
+
+    reports = [replay_trace(vcd_path, args.sa_size, args.input_size) for vcd_path in vcd_paths]
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=4)
+    else:
+        json.dump(reports, sys.stdout, indent=4)
+        print()
+
+if __name__ == '__main__':
+    main()